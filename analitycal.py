@@ -1,9 +1,11 @@
 import numpy as np
-from scipy.optimize import fsolve
-from scipy import integrate
+from functools import lru_cache
 
 from config import ElasticRopeConfig
 
+# Number of significant digits of the `catenary` inputs used as cache keys.
+CACHE_DIGITS = 10
+
 def catenary(x0: float, y0: float, n=1000):
     '''
     Graph of the catenary which passes through the point (x0, y0) with x ranging between -xo and x0 
@@ -12,38 +14,99 @@ def catenary(x0: float, y0: float, n=1000):
     translated x0 units right and y0 units down.
 
     This function also return the `a` constant of the catenary.
+
+    Results are cached with the inputs rounded to `CACHE_DIGITS` significant digits, so the
+    returned arrays are read only.
     '''
-    def func(x):
-        return x * np.arccosh(y0/x + 1) - x0
-
-    for init_a in np.logspace(-1, 4, 50, base=10):
-        try:
-            a = fsolve(func, init_a, maxfev=1000)[0]
-            
-            if func(a) > 1e-4:
-                raise Exception()
-            
-            break
-        except Exception:
-            pass
+    return catenary_curve(round_significant(x0), round_significant(y0), n)
 
-    x = np.linspace(0, 2*x0, n)
-    y = a *(np.cosh((x - x0)/a) - np.cosh(x0/a))
+def round_significant(value: float, digits=CACHE_DIGITS):
+    return float(f"{value:.{digits}g}")
+
+@lru_cache(maxsize=256)
+def catenary_curve(x0: float, y0: float, n: int):
+    '''
+    Same as `catenary`, without rounding the inputs.
+    '''
+    a = catenary_parameters(np.array([x0]), np.array([y0]))[0]
 
+    x = np.linspace(0, 2*x0, n)
+    if np.isinf(a):
+        # Straight rope
+        y = np.zeros(n)
+    else:
+        y = a *(np.cosh((x - x0)/a) - np.cosh(x0/a))
+
+    x.setflags(write=False)
+    y.setflags(write=False)
     return x, y, a
 
-class EqSlope:
-    '''
-    Equation that the slope of an elastic rope must satisfied.
+def catenary_parameters(x0: np.ndarray, y0: np.ndarray, max_iterations=200, max_expansions=100):
     '''
-    def __init__(self, a, b) -> None:
-        self.a = a
-        self.b = b
+    `a` constants of the catenaries `y = a*(cosh(x/a) - 1)` passing through the points (`x0[i]`, `y0[i]`), 
+    that is, the roots of
+
+        g(a) = a * arccosh(y0/a + 1) - x0
+
+    `g` increases monotonically from `-x0` (a -> 0) to infinity (a -> infinity), and, since 
+    `arccosh(1 + t) <= sqrt(2t)`, the root is at least `x0^2 / (2y0)`. The root is bracketed starting from this 
+    bound and is found by Newton's method, falling back to bisection (in log scale) whenever Newton's step leaves 
+    the bracket, so it always converges. All points are solved at once.
 
-        self.x = 0
+    Points with `y0 <= 0` have `a = inf` (straight rope). The bracket is doubled at most `max_expansions`
+    times, a `ValueError` is raised if it still doesn't contain the root, or if some `x0` is not positive.
+    '''
+    x0 = np.asarray(x0, dtype=float)
+    y0 = np.asarray(y0, dtype=float)
+    a = np.full(np.broadcast(x0, y0).shape, np.inf)
+    
+    solve = y0 > 0
+    x0, y0 = np.broadcast_to(x0, a.shape)[solve], np.broadcast_to(y0, a.shape)[solve]
+    if not np.all(np.isfinite(x0) & (x0 > 0)) or not np.all(np.isfinite(y0)):
+        raise ValueError("Os pontos da catenária devem ter x0 positivo e coordenadas finitas.")
+
+    def arccosh1p(t: np.ndarray):
+        '''
+        `arccosh(1 + t)` without losing precision for small `t`.
+        '''
+        return np.log1p(t + np.sqrt(t * (t + 2)))
+
+    def g(a: np.ndarray):
+        return a * arccosh1p(y0/a) - x0
+
+    # Bracket
+    low = x0**2 / (2*y0)
+    high = 2 * low
+    for _ in range(max_expansions):
+        below = g(high) < 0
+        if not below.any():
+            break
+        low[below] = high[below]
+        high[below] *= 2
+    else:
+        if np.any(g(high) < 0):
+            raise ValueError(f"A raiz da catenária não foi isolada após {max_expansions} expansões do intervalo.")
+
+    root = np.sqrt(low * high)
+    for _ in range(max_iterations):
+        value = g(root)
+        low = np.where(value < 0, root, low)
+        high = np.where(value > 0, root, high)
+
+        t = y0 / root
+        derivative = arccosh1p(t) - t / np.sqrt(t * (t + 2))
+        new_root = root - value / derivative
+
+        outside = ~((new_root > low) & (new_root < high))
+        new_root[outside] = np.sqrt(low[outside] * high[outside])
+        
+        converged = np.abs(new_root - root) <= 4 * np.finfo(float).eps * root
+        root = new_root
+        if converged.all():
+            break
 
-    def func(self, z):
-        return z - np.sinh(self.x/self.a - self.b * z) 
+    a[solve] = root
+    return a
 
 def elastic_rope(horizontal_tension: float, gap_length:float, rope_cfg: ElasticRopeConfig, n=1000):
     '''
@@ -51,40 +114,46 @@ def elastic_rope(horizontal_tension: float, gap_length:float, rope_cfg: ElasticR
     0 and `gap_length` in a coordinate system where y(0) = y(`gap_length`) = 0.
 
     The properties of the rope are in `rope_cfg`, for more info see documentation in `config.py`.
+
+    With the origin at the middle of the gap, the slope `z` of the rope satisfies `z = sinh(x/a - b*z)`,
+    where `a = H/w` and `b = H/(EA)`. Writing `z = sinh(u)`, this gives the exact parametric solution
+
+        x(u) = a * (u + b*sinh(u))
+        y(u) = a * (cosh(u) + b/2 * sinh(u)^2) + C
+
+    so only `u(x)` must be found numerically, which is done with Newton's method for all points at once.
     '''
     a = horizontal_tension / rope_cfg.weight_density
     b= a * rope_cfg.weight_density / (rope_cfg.elastic_constant * rope_cfg.cross_section_area)
 
-    eq = EqSlope(a, b)
-
     x = np.linspace(-gap_length/2, gap_length/2, n)
-    derivate = np.zeros(x.size)
-
-    init_x = np.sinh(x/a)/(b+1)
-
-    debug = np.zeros(x.size)
-
-    for id in range(x.size):
-        eq.x = x[id]
-        derivate[id] = fsolve(eq.func, init_x[id], maxfev=1000)[0]
-        debug[id] = eq.func(derivate[id])
+    u = elastic_rope_parameter(np.abs(x) / a, b) * np.sign(x)
+    
+    sinh_u = np.sinh(u)
+    rope_y = a * (np.cosh(u) + b/2 * sinh_u**2)
+    rope_y -= rope_y[0]
 
-    rope_y = np.zeros(x.size)
-    rope_y[1:] = integrate.cumulative_trapezoid(derivate, x)
-
-    # fig, (ax1, ax2) = plt.subplots(1, 2)
-    # fig, ax1 = plt.subplots()
+    return x+gap_length/2, rope_y
 
-    # ax1.plot(x, np.concatenate([np.array([0]), rope_y]))
-    # ax1.plot(x, catenaria(x, a), "--", color="red", label="Catenária")
-    # ax1.plot(x, ys, color="red")
-    # ax1.plot(x, np.sinh(x/a)/(b+1), "--")
-    # ax1.plot(x, init_x, "--", color="red")
-    # ax2.plot(x, debug)
-    # plt.legend()
-    # plt.show()
+def elastic_rope_parameter(x: np.ndarray, b: float, max_iterations=100):
+    '''
+    Solves `u + b*sinh(u) = x` for `x >= 0`.
+    
+    The left side is increasing and convex for `u >= 0`, so Newton's method starting 
+    above the root converges monotonically.
+    '''
+    # Both are upper bounds of the root.
+    u = x.copy()
+    if b > 0:
+        np.minimum(u, np.arcsinh(x / b), out=u)
+
+    for _ in range(max_iterations):
+        correction = (u + b * np.sinh(u) - x) / (1 + b * np.cosh(u))
+        u -= correction
+        if np.all(np.abs(correction) <= 4 * np.finfo(float).eps * np.maximum(u, 1)):
+            break
 
-    return x+gap_length/2, rope_y
+    return u
 
 if __name__ == "__main__":
     import matplotlib.pyplot as plt
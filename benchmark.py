@@ -0,0 +1,265 @@
+'''
+Benchmarks of the solver and analytical routines. Runs headless and saves the results as JSON.
+
+Usage:
+    python benchmark.py run -o results.json [--quick] [--sizes 10 1000 ...]
+    python benchmark.py compare old.json new.json [--threshold 0.1]
+'''
+import numpy as np
+import scipy
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+import analitycal
+from config import RopeConfig, ElementConfig, CreateConfig, ElasticRopeConfig
+from curves import Line
+from rope import Rope
+from simulation import Simulation
+from solver import Solver, Integrator, force_backends, network_force_backends, verify_backend
+from topology import Topology
+from rope_elements import RopeState
+
+SIZES = (10, 100, 1000, 10000, 100000)
+QUICK_SIZES = (10, 1000)
+DTS = (0.001, 0.01)
+
+INTEGRATOR_NAMES = {
+    Integrator.rk4: "rk4",
+    Integrator.dopri5: "dopri5",
+    Integrator.backward_euler: "backward_euler",
+    Integrator.verlet: "verlet",
+    Integrator.xpbd: "xpbd",
+}
+
+def environment() -> dict:
+    '''
+    Information about the machine and software where the benchmark ran.
+    '''
+    env = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "backends": list(force_backends),
+    }
+
+    try:
+        import numba
+        env["numba"] = numba.__version__
+    except ImportError:
+        pass
+
+    try:
+        env["commit"] = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        pass
+
+    return env
+
+def measure(func: callable, repeats: int = 5, min_time: float = 0.2) -> dict:
+    '''
+    Time per call of `func`. The number of calls per repeat is chosen so that each repeat
+    takes at least `min_time` seconds.
+    '''
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    times = np.array(timer.repeat(repeat=repeats, number=number)) / number
+
+    return {
+        "seconds": float(np.median(times)),
+        "seconds_min": float(times.min()),
+        "calls": number * repeats,
+    }
+
+def create_rope(num_points: int, spring_length: float = 0.05) -> Rope:
+    '''
+    Straight rope with `num_points` nodes.
+    '''
+    rope_cfg = RopeConfig(elastic_constant=1e4, diameter=0.01, weight_density=0.7)
+    element_cfg = ElementConfig(length=spring_length, damping=0.1)
+    Simulation.match_springs_properties(rope_cfg, element_cfg)
+
+    # `Rope.create` moves the last node to the end of the curve, so the span is
+    # half a spring longer than the nodes spacing to get exactly `num_points` nodes.
+    span = spring_length * (num_points - 0.5)
+    rope = Rope(Line(np.array([0, 0]), np.array([span, 0])), element_cfg, CreateConfig())
+    rope.create()
+    return rope
+
+def bench_solver(sizes, dts, integrators, backends, repeats):
+    results = []
+    for num_points in sizes:
+        for integrator in integrators:
+            for backend in backends:
+                for dt in dts:
+                    solver = Solver(create_rope(num_points).points, dt, integrator, backend=backend)
+
+                    # Warm up (e.g. JIT compilation)
+                    solver.update()
+
+                    r = measure(solver.update, repeats)
+                    r["steps_per_second"] = 1 / r["seconds"]
+                    results.append({
+                        "benchmark": "solver.update",
+                        "params": {"num_points": num_points, "integrator": INTEGRATOR_NAMES[integrator], "backend": backend, "dt": dt},
+                        **r,
+                    })
+                    print_result(results[-1])
+    return results
+
+def bench_rope_create(sizes, repeats):
+    results = []
+    for num_points in sizes:
+        rope = create_rope(num_points)
+        r = measure(rope.create, repeats, min_time=0.05)
+        results.append({"benchmark": "rope.create", "params": {"num_points": num_points}, **r})
+        print_result(results[-1])
+    return results
+
+def bench_network(sizes, backends, repeats):
+    '''
+    Forces evaluation of spring networks, to compare the cost per spring of a rope (chain kernel), the
+    same rope as a network and a square net.
+    '''
+    results = []
+    for num_points in sizes:
+        side = max(int(np.sqrt(num_points)), 2)
+        cases = (("chain", None), ("network_chain", Topology.chain(num_points)), ("grid", Topology.grid(side, side)))
+        for name, topology in cases:
+            n = num_points if topology is None else topology.num_points
+            state = RopeState(n, topology)
+            state.pos[:] = np.random.default_rng(0).uniform(0, 1, (n, 2))
+            state.mass[:] = 1
+            state.k[:] = 1
+            
+            for backend in backends:
+                if topology is not None and backend not in network_force_backends:
+                    continue
+
+                solver = Solver.from_state(state, 0.001, backend=backend)
+                out = np.zeros((n, 2))
+                solver.forces(state.pos, state.vel, out, update_tensions=True)
+                
+                r = measure(lambda: solver.forces(state.pos, state.vel, out, update_tensions=True), repeats)
+                r["ns_per_spring"] = r["seconds"] / state.k.size * 1e9
+                results.append({
+                    "benchmark": "solver.forces",
+                    "params": {"topology": name, "num_springs": state.k.size, "backend": backend},
+                    **r,
+                })
+                print_result(results[-1])
+    return results
+
+def bench_analytical(repeats):
+    results = []
+
+    for n in (100, 1000, 10000):
+        # Uncached solve: a different point every call.
+        points = iter(np.random.default_rng(0).uniform(0.1, 5, 10**7))
+        r = measure(lambda: analitycal.catenary_curve(2.0, next(points), n), repeats)
+        results.append({"benchmark": "analitycal.catenary", "params": {"n": n}, **r})
+        print_result(results[-1])
+
+        cfg = ElasticRopeConfig(weight_density=0.7, cross_section_area=7.85e-5, elastic_constant=1e4)
+        r = measure(lambda: analitycal.elastic_rope(1.5, 4, cfg, n), repeats)
+        results.append({"benchmark": "analitycal.elastic_rope", "params": {"n": n}, **r})
+        print_result(results[-1])
+
+    x0 = np.random.default_rng(1).uniform(0.1, 10, 10**5)
+    y0 = np.random.default_rng(2).uniform(1e-3, 10, 10**5)
+    r = measure(lambda: analitycal.catenary_parameters(x0, y0), repeats)
+    results.append({"benchmark": "analitycal.catenary_parameters", "params": {"num_points": x0.size}, **r})
+    print_result(results[-1])
+
+    return results
+
+def print_result(result: dict):
+    params = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+    print(f"{result['benchmark']:<32} {params:<70} {result['seconds']*1e3:12.4f} ms")
+
+def run(args):
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    repeats = 3 if args.quick else 5
+    integrators = (Integrator.rk4,) if args.quick else tuple(INTEGRATOR_NAMES)
+    dts = DTS[:1] if args.quick else DTS
+    backends = tuple(force_backends)
+
+    for backend in backends:
+        diff = verify_backend(backend)
+        if diff != 0:
+            print(f"Aviso: backend '{backend}' difere da referência em {diff:.3e}")
+
+    results = []
+    results += bench_solver(sizes, dts, integrators, backends, repeats)
+    results += bench_rope_create(sizes, repeats)
+    results += bench_network(sizes, backends, repeats)
+    results += bench_analytical(repeats)
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+def result_key(result: dict):
+    return result["benchmark"], json.dumps(result["params"], sort_keys=True)
+
+def compare(args):
+    '''
+    Prints the time ratio (new / old) of benchmarks present in both files, flagging regressions
+    and improvements bigger than the threshold.
+    '''
+    with open(args.old) as f:
+        old = {result_key(r): r for r in json.load(f)["results"]}
+    with open(args.new) as f:
+        new = {result_key(r): r for r in json.load(f)["results"]}
+
+    num_regressions = 0
+    for key in old:
+        if key not in new:
+            continue
+
+        ratio = new[key]["seconds"] / old[key]["seconds"]
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "REGRESSION"
+            num_regressions += 1
+        elif ratio < 1 / (1 + args.threshold):
+            flag = "improvement"
+
+        name, params = key
+        print(f"{name:<32} {params:<80} {ratio:8.3f}x {flag}")
+
+    return num_regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the rope simulator.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("-o", "--output", default="benchmark.json", help="JSON file for the results.")
+    run_parser.add_argument("--quick", action="store_true", help="Smaller set of cases.")
+    run_parser.add_argument("--sizes", type=int, nargs="+", help="Rope sizes (number of nodes).")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files.")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative change considered significant.")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        num_regressions = compare(args)
+        sys.exit(1 if num_regressions else 0)
+
+if __name__ == "__main__":
+    main()
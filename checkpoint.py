@@ -0,0 +1,300 @@
+'''
+Checkpoints of the solver, from which a simulation can be continued exactly where it was.
+
+Layout of a checkpoint file (all numbers little endian):
+
+    header:
+        Fixed fields (`HEADER_DTYPE`), followed by the solver parameters and metadata in JSON.
+    arrays:
+        The arrays in `array_sizes`, in this order, as 8 byte floats (fixed flags as 0 or 1).
+
+Floats in the JSON (time, time step, ...) are written with all their digits, so a restored
+solver continues bit for bit.
+'''
+import numpy as np
+import json
+import os
+import threading
+import time
+
+from solver import Solver, Integrator, Backend
+from rope_elements import RopeState
+from recorder import config_to_dict
+from config import AdaptiveStepConfig, ImplicitConfig, XPBDConfig
+
+MAGIC = b"ROPECKP1"
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("num_points", "<u8"),
+    ("meta_size", "<u8"),
+])
+
+# Configuration class of each integrator, see `Solver.integrator_cfg`.
+integrator_cfg_type = {Integrator.dopri5: AdaptiveStepConfig, Integrator.backward_euler: ImplicitConfig, Integrator.xpbd: XPBDConfig}
+
+def array_sizes(num_points: int, integrator: int = Integrator.rk4):
+    '''
+    Name and number of elements of each array in the file. The names are attributes of `RopeState`,
+    except for "tensions" and "last_accel", of the solver. The last acceleration is only saved for 
+    `Integrator.verlet`, which reuses it in the next step.
+    '''
+    num_springs = max(num_points - 1, 0)
+    sizes = (
+        ("pos", 2*num_points), ("vel", 2*num_points), ("tensions", num_points), ("mass", num_points),
+        ("damping", num_points), ("fix", num_points), ("k", num_springs), ("rest_length", num_springs),
+    )
+    if integrator == Integrator.verlet:
+        sizes += (("last_accel", 2*num_points),)
+    return sizes
+
+# Arrays that belong to the solver, not to its state.
+SOLVER_ARRAYS = ("tensions", "last_accel")
+
+def solver_parameters(solver: Solver) -> dict:
+    '''
+    Everything about the solver that is not in the arrays.
+    '''
+    integrator_cfg = None
+    if solver.integrator_cfg is not None:
+        integrator_cfg = config_to_dict(solver.integrator_cfg)
+
+    return {
+        "time": solver.time,
+        "dt": solver.dt,
+        "integrator": solver.integrator,
+        "integrator_cfg": integrator_cfg,
+        "backend": solver.backend,
+        "accepted": solver.stats.accepted,
+        "rejected": solver.stats.rejected,
+        "last_dt": solver.stats.last_dt,
+    }
+
+class Snapshot:
+    '''
+    Copy of the solver state, with the same layout of the file. The buffer is reused by `take`,
+    so taking snapshots does not allocate memory.
+    '''
+    def __init__(self, num_points: int, integrator: int = Integrator.rk4) -> None:
+        self.num_points = num_points
+        self.integrator = integrator
+        self.data = np.zeros(sum(size for _, size in array_sizes(num_points, integrator)), dtype="<f8")
+
+        # Views of `self.data`
+        self.arrays: dict[str, np.ndarray] = {}
+        offset = 0
+        for name, size in array_sizes(num_points, integrator):
+            self.arrays[name] = self.data[offset:offset+size]
+            offset += size
+
+        self.header_bytes: bytes = None
+
+    def take(self, solver: Solver, metadata: dict = None):
+        if solver.topology is not None:
+            raise ValueError("Checkpoints só estão disponíveis para cordas (sem topologia).")
+
+        st = solver.state
+        if self.integrator == Integrator.verlet and not solver.last_accel_valid:
+            solver.acceleration(st.pos, st.vel, solver.last_accel)
+            solver.restore_acceleration(solver.last_accel)
+
+        for name, arr in self.arrays.items():
+            source = getattr(solver, name) if name in SOLVER_ARRAYS else getattr(st, name)
+            np.copyto(arr, source.reshape(-1), casting="unsafe")
+
+        meta = {"solver": solver_parameters(solver), "metadata": metadata or {}}
+        meta_bytes = json.dumps(meta).encode()
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["num_points"] = self.num_points
+        header["meta_size"] = len(meta_bytes)
+        self.header_bytes = header.tobytes() + meta_bytes
+
+    def write(self, path: str):
+        '''
+        Writes the snapshot to `path`. The file is written under a temporary name and then renamed,
+        so `path` always holds a complete checkpoint, even if the process dies while writing.
+        '''
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.header_bytes)
+            f.write(memoryview(self.data).cast("B"))
+        os.replace(tmp_path, path)
+
+def save_checkpoint(solver: Solver, path: str, metadata: dict = None):
+    '''
+    Saves the solver state to `path`. `metadata` (serializable to JSON) is saved with it.
+    '''
+    snapshot = Snapshot(solver.num_points, solver.integrator)
+    snapshot.take(solver, metadata)
+    snapshot.write(path)
+
+class Checkpoint:
+    '''
+    Checkpoint read from a file written by `save_checkpoint` or `Checkpointer`.
+    '''
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            header = np.frombuffer(f.read(HEADER_DTYPE.itemsize), dtype=HEADER_DTYPE)[0]
+            if header["magic"] != MAGIC:
+                raise ValueError(f"'{path}' não é um arquivo de checkpoint.")
+
+            self.num_points = int(header["num_points"])
+            meta = json.loads(f.read(int(header["meta_size"])))
+            self.parameters: dict = meta["solver"]
+            self.metadata: dict = meta["metadata"]
+
+            integrator = self.parameters["integrator"]
+            num_values = sum(size for _, size in array_sizes(self.num_points, integrator))
+            data = np.fromfile(f, dtype="<f8", count=num_values)
+            if data.size != num_values:
+                raise ValueError(f"Checkpoint '{path}' está incompleto.")
+
+        self.state = RopeState(self.num_points)
+        self.tensions = np.zeros(self.num_points)
+        self.last_accel: np.ndarray = None
+        if integrator == Integrator.verlet:
+            self.last_accel = np.zeros((self.num_points, 2))
+
+        offset = 0
+        for name, size in array_sizes(self.num_points, integrator):
+            target = getattr(self, name) if name in SOLVER_ARRAYS else getattr(self.state, name)
+            target.reshape(-1)[:] = data[offset:offset+size]
+            offset += size
+
+    @property
+    def time(self) -> float:
+        return self.parameters["time"]
+
+    def create_solver(self, backend: str = None, points: list = None) -> Solver:
+        '''
+        Solver that continues the simulation from this checkpoint. The rope elements of the solver
+        are views of `self.state`.
+
+        Parameters:
+        -----------
+        backend:
+            Force kernel backend, the saved one by default. Results are bit for bit the same only
+            with the saved one.
+
+        points:
+            Elements that are views of `self.state` (e.g. `Rope.points` after `Rope.set_state`),
+            they are created if not given.
+        '''
+        p = self.parameters
+        integrator = p["integrator"]
+        integrator_cfg = None
+        if p["integrator_cfg"] is not None:
+            integrator_cfg = integrator_cfg_type[integrator](**p["integrator_cfg"])
+        if backend is None:
+            backend = p.get("backend", Backend.numpy)
+
+        if points is None:
+            points = self.state.create_elements()
+        solver = Solver(points, p["dt"], integrator, integrator_cfg, backend)
+        solver.time = p["time"]
+        np.copyto(solver.tensions, self.tensions)
+        if self.last_accel is not None:
+            solver.restore_acceleration(self.last_accel)
+        solver.stats.accepted = p["accepted"]
+        solver.stats.rejected = p["rejected"]
+        solver.stats.last_dt = p.get("last_dt")
+        return solver
+
+class Checkpointer:
+    '''
+    Saves checkpoints of the solver periodically. Add it to the solver with `Solver.add_monitor`.
+
+    When a checkpoint is due, the state is copied to a preallocated buffer and the file is written
+    by a background thread, so stepping is only blocked by the copy. If the previous checkpoint is
+    still being written, the new one is postponed to the next step.
+    '''
+    def __init__(self, path: str, every: int = None, interval: float = None, metadata: dict = None) -> None:
+        '''
+        Parameters:
+        -----------
+        path:
+            Checkpoint file, overwritten by each new checkpoint. It may contain the field `{step}`,
+            which is replaced by the number of accepted steps of the solver, to keep all checkpoints.
+
+        every:
+            Number of steps between checkpoints.
+
+        interval:
+            Wall time (s) between checkpoints. If both `every` and `interval` are given, a
+            checkpoint is saved when either is reached.
+
+        metadata:
+            Information saved in every checkpoint, must be serializable to JSON.
+        '''
+        if every is None and interval is None:
+            raise TypeError("Checkpointer.__init__() precisa de 'every' ou 'interval'.")
+
+        self.path = path
+        self.every = every
+        self.interval = interval
+        self.metadata = metadata
+
+        self.steps = 0 # Steps since the last checkpoint.
+        self.last_time = time.perf_counter()
+        self.num_saved = 0
+        self.last_path: str = None
+
+        self.snapshot: Snapshot = None
+        self.writer: threading.Thread = None
+        self.error: Exception = None # Error of the last write, raised by the next `update` or `close`.
+
+    def due(self) -> bool:
+        return (self.every is not None and self.steps >= self.every) or \
+            (self.interval is not None and time.perf_counter() - self.last_time >= self.interval)
+
+    def update(self, solver: Solver):
+        '''
+        Called by the solver after each step.
+        '''
+        self.steps += 1
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if not self.due():
+            return
+        if self.writer is not None and self.writer.is_alive():
+            return
+        self.save(solver, wait=False)
+
+    def save(self, solver: Solver, wait=True):
+        '''
+        Saves a checkpoint now. If `wait` is `True`, returns only after the file is written.
+        '''
+        if self.writer is not None:
+            self.writer.join()
+        if self.snapshot is None or self.snapshot.num_points != solver.num_points or self.snapshot.integrator != solver.integrator:
+            self.snapshot = Snapshot(solver.num_points, solver.integrator)
+
+        self.snapshot.take(solver, self.metadata)
+        self.steps = 0
+        self.last_time = time.perf_counter()
+        self.last_path = self.path.format(step=solver.stats.accepted)
+        self.num_saved += 1
+
+        self.writer = threading.Thread(target=self.write, args=(self.last_path,), daemon=True)
+        self.writer.start()
+        if wait:
+            self.close()
+
+    def write(self, path: str):
+        try:
+            self.snapshot.write(path)
+        except Exception as e:
+            self.error = e
+
+    def close(self):
+        '''
+        Waits for the checkpoint being written.
+        '''
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
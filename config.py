@@ -120,6 +120,133 @@ class CreateConfig:
         self.last_fix = last_fix
         self.first_fix = first_fix
 
+class AdaptiveStepConfig:
+    '''
+    Error control of the adaptive step integrators.
+    '''
+
+    def __init__(self, atol: float = 1e-6, rtol: float = 1e-4, dt_min: float = 1e-9, dt_max: float = None, 
+        safety: float = 0.9, min_factor: float = 0.2, max_factor: float = 5) -> None:
+        '''
+        Parameters:
+        -----------
+        atol, rtol:
+            Absolute and relative tolerances. The local error of each state component `y` must
+            be smaller than `atol + rtol * |y|`.
+        
+        dt_min, dt_max:
+            Limits of the time step. A step with `dt <= dt_min` is always accepted.
+        
+        safety:
+            Factor applied to the optimal time step estimated from the error.
+
+        min_factor, max_factor:
+            Limits of the ratio between consecutive time steps.
+        '''
+        self.atol = atol
+        self.rtol = rtol
+        self.dt_min = dt_min
+        self.dt_max = dt_max
+        self.safety = safety
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+
+class ImplicitConfig:
+    '''
+    Newton iterations of the implicit integrators.
+    '''
+
+    def __init__(self, max_iterations: int = 5, tol: float = 1e-8, max_halvings: int = 10) -> None:
+        '''
+        Parameters:
+        -----------
+        max_iterations:
+            Maximum number of Newton iterations per step. With `max_iterations = 1` the method
+            is linearly implicit (only one linear system is solved per step, and it's always accepted).
+        
+        tol:
+            Iterations stop when the biggest velocity correction is smaller than `tol`.
+
+        max_halvings:
+            A step whose iterations don't converge is rejected and split in two, at most `max_halvings`
+            times. If the smallest sub-step still doesn't converge, it's accepted with a warning.
+        '''
+        self.max_iterations = max_iterations
+        self.tol = tol
+        self.max_halvings = max_halvings
+
+class ConstraintMethod:
+    '''
+    Iterative methods of the constraint projection of `Integrator.xpbd`.
+    '''
+    gauss_seidel = 0 # Springs are projected color by color, each color seeing the corrections of the previous ones.
+    jacobi = 1 # All springs are projected at once, with the corrections scaled by the number of springs of their nodes.
+
+class XPBDConfig:
+    '''
+    Constraint projection of the position based integrator (see `xpbd.py`).
+    '''
+
+    def __init__(self, iterations: int = 20, method: int = ConstraintMethod.gauss_seidel, relaxation: float = 1,
+        inextensible: bool = False) -> None:
+        '''
+        Parameters:
+        -----------
+        iterations:
+            Number of projection iterations per step. More iterations make the constraint error
+            (`Solver.constraint_error`) smaller.
+
+        method:
+            Iterative method, one of the values in `ConstraintMethod`.
+
+        relaxation:
+            Factor applied to the scaled corrections of the Jacobi method, usually between 1 and 2.
+
+        inextensible:
+            If `True`, springs are rigid (zero compliance), otherwise their compliance is `1/k`.
+        '''
+        self.iterations = iterations
+        self.method = method
+        self.relaxation = relaxation
+        self.inextensible = inextensible
+
+class SteadyStateConfig:
+    '''
+    Thresholds of the steady state detection (see `steady_state.py`). A threshold equal to `None` is not checked.
+    '''
+
+    def __init__(self, max_speed: float = 1e-4, kinetic_energy: float = None, net_force: float = 1e-3, 
+        tension_change: float = 1e-3, window: float = 1) -> None:
+        '''
+        Parameters:
+        -----------
+        max_speed:
+            Biggest node speed (m/s).
+
+        kinetic_energy:
+            Kinetic energy of the rope (J).
+
+        net_force:
+            Biggest resultant force on a free node (springs, weight and external forces), relative 
+            to the node weight.
+
+        tension_change:
+            Biggest change rate of the tensions, relative to the biggest tension (1/s).
+
+        window:
+            The rope is settled when all metrics stay below the thresholds during `window` 
+            seconds (simulated time).
+        '''
+        self.max_speed = max_speed
+        self.kinetic_energy = kinetic_energy
+        self.net_force = net_force
+        self.tension_change = tension_change
+        self.window = window
+
+class PlotMode:
+    points = 0
+    color_tension = 1
+
 class ColorTensionConfig:
     '''
     Configuration for the rope plot, where colors in the rope indicate the intensity of
@@ -5,17 +5,20 @@ from abc import ABC, abstractmethod
 class Curve(ABC):
     '''
     A parametrized curve with the parameter being it's length.
+
+    For curves with any other parameter, see `ParametricCurve`.
     '''
 
     def __init__(self) -> None:
         self.length: float # Total lenght of the curve   
 
     @abstractmethod
-    def curve(self, s:float):
+    def curve(self, s: float | np.ndarray) -> np.ndarray:
         '''
         Parametric function, where `s` is the parameters.
 
-        This function must return the point (x(s), y(s)).
+        This function must return the point (x(s), y(s)). If `s` is an array with shape (n,), 
+        it must return all points at once, with shape (n, 2).
         '''
         pass
 
@@ -30,8 +33,8 @@ class Line(Curve):
 
         self.length = norm(c)
 
-    def curve(self, s: float):
-        return s * self.c 
+    def curve(self, s: float | np.ndarray):
+        return np.multiply.outer(s, self.c)
 
 class UCurve(Curve):
     '''
@@ -44,14 +47,57 @@ class UCurve(Curve):
 
         self.length = self.ulength + 2 * self.height
 
-    def curve(self, s: float):
-        if s < self.height:
-            return np.array([0, -1]) * s
-        elif s < (self.height + self.ulength):
-            return np.array([0, -self.height]) + np.array([s-self.height, 0])
-        else:
-            return np.array([self.ulength, -self.height]) + np.array([0, s - self.height - self.ulength])
+    def curve(self, s: float | np.ndarray):
+        s = np.asarray(s, dtype=float)
+        h, ul = self.height, self.ulength
+
+        # Left side, bottom and right side.
+        x = np.where(s < h, 0 * s, np.where(s < h + ul, s - h, ul))
+        y = np.where(s < h, -s, np.where(s < h + ul, -h, -h + (s - h - ul)))
+        return np.stack((x, y), axis=-1)
 
+class ParametricCurve(Curve):
+    '''
+    Adapter of a curve with any parameter `t` to the arc length parameter.
 
+    The curve is sampled once at `num_samples` values of `t`, giving a table of the arc length at
+    each sample (the length of the polygonal line through the samples). `curve(s)` finds `t` 
+    by interpolating this table.
+    '''
 
+    def __init__(self, func, t_start: float, t_end: float, num_samples: int = 10001) -> None:
+        '''
+        Parameters:
+        -----------
+        func:
+            Function that receives an array of parameters with shape (n,) and returns the points,
+            with shape (n, 2).
+
+        t_start, t_end:
+            Interval of the parameter.
+
+        num_samples:
+            Number of samples of the arc length table. The length error decreases with the 
+            square of the samples spacing.
+        '''
+        self.func = func
+        self.t_table = np.linspace(t_start, t_end, num_samples)
+
+        points = np.asarray(func(self.t_table), dtype=float)
+        seg_length = np.hypot(*np.diff(points, axis=0).T)
+        self.s_table = np.zeros(num_samples)
+        np.cumsum(seg_length, out=self.s_table[1:])
+
+        self.length = self.s_table[-1]
+
+    def parameter(self, s: float | np.ndarray):
+        '''
+        Parameter `t` at the arc length `s`.
+        '''
+        return np.interp(s, self.s_table, self.t_table)
 
+    def curve(self, s: float | np.ndarray):
+        t = self.parameter(s)
+        if np.ndim(t) == 0:
+            return np.asarray(self.func(np.array([t])), dtype=float)[0]
+        return np.asarray(self.func(t), dtype=float)
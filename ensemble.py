@@ -0,0 +1,171 @@
+import numpy as np
+
+import curves
+from rope import Rope
+from solver import ForceWorkspace, spring_chain_forces, rk4_stages
+from constant import G
+from config import RopeConfig, ElementConfig, CreateConfig
+
+class EnsembleSolver:
+    '''
+    Differential solver that advances many independent ropes together.
+
+    The M ropes are stored in arrays with shape (M, N, 2), where N is the biggest number of nodes
+    among the ropes. Ropes with less nodes are padded with fixed nodes attached by springs with
+    zero spring constant, so they don't interact with the real ones.
+
+    After the solver is created, the state arrays of each rope (`Rope.state`) are views into
+    the ensemble arrays, so `Rope.plot` and the rope elements keep working.
+
+    Ropes are advanced with RK4 (the same steps as `Solver` with `Integrator.rk4`). External
+    forces are added with `add_external_force`.
+    '''
+    def __init__(self, ropes: list[Rope], dt) -> None:
+        '''
+        Parameters:
+        -----------
+        ropes:
+            Ropes already created (`Rope.create` was called).
+
+        dt:
+            Time step, a single value for all ropes or one for each rope.
+        '''
+        self.ropes = ropes
+        self.num_ropes = len(ropes)
+        self.num_points = np.array([rope.num_points for rope in ropes])
+
+        self.dt = np.empty(self.num_ropes)
+        self.dt[:] = dt
+        self.time = np.zeros(self.num_ropes)
+
+        n = self.num_points.max()
+        shape = (self.num_ropes, n, 2)
+
+        # Nodes
+        self.pos = np.zeros(shape)
+        self.vel = np.zeros(shape)
+        self.mass = np.ones((self.num_ropes, n))
+        self.damping = np.zeros((self.num_ropes, n))
+        self.fix = np.ones((self.num_ropes, n), dtype=bool)
+        self.mask = np.zeros((self.num_ropes, n), dtype=bool) # `True` for nodes that are not padding.
+
+        # Springs
+        self.k = np.zeros((self.num_ropes, n-1))
+        self.rest_length = np.zeros((self.num_ropes, n-1))
+
+        for id, rope in enumerate(ropes):
+            self.add_rope_state(id, rope)
+
+        self.tensions = np.zeros((self.num_ropes, n))
+
+        # External forces on each node of each rope, `None` if there are none.
+        self.external_force: np.ndarray = None
+
+        # Workspaces
+        self.force_work = ForceWorkspace(n, (self.num_ropes,))
+        self.free = np.logical_not(self.fix)
+        self.pos_old = np.zeros(shape)
+        self.vel_old = np.zeros(shape)
+        self.pos_stage = np.zeros(shape)
+        self.vel_stage = np.zeros(shape)
+        self.k_pos = np.zeros((4, *shape))
+        self.k_vel = np.zeros((4, *shape))
+
+    def add_rope_state(self, id: int, rope: Rope):
+        '''
+        Copies the state of `rope` to the ensemble slot `id` and makes the rope state a view of it.
+        '''
+        st = rope.state
+        n = st.num_points
+
+        self.pos[id, :n] = st.pos
+        self.vel[id, :n] = st.vel
+        self.mass[id, :n] = st.mass
+        self.damping[id, :n] = st.damping
+        self.fix[id, :n] = st.fix
+        self.mask[id, :n] = True
+        self.k[id, :n-1] = st.k
+        self.rest_length[id, :n-1] = st.rest_length
+
+        # Padding nodes are kept one unit apart, so padding springs never have zero length.
+        num_pad = self.pos.shape[1] - n
+        self.pos[id, n:] = st.pos[-1] + np.arange(1, num_pad+1)[:, None] * np.array([1, 0])
+
+        st.pos = self.pos[id, :n]
+        st.vel = self.vel[id, :n]
+        st.mass = self.mass[id, :n]
+        st.damping = self.damping[id, :n]
+        st.fix = self.fix[id, :n]
+        st.k = self.k[id, :n-1]
+        st.rest_length = self.rest_length[id, :n-1]
+
+    @staticmethod
+    def from_configs(cases: list[tuple[RopeConfig, ElementConfig, CreateConfig, curves.Curve]], dt, match_spring_props=True):
+        '''
+        Creates the ropes described by each element of `cases`, which are tuples of the form
+        (rope_cfg, element_cfg, create_cfg, curve), and an ensemble solver for them.
+        '''
+        from simulation import Simulation
+
+        ropes = []
+        for rope_cfg, element_cfg, create_cfg, curve in cases:
+            if match_spring_props:
+                Simulation.match_springs_properties(rope_cfg, element_cfg)
+
+            rope = Rope(curve=curve, element_cfg=element_cfg, create_cfg=create_cfg)
+            rope.create()
+            ropes.append(rope)
+
+        return EnsembleSolver(ropes, dt)
+
+    def rope_tensions(self, id: int):
+        '''
+        Tensions of the nodes of the rope `id`.
+        '''
+        return self.tensions[id, :self.num_points[id]]
+
+    def add_external_force(self, id: int, node_id: int, force: np.ndarray):
+        '''
+        Adds the constant `force` to the node `node_id` of the rope `id`.
+        '''
+        if not 0 <= node_id < self.num_points[id]:
+            raise ValueError(f"A corda {id} não possui o nó {node_id}.")
+        if self.external_force is None:
+            self.external_force = np.zeros_like(self.pos)
+        self.external_force[id, node_id] += force
+
+    def energy(self) -> np.ndarray:
+        '''
+        Total mechanical energy (kinetic, elastic, gravitational and of the external forces) of each rope.
+        Padding nodes and springs are not included.
+        '''
+        vec = self.pos[:, 1:] - self.pos[:, :-1]
+        stretch = np.hypot(vec[..., 0], vec[..., 1]) - self.rest_length
+        elastic = 0.5 * np.einsum("ij,ij->i", self.k, stretch * stretch)
+
+        mass = self.mass * self.mask
+        kinetic = 0.5 * np.einsum("ij,ijk,ijk->i", mass, self.vel, self.vel)
+        potential = G * np.einsum("ij,ij->i", mass, self.pos[..., 1])
+        if self.external_force is not None:
+            potential -= np.einsum("ijk,ijk->i", self.external_force, self.pos)
+
+        return kinetic + elastic + potential
+
+    def acceleration(self, pos: np.ndarray, vel: np.ndarray, out: np.ndarray, update_tensions=False):
+        '''
+        Acceleration of all nodes of all ropes at the state (`pos`, `vel`), written to `out`.
+        '''
+        tensions = self.tensions if update_tensions else None
+        spring_chain_forces(pos, vel, self.k, self.rest_length, self.damping, self.mass, self.force_work, out, tensions,
+            self.external_force)
+
+        out /= self.mass[..., None]
+        out *= self.free[..., None]
+
+    def update(self):
+        '''
+        Advance one time step (RK4) of every rope.
+        '''
+        np.logical_not(self.fix, out=self.free)
+        rk4_stages(self.acceleration, self.pos, self.vel, self.free[..., None], self.dt[:, None, None], self)
+        self.time += self.dt
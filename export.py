@@ -0,0 +1,236 @@
+'''
+Offline export of the simulation animation (PNG frames, GIF or video).
+
+The export is done in three phases:
+
+    1. Simulation: the simulation runs headless and its frames are recorded (see `recorder.py`).
+    2. Rendering: the frames are split in contiguous chunks, which are rendered to PNG by a pool
+       of processes. Each process owns an Agg figure with the same graphs of the interactive
+       simulation (`graph.SimulationGraphs`) and blits the frames of its chunk.
+    3. Assembly: the PNG frames are joined into the output file.
+
+The axes limits and the colors range are computed from the whole recording before rendering,
+so they are the same in all frames, regardless of which process renders it.
+'''
+import numpy as np
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from solver import Solver
+from rope import Rope
+from recorder import Recorder, Recording
+from worker import solver_spec, create_solver
+from timer import Profiler
+
+FRAME_NAME = "frame_{:06d}.png"
+FRAME_PATTERN = "frame_%06d.png"
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".avi", ".mov")
+
+# Fraction of the data range added around it in the fixed axes limits.
+LIMITS_MARGIN = 0.1
+
+# Number of chunks of frames per render process, more chunks balance better the load.
+CHUNKS_PER_WORKER = 4
+
+class RenderSpec:
+    '''
+    What a render process needs to draw the frames. It can be pickled for any rope size.
+    '''
+    def __init__(self, solver: Solver, curve, element_cfg, create_cfg, plot_mode: int, rope_graph_cfg, show_tension: bool,
+        recording_path: str, frames_dir: str, dpi: float) -> None:
+        self.solver_spec = solver_spec(solver)
+        self.curve = curve
+        self.element_cfg = element_cfg
+        self.create_cfg = create_cfg
+        self.plot_mode = plot_mode
+        self.rope_graph_cfg = rope_graph_cfg
+        self.show_tension = show_tension
+        self.recording_path = recording_path
+        self.frames_dir = frames_dir
+        self.dpi = dpi
+
+        # Fixed limits, see `data_limits`.
+        self.rope_ylim: tuple[float] = None
+        self.tension_ylim: tuple[float] = None
+        self.tension_range: tuple[float] = None
+
+class Renderer:
+    '''
+    Figure of a render process, showing the recorded frames.
+    '''
+    def __init__(self, spec: RenderSpec) -> None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from graph import SimulationGraphs, BlitManager
+
+        self.spec = spec
+        self.recording = Recording(spec.recording_path)
+
+        self.solver = create_solver(spec.solver_spec)
+        self.rope = Rope(spec.curve, spec.element_cfg, spec.create_cfg)
+        self.rope.set_state(self.solver.state)
+
+        self.fig = Figure(figsize=SimulationGraphs.figure_size(spec.show_tension), dpi=spec.dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+
+        # Texts are changed every frame, since frames are not rendered in real time.
+        self.graphs = SimulationGraphs(self.fig, self.rope, self.solver, spec.plot_mode, spec.rope_graph_cfg, spec.show_tension,
+            Profiler(enabled=False), info_refresh_interval=0)
+
+        self.load_frame(0)
+        self.graphs.init()
+        self.graphs.set_limits(spec.rope_ylim, spec.tension_ylim, spec.tension_range)
+        self.blit_manager = BlitManager(self.fig, self.graphs.animated_artists(), self.graphs.cached_artists())
+
+    def load_frame(self, frame_id: int):
+        frame = self.recording.frames[frame_id]
+        st = self.solver.state
+        self.solver.time = float(frame["time"])
+        np.copyto(st.pos, frame["pos"])
+        np.copyto(st.vel, frame["vel"])
+        np.copyto(self.solver.tensions, frame["tensions"])
+
+    def render(self, frame_id: int):
+        from PIL import Image
+
+        self.load_frame(frame_id)
+        full_redraw = self.graphs.update()
+        self.blit_manager.update(full_redraw)
+
+        image = Image.frombuffer("RGBA", self.canvas.get_width_height(), self.canvas.buffer_rgba(), "raw", "RGBA", 0, 1)
+        image.convert("RGB").save(os.path.join(self.spec.frames_dir, FRAME_NAME.format(frame_id)), compress_level=1)
+
+renderer: Renderer = None # Renderer of the current render process.
+
+def init_renderer(spec: RenderSpec):
+    global renderer
+    renderer = Renderer(spec)
+
+def render_chunk(frame_ids: range) -> int:
+    for frame_id in frame_ids:
+        renderer.render(frame_id)
+    return len(frame_ids)
+
+def data_limits(recording: Recording, spec: RenderSpec):
+    '''
+    Sets in `spec` the axes limits and colors range that contain the data of all frames.
+    '''
+    y = recording.pos[:, :, 1]
+    ymin, ymax = float(y.min()), float(y.max())
+    margin = LIMITS_MARGIN * (ymax - ymin)
+    spec.rope_ylim = (min(-1, ymin - margin), max(0.5, ymax + margin))
+
+    tensions = recording.tensions
+    tensions = tensions[np.isfinite(tensions)]
+    if tensions.size == 0:
+        tmin, tmax = 0, 1
+    else:
+        tmin, tmax = float(tensions.min()), float(tensions.max())
+    if tmax == tmin:
+        tmax = tmin + 1
+    margin = LIMITS_MARGIN * (tmax - tmin)
+    spec.tension_ylim = (min(0, tmin - margin), tmax + margin)
+    spec.tension_range = (tmin, tmax)
+
+def render_frames(spec: RenderSpec, num_frames: int, workers: int = None):
+    '''
+    Renders the frames `0` to `num_frames-1` of the recording in `workers` processes
+    (the number of processors by default).
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, num_frames))
+
+    num_chunks = min(num_frames, workers * CHUNKS_PER_WORKER)
+    bounds = np.linspace(0, num_frames, num_chunks + 1).astype(int)
+    chunks = [range(bounds[i], bounds[i+1]) for i in range(num_chunks)]
+
+    if workers == 1:
+        init_renderer(spec)
+        for chunk in chunks:
+            render_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=init_renderer, initargs=(spec,)) as executor:
+        for _ in executor.map(render_chunk, chunks):
+            pass
+
+def frame_paths(frames_dir: str, num_frames: int):
+    return [os.path.join(frames_dir, FRAME_NAME.format(i)) for i in range(num_frames)]
+
+def assemble_gif(path: str, frames_dir: str, num_frames: int, fps: float):
+    from PIL import Image
+
+    paths = frame_paths(frames_dir, num_frames)
+    first = Image.open(paths[0])
+    others = (Image.open(p) for p in paths[1:])
+    first.save(path, save_all=True, append_images=others, duration=1000/fps, loop=0)
+
+def find_ffmpeg(path: str):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError(f"ffmpeg não foi encontrado, necessário para exportar '{path}'.")
+    return ffmpeg
+
+def assemble_video(path: str, frames_dir: str, fps: float):
+    ffmpeg = find_ffmpeg(path)
+    subprocess.run([
+        ffmpeg, "-y", "-loglevel", "error",
+        "-framerate", str(fps),
+        "-i", os.path.join(frames_dir, FRAME_PATTERN),
+        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", # yuv420p needs even dimensions.
+        "-pix_fmt", "yuv420p",
+        path,
+    ], check=True)
+
+def export(simulation, path: str, duration: float, fps: float = None, workers: int = None, dpi: float = 100, frames_dir: str = None):
+    '''
+    Simulates and exports the animation of `simulation` (see `Simulation.export`).
+    '''
+    if fps is None:
+        fps = simulation.fps
+    num_frames = max(1, round(duration * fps))
+
+    ext = os.path.splitext(path)[1].lower()
+    output_frames = ext not in (".gif", *VIDEO_EXTENSIONS)
+    if output_frames:
+        frames_dir = path
+    elif ext in VIDEO_EXTENSIONS:
+        # Fails before simulating.
+        find_ffmpeg(path)
+
+    tmp_dir = tempfile.mkdtemp(prefix="rope_export_")
+    try:
+        if frames_dir is None:
+            frames_dir = tmp_dir
+        os.makedirs(frames_dir, exist_ok=True)
+
+        spec = RenderSpec(simulation.solver, simulation.curve, simulation.element_cfg, simulation.rope.create_cfg, simulation.plot_mode,
+            simulation.rope_graph_cfg, simulation.show_tension, os.path.join(tmp_dir, "recording.rope"), frames_dir, dpi)
+
+        # Simulation
+        solver = simulation.solver
+        recorder = Recorder(spec.recording_path, solver, every=simulation.num_frame_steps)
+        solver.add_monitor(recorder)
+        try:
+            simulation.run_headless(num_steps=(num_frames - 1) * simulation.num_frame_steps)
+        finally:
+            solver.remove_monitor(recorder)
+            recorder.close()
+
+        # Rendering
+        recording = Recording(spec.recording_path)
+        data_limits(recording, spec)
+        del recording
+        render_frames(spec, num_frames, workers)
+
+        # Assembly
+        if ext == ".gif":
+            assemble_gif(path, frames_dir, num_frames, fps)
+        elif ext in VIDEO_EXTENSIONS:
+            assemble_video(path, frames_dir, fps)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -1,4 +1,3 @@
-import matplotlib.pyplot as plt
 from matplotlib.collections import LineCollection
 from matplotlib.figure import Figure
 from matplotlib.axes import Axes
@@ -6,20 +5,93 @@ from matplotlib.lines import Line2D
 from matplotlib.collections import LineCollection
 from matplotlib.text import Text
 from matplotlib.artist import Artist
+from matplotlib.colors import Normalize
 import numpy as np
+import time
 from abc import ABC, abstractmethod
 
 from solver import Solver
 from rope import Rope, Side
-from config import ColorTensionConfig, ElasticRopeConfig, RopeConfig
+from config import ColorTensionConfig, ElasticRopeConfig, RopeConfig, PlotMode
 import analitycal
 from constant import G
-from timer import TimeIt
+from timer import Profiler, Section, PERCENTILES
 from constant import G
 
-class PlotMode:
-    points = 0
-    color_tension = 1
+# When data leaves the view, the axes limits are expanded past it by this fraction of the view span,
+# so a slowly drifting rope causes few rescales.
+LIMIT_MARGIN = 0.25
+
+# The color limits are set to the tension range plus this margin (relative to the range), and are only
+# changed when the tensions leave them or their range becomes smaller than `NORM_SHRINK` of the limits.
+NORM_MARGIN = 0.25
+NORM_SHRINK = 0.4
+
+# Maximum number of nodes drawn individually (segments of `ColorTension` and markers of `Points`),
+# more than that can't be distinguished on the screen.
+MAX_DRAWN_NODES = 2000
+
+def draw_stride(num_points: int):
+    '''
+    Long ropes are drawn with every `draw_stride`-th node.
+    '''
+    return -(-num_points // MAX_DRAWN_NODES)
+
+class BlitManager:
+    '''
+    Redraws only the animated artists on top of a cached background of the figure (blitting).
+
+    The background is captured after every full draw of the figure, which is needed whenever
+    something that is not animated changes (e.g. axes limits or the colorbar).
+
+    Artists in `cached_artists` (e.g. texts, which are expensive to draw) are only redrawn when
+    they change (they are stale), otherwise the pixels of their last drawing are restored.
+    '''
+    def __init__(self, fig: Figure, artists: list[Artist], cached_artists: list[Artist] = ()) -> None:
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.artists = artists
+        self.cached_artists = cached_artists
+        self.background = None
+        self.cache = {} # Pixels of the last drawing of each cached artist.
+
+        for artist in (*artists, *cached_artists):
+            artist.set_animated(True)
+        
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.cache.clear()
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.cached_artists:
+            cached = self.cache.get(artist)
+            if cached is None or artist.stale:
+                self.fig.draw_artist(artist)
+                self.cache[artist] = self.canvas.copy_from_bbox(artist.get_window_extent())
+            else:
+                self.canvas.restore_region(cached)
+
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def update(self, full_redraw=False):
+        '''
+        Shows the current state of the artists. If `full_redraw` is `True`, the whole figure is drawn.
+        '''
+        if not self.canvas.supports_blit:
+            self.canvas.draw_idle()
+            return
+
+        if full_redraw or self.background is None:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_artists()
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
 
 class RopeGraph(ABC):
     '''
@@ -34,6 +106,7 @@ class RopeGraph(ABC):
         self.cfg = cfg
 
         self.graph: Artist = None
+        self.autoscale = True # If `False`, axes limits and colors range are not adjusted to the data.
 
     @abstractmethod
     def init(self):
@@ -43,21 +116,34 @@ class RopeGraph(ABC):
         pass
 
     @abstractmethod
-    def update(self):
+    def update(self) -> bool:
         '''
-        Updates the plot.
+        Updates the plot. Returns `True` if something besides `artists()` changed (e.g. the axes limits),
+        so the whole figure must be redrawn.
         '''
         pass
 
+    def artists(self) -> list[Artist]:
+        '''
+        Artists changed by `update`.
+        '''
+        return [self.graph]
+
     def adjust_limits(self, y: np.ndarray):
         '''
-        Make sure all the rope is always on view.
+        Make sure all the rope is always on view. Returns `True` if the limits changed.
         '''
-        ymin = self.ax.get_ylim()[0]
+        if not self.autoscale:
+            return False
+
+        ymin, ymax = self.ax.get_ylim()
         rope_ymin = y.min()
 
         if rope_ymin * 1.1 < ymin:
-            self.ax.set_ylim(bottom=rope_ymin * 1.1)
+            margin = max(LIMIT_MARGIN * (ymax - ymin), -0.1 * rope_ymin)
+            self.ax.set_ylim(bottom=rope_ymin - margin)
+            return True
+        return False
 
 class Points(RopeGraph):
     '''
@@ -70,14 +156,13 @@ class Points(RopeGraph):
 
     def init(self):
         x, y = self.rope.plot()
-        self.graph, = self.ax.plot(x, y, "o-", color="Black")
+        self.graph, = self.ax.plot(x, y, "o-", color="Black", markevery=draw_stride(self.rope.num_points))
         
     def update(self):
-        x, y = self.rope.plot()
-        self.graph.set_xdata(x)
-        self.graph.set_ydata(y)
+        pos = self.rope.state.pos
+        self.graph.set_data(pos[:, 0], pos[:, 1])
 
-        self.adjust_limits(y)
+        return self.adjust_limits(pos[:, 1])
 
 class ColorTension(RopeGraph):
     '''
@@ -90,32 +175,74 @@ class ColorTension(RopeGraph):
         self.solver: Solver = additional_pars["solver"]
         self.cfg: ColorTensionConfig
         self.graph: LineCollection = None
+        self.norm: Normalize = None
+
+        # Nodes drawn, long ropes are drawn with every `draw_stride`-th node (and the last one).
+        num_points = self.rope.num_points
+        self.node_ids = np.unique(np.r_[np.arange(0, num_points, draw_stride(num_points)), num_points - 1])
+        self.node_pos = np.zeros((self.node_ids.size, 2))
+
+        # Segment i goes from the drawn node i to i+1, with the color of the tension at node i.
+        self.segments = np.zeros((self.node_ids.size - 1, 2, 2))
+        self.colors = np.zeros(self.node_ids.size - 1)
+        self.shared_segments = False # If the collection paths are views of `self.segments`.
+
+    def fill_segments(self):
+        np.take(self.rope.state.pos, self.node_ids, axis=0, out=self.node_pos)
+        np.copyto(self.segments[:, 0], self.node_pos[:-1])
+        np.copyto(self.segments[:, 1], self.node_pos[1:])
+        np.take(self.solver.tensions, self.node_ids[:-1], out=self.colors)
 
     def init(self):
-        x, y = self.rope.plot()
-        points = np.array([x, y]).T.reshape(-1, 1, 2)
-        segments = np.concatenate([points[:-1], points[1:]], axis=1)
-        norm = plt.Normalize(self.cfg.min, self.cfg.max)
-        lc = LineCollection(segments, cmap='viridis', norm=norm)
-        lc.set_array(self.solver.tensions)
+        self.fill_segments()
+        self.norm = Normalize(self.cfg.min, self.cfg.max)
+        lc = LineCollection(self.segments, cmap='viridis', norm=self.norm)
+        lc.set_array(self.colors)
         lc.set_linewidth(2)
         self.graph = self.ax.add_collection(lc)
 
+        # The collection paths are created once, with vertices that are views of `self.segments`,
+        # so filling it moves the rope without creating new paths.
+        self.shared_segments = np.shares_memory(self.graph.get_paths()[0].vertices, self.segments)
+
         cbar = self.fig.colorbar(self.graph, ax=self.ax)
         cbar.ax.set_ylabel('Tensão (N)', rotation=270, labelpad=10)
 
         self.ax.set_title("Corda")
 
+    def update_norm(self):
+        '''
+        Adjusts the color limits to the tensions range (see `NORM_MARGIN`). Returns `True` 
+        if the limits changed.
+        '''
+        if not self.autoscale:
+            return False
+
+        norm = self.norm
+        tensions = self.solver.tensions
+        vmin, vmax = tensions.min(), tensions.max()
+        if not np.isfinite(vmax - vmin):
+            return False
+        if norm.scaled() and norm.vmin <= vmin and vmax <= norm.vmax and vmax - vmin >= NORM_SHRINK * (norm.vmax - norm.vmin):
+            return False
+
+        margin = NORM_MARGIN * (vmax - vmin)
+        norm.vmin = max(vmin - margin, min(vmin, 0)) # Never negative for positive tensions.
+        norm.vmax = vmax + margin
+        return True
+
     def update(self):
-        x, y = self.rope.plot()
-        points = np.array([x, y]).T.reshape(-1, 1, 2)
-        segments = np.concatenate([points[:-1], points[1:]], axis=1)
+        self.fill_segments()
+        if self.shared_segments:
+            self.graph.stale = True
+        else:
+            self.graph.set_segments(self.segments)
         
-        self.graph.set_norm(plt.Normalize(self.solver.tensions.min(), self.solver.tensions.max()))
-        self.graph.set_segments(segments)
-        self.graph.set_array(self.solver.tensions)
-            
-        self.adjust_limits(y)
+        norm_changed = self.update_norm()
+        self.graph.set_array(self.colors)
+
+        limits_changed = self.adjust_limits(self.rope.state.pos[:, 1])
+        return norm_changed or limits_changed
 
 class AnalyticalRopesGraph:
     class RigidInfo:
@@ -156,13 +283,9 @@ class AnalyticalRopesGraph:
         self.elastic_graph.set_ydata(y)
 
     def update_rigid(self):
-        flecha = self.rope.points[0].pos[1]
-        length = 0
-        for p in self.rope.points[1:]:
-            length += np.linalg.norm(p.pos - p.springs[Side.left].get_pos(Side.left))
-            if p.pos[1] < flecha:
-                flecha = p.pos[1]
-        flecha = abs(flecha)
+        diagnostics = self.solver.diagnostics()
+        length = diagnostics.length
+        flecha = abs(diagnostics.lowest_pos[1])
         gap = self.rope.curve.length
 
         total_mass = self.rope.num_points * self.rope.point_mass
@@ -206,6 +329,7 @@ class TensionGraph:
         self.x = np.arange(len(self.solver.points))
     
         self.graph: Line2D = None
+        self.autoscale = True # If `False`, the axes limits are not adjusted to the data.
 
     def init(self):
         self.graph, = self.ax.plot(self.x, self.solver.tensions)
@@ -213,8 +337,16 @@ class TensionGraph:
         self.ax.set_title("Tensão em cada nodo da corda")
         self.ax.set_ylabel("Tensão (N)")
 
+    def artists(self) -> list[Artist]:
+        return [self.graph]
+
     def update(self):
+        '''
+        Returns `True` if the axes limits changed.
+        '''
         self.graph.set_ydata(self.solver.tensions)
+        if not self.autoscale:
+            return False
         
         ymin, ymax = self.ax.get_ylim()
         max_tension = self.solver.tensions.max()
@@ -237,50 +369,200 @@ class TensionGraph:
         #         self.ax.set_ylim(**{limit: new_ylim})
 
         if max_tension*1.1 > ymax:
-            self.ax.set_ylim(top=max_tension*1.1)
+            margin = max(LIMIT_MARGIN * (ymax - ymin), 0.1 * max_tension)
+            self.ax.set_ylim(top=max_tension + margin)
+            return True
+        return False
 
 class Info:
-    def __init__(self, ax: Axes, solver: Solver, time_it: TimeIt) -> None:
+    def __init__(self, ax: Axes, solver: Solver, profiler: Profiler, profile_depth: int = 2, refresh_interval: float = 0.25) -> None:
+        '''
+        Parameters:
+        -----------
+        profiler:
+            Its sections up to the depth `profile_depth` are shown below the info.
+
+        refresh_interval:
+            Minimum wall time (s) between text changes, since texts are expensive to draw.
+        '''
         self.ax = ax
         self.solver = solver
-        self.time_it = time_it
+        self.profiler = profiler
+        self.profile_depth = profile_depth
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0
 
         self.text: Text = None
+        self.profile_text: Text = None
 
     def get_info(self):
+        diagnostics = self.solver.diagnostics()
+
+        update_time = 0
+        for section in self.profiler.root.children.values():
+            section = section.children.get("solver.update", section)
+            if section.name == "solver.update":
+                update_time = section.stats().get("mean_ms", 0)
+                break
+
         return (
-            f"Energia: {self.solver.energy():.5f}  |  "
-            f"$F_R$ (N): {self.total_force()} \n"
-            f"$\Delta$T (ms): {self.time_it.mean_time():.3f} | "
+            f"Energia: {diagnostics.total_energy:.5f}  |  "
+            f"$F_R$ (N): {diagnostics.net_force} \n"
+            f"$\Delta$T (ms): {update_time:.3f} | "
             f"t (s): {self.solver.time:.3f}"
         )
+
+    def get_profile(self):
+        if not self.profiler.enabled:
+            return ""
+
+        lines = [f"{' | '.join(f'p{p}' for p in PERCENTILES)} (ms)"]
+        def add_lines(section: Section, depth: int):
+            if depth >= self.profile_depth:
+                return
+            for child in section.children.values():
+                stats = child.stats()
+                if "mean_ms" in stats:
+                    percentiles = " | ".join(f"{stats[f'p{p}_ms']:.2f}" for p in PERCENTILES)
+                    lines.append(f"{'  '*depth}{child.name}: {percentiles}")
+                add_lines(child, depth + 1)
+        add_lines(self.profiler.root, 0)
+
+        return "\n".join(lines)
     
     def total_force(self):
-        from constant import G
-        t1 = -self.solver.spring_forces(self.solver.points[0], [Side.right])[0]
-        t2 = -self.solver.spring_forces(self.solver.points[-1], [Side.left])[0]
-
-        total_mass = 0
-        for p in self.solver.points:
-            if p.fix:
-                continue
-            total_mass += p.mass
-
-        weight =  np.array([0, -1]) * G * total_mass 
-        fr = weight + t1 + t2
-        for _, f in self.solver.external_forces:
-            fr += f
-
-        return fr
+        return self.solver.diagnostics().net_force
 
     def init(self):
         self.ax.axis('off')
         s = self.get_info()
         self.text = self.ax.text(0, 0, s)
+        self.profile_text = self.ax.text(0, -1.6, self.get_profile(), va="top", fontsize=6, family="monospace")
+
+    def artists(self) -> list[Artist]:
+        return [self.text, self.profile_text]
 
     def update(self):
+        now = time.perf_counter()
+        if now - self.last_refresh < self.refresh_interval:
+            return False
+        self.last_refresh = now
+
         s = self.get_info()
         self.text.set_text(s)
+        self.profile_text.set_text(self.get_profile())
+        return False
+
+
+rope_graph_manager_type: dict[int, RopeGraph] = {PlotMode.points: Points, PlotMode.color_tension: ColorTension}
+
+class SimulationGraphs:
+    '''
+    Layout of the simulation figure and its graph managers. It's used by the interactive 
+    simulation (`Simulation.run`) and by the animation export (`export.py`).
+    '''
+    def __init__(self, fig: Figure, rope: Rope, solver: Solver, plot_mode: int, rope_graph_cfg=None, show_tension=False, 
+        profiler: Profiler = None, rope_cfg: RopeConfig = None, info_refresh_interval: float = 0.25) -> None:
+        '''
+        Parameters:
+        -----------
+        fig:
+            Empty figure, with the size given by `figure_size`.
 
+        plot_mode, rope_graph_cfg:
+            Type (one of the values in `PlotMode`) and configuration of the rope graph.
 
-rope_graph_manager_type: dict[int, RopeGraph] = {PlotMode.points: Points, PlotMode.color_tension: ColorTension}
\ No newline at end of file
+        show_tension:
+            If `True`, the tension of each node is plotted beside the rope.
+
+        profiler:
+            Profiler shown in the info panel. Updates of the graphs are timed in it.
+
+        rope_cfg:
+            If given, the analytical ropes graph is created (`self.analytical`).
+        '''
+        self.fig = fig
+        self.show_tension = show_tension
+        if profiler is None:
+            profiler = Profiler(enabled=False)
+        self.profiler = profiler
+
+        if show_tension:
+            self.ax_rope, self.ax_tension = fig.subplots(1, 2)
+            self.ax_tension.set_ylim(0, 0.01)
+        else:
+            self.ax_rope = fig.subplots()
+            self.ax_tension = None
+        self.ax_rope.set_ylim(-1, 0.5)
+        fig.subplots_adjust(left=0.15)
+        self.ax_info = fig.add_axes([0.01, 0.9, 0.1, 0.04])
+
+        additional_pars = None
+        if plot_mode == PlotMode.color_tension:
+            additional_pars = {"solver": solver}
+        self.rope_graph: RopeGraph = rope_graph_manager_type[plot_mode](fig, self.ax_rope, rope, additional_pars, rope_graph_cfg)
+
+        self.tension: TensionGraph = None
+        if show_tension:
+            self.tension = TensionGraph(self.ax_tension, solver)
+
+        self.analytical: AnalyticalRopesGraph = None
+        if rope_cfg is not None:
+            self.analytical = AnalyticalRopesGraph(self.ax_rope, rope, solver, rope_cfg)
+
+        self.info = Info(self.ax_info, solver, profiler, refresh_interval=info_refresh_interval)
+
+    @staticmethod
+    def figure_size(show_tension: bool):
+        if show_tension:
+            return (14, 6)
+        return (13, 5)
+
+    def init(self):
+        self.info.init()
+        self.rope_graph.init()
+        if self.analytical is not None:
+            self.analytical.init()
+        if self.tension is not None:
+            self.tension.init()
+
+    def animated_artists(self) -> list[Artist]:
+        '''
+        Artists that change every frame.
+        '''
+        artists = self.rope_graph.artists()
+        if self.tension is not None:
+            artists += self.tension.artists()
+        return artists
+
+    def cached_artists(self) -> list[Artist]:
+        '''
+        Artists that change, but are expensive to draw (see `BlitManager`).
+        '''
+        return self.info.artists()
+
+    def set_limits(self, rope_ylim: tuple[float], tension_ylim: tuple[float], tension_range: tuple[float]):
+        '''
+        Fixes the axes limits and the colors range, which are not adjusted to the data anymore.
+        '''
+        self.rope_graph.autoscale = False
+        self.ax_rope.set_ylim(*rope_ylim)
+        if isinstance(self.rope_graph, ColorTension):
+            self.rope_graph.norm.vmin, self.rope_graph.norm.vmax = tension_range
+        if self.tension is not None:
+            self.tension.autoscale = False
+            self.ax_tension.set_ylim(*tension_ylim)
+
+    def update(self) -> bool:
+        '''
+        Updates all graphs. Returns `True` if the whole figure must be redrawn.
+        '''
+        section = self.profiler.section
+        with section("Info.update"):
+            self.info.update()
+        with section(f"{type(self.rope_graph).__name__}.update"):
+            full_redraw = self.rope_graph.update()
+        if self.tension is not None:
+            with section("TensionGraph.update"):
+                full_redraw |= self.tension.update()
+        return full_redraw
@@ -30,3 +30,4 @@ sim = Simulation(rope_cfg, element_cfg, create_cfg, curve, dt=0.01, rope_plot_mo
 print(element_cfg)
 
 sim.run()
+# sim.export("corda.gif", duration=5)
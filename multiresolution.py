@@ -0,0 +1,153 @@
+'''
+Coarse-to-fine (multiresolution) initialization of the rope.
+
+The rope is first settled with a coarse discretization, whose long elements reach the
+equilibrium shape in few steps. The settled shape is resampled onto a finer discretization,
+which is settled in its turn, and so on until the discretization of the simulation.
+
+The coarse ropes are created from the rope of the simulation (see `coarsen`), so they model
+the same rope. Shapes are resampled by the arc length of the unstretched rope (the cumulative
+rest length of the springs), normalized by the rope total rest length, so the stretch
+distribution along the rope is kept.
+'''
+import numpy as np
+import time
+import warnings
+
+from rope_elements import RopeState
+from solver import Solver
+from config import SteadyStateConfig
+from steady_state import SteadyStateDetector
+
+class LevelResult:
+    '''
+    Statistics of the settling of one level.
+    '''
+    def __init__(self, num_points: int, dt: float) -> None:
+        self.num_points = num_points
+        self.dt = dt
+        self.settled = False
+        self.sim_time: float = 0
+        self.num_steps = 0
+        self.wall_time: float = 0
+
+def material_coordinates(rest_length: np.ndarray) -> np.ndarray:
+    '''
+    Normalized arc length of the unstretched rope at each node.
+    '''
+    u = np.zeros(rest_length.size + 1)
+    np.cumsum(rest_length, out=u[1:])
+    u /= u[-1]
+    return u
+
+def resample(pos: np.ndarray, rest_length: np.ndarray, new_rest_length: np.ndarray) -> np.ndarray:
+    '''
+    Positions of the nodes of a rope with springs rest lengths `new_rest_length` placed along the
+    shape of the rope with nodes at `pos` and springs rest lengths `rest_length`.
+    '''
+    u = material_coordinates(rest_length)
+    new_u = material_coordinates(new_rest_length)
+    new_pos = np.empty((new_u.size, 2))
+    new_pos[:, 0] = np.interp(new_u, u, pos[:, 0])
+    new_pos[:, 1] = np.interp(new_u, u, pos[:, 1])
+    return new_pos
+
+def lump(values: np.ndarray, u: np.ndarray, coarse_u: np.ndarray) -> np.ndarray:
+    '''
+    Node values (e.g. masses) at the material coordinates `u` lumped into the nodes at `coarse_u`:
+    each value is split between the two closest coarse nodes, proportionally to the distance to the
+    other one, so the total is kept.
+    '''
+    right = np.clip(np.searchsorted(coarse_u, u, side="right"), 1, coarse_u.size - 1)
+    left = right - 1
+    weight = (u - coarse_u[left]) / (coarse_u[right] - coarse_u[left])
+
+    lumped = np.bincount(left, values * (1 - weight), minlength=coarse_u.size)
+    lumped += np.bincount(right, values * weight, minlength=coarse_u.size)
+    return lumped
+
+def coarsen(state: RopeState, num_springs: int) -> RopeState:
+    '''
+    The rope of `state` discretized with `num_springs` springs of equal rest length. The total rest 
+    length, mass, damping and compliance (springs in series) are kept. Masses and damping coefficients
+    are lumped along the rope (see `lump`), so the damping rate (damping over mass) of a uniform rope
+    is the same at all discretizations. Only the end nodes can be fixed (as created by `Rope.create`).
+    '''
+    coarse = RopeState(num_springs + 1)
+
+    u = material_coordinates(state.rest_length)
+    coarse_u = np.linspace(0, 1, num_springs + 1)
+    coarse.rest_length[:] = state.rest_length.sum() / num_springs
+
+    # Compliance (1/k) of the springs between consecutive coarse nodes.
+    compliance = np.zeros(u.size)
+    np.cumsum(1 / state.k, out=compliance[1:])
+    coarse.k[:] = 1 / np.diff(np.interp(coarse_u, u, compliance))
+
+    coarse.mass[:] = lump(state.mass, u, coarse_u)
+    coarse.damping[:] = lump(state.damping, u, coarse_u)
+    coarse.fix[[0, -1]] = state.fix[[0, -1]]
+
+    coarse.pos[:] = resample(state.pos, state.rest_length, coarse.rest_length)
+    return coarse
+
+def settle(solver: Solver, steady_state: SteadyStateConfig, max_time: float, result: LevelResult):
+    detector = SteadyStateDetector(steady_state)
+    solver.add_monitor(detector)
+
+    t1 = time.perf_counter()
+    while not detector.settled and solver.time < max_time:
+        solver.update()
+        if not np.isfinite(solver.state.pos).all():
+            raise RuntimeError(f"A simulação do nível com {solver.num_points} nós divergiu.")
+    result.wall_time = time.perf_counter() - t1
+
+    solver.remove_monitor(detector)
+    result.settled = detector.settled
+    result.sim_time = solver.time
+    result.num_steps = detector.steps
+
+def settle_coarse_to_fine(simulation, levels: int = 3, factor: float = 2, steady_state: SteadyStateConfig = None,
+    max_time: float = 100) -> list[LevelResult]:
+    '''
+    Sets the rope of `simulation` to the shape found by settling coarser ropes (see `Simulation.multiresolution_init`).
+    Levels that would have less than two springs are skipped, with a warning.
+    '''
+    if steady_state is None:
+        steady_state = SteadyStateConfig(max_speed=1e-3, net_force=1e-2, tension_change=1e-2, window=0.5)
+
+    solver: Solver = simulation.solver
+    st = solver.state
+    num_springs = st.num_points - 1
+    results = []
+
+    pos: np.ndarray = None
+    rest_length: np.ndarray = None
+    for level in range(levels - 1, 0, -1):
+        scale = factor**level
+        level_springs = round(num_springs / scale)
+        if level_springs < 2:
+            warnings.warn(f"Nível com {level_springs} molas (fator {scale:g}) ignorado, são necessárias ao menos 2.")
+            continue
+
+        coarse = coarsen(st, level_springs)
+        if pos is not None:
+            coarse.pos[:] = resample(pos, rest_length, coarse.rest_length)
+
+        # The stable time step of explicit integrators is proportional to the elements length.
+        dt = solver.dt * num_springs / level_springs
+        coarse_solver = Solver.from_state(coarse, dt, solver.integrator, solver.integrator_cfg, solver.backend)
+        coarse_solver.profiler = solver.profiler
+
+        result = LevelResult(coarse.num_points, dt)
+        settle(coarse_solver, steady_state, max_time, result)
+        results.append(result)
+
+        pos = coarse.pos
+        rest_length = coarse.rest_length
+
+    if pos is not None:
+        st.pos[:] = resample(pos, rest_length, st.rest_length)
+        st.vel[:] = 0
+
+    return results
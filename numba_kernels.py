@@ -0,0 +1,133 @@
+'''
+Force kernels compiled with Numba. Importing this module raises `ImportError` if Numba
+is not installed.
+'''
+import numpy as np
+import math
+import numba
+
+from constant import G
+
+@numba.njit(cache=True)
+def chain_forces_kernel(pos, vel, k, rest_length, damping, mass, g, out, tensions, update_tensions, external, has_external):
+    '''
+    Single pass version of `solver.spring_chain_forces` (without batching). The floating point
+    operations are done in the same order, so results are identical.
+    '''
+    n = pos.shape[0]
+
+    # Force intensity and components of the spring on the left of the current node.
+    left_force = 0.0
+    left_fx = 0.0
+    left_fy = 0.0
+    for i in range(n):
+        fx = -(vel[i, 0] * damping[i])
+        fy = -(vel[i, 1] * damping[i])
+
+        force = 0.0
+        if i < n - 1:
+            dx = pos[i+1, 0] - pos[i, 0]
+            dy = pos[i+1, 1] - pos[i, 1]
+            length = math.hypot(dx, dy)
+            force = (length - rest_length[i]) * k[i]
+            factor = force / length
+
+            spring_fx = dx * factor
+            spring_fy = dy * factor
+            fx += spring_fx
+            fy += spring_fy
+
+        if i > 0:
+            fx -= left_fx
+            fy -= left_fy
+
+        fy -= g * mass[i]
+
+        if has_external:
+            fx += external[i, 0]
+            fy += external[i, 1]
+
+        out[i, 0] = fx
+        out[i, 1] = fy
+
+        if update_tensions:
+            if i == 0:
+                tensions[i] = abs(force)
+            elif i == n - 1:
+                tensions[i] = abs(left_force)
+            else:
+                tensions[i] = max(abs(left_force), abs(force))
+
+        if i < n - 1:
+            left_force = force
+            left_fx = spring_fx
+            left_fy = spring_fy
+
+EMPTY_1D = np.zeros(0)
+EMPTY_2D = np.zeros((0, 2))
+
+def numba_chain_forces(pos: np.ndarray, vel: np.ndarray, k: np.ndarray, rest_length: np.ndarray, damping: np.ndarray,
+    mass: np.ndarray, work, out: np.ndarray, tensions: np.ndarray = None, external: np.ndarray = None):
+    '''
+    Same as `solver.spring_chain_forces`, but fusing all forces in a single pass without temporaries.
+    Only a single chain is supported (no batching), and `work` is not used.
+    '''
+    update_tensions = tensions is not None
+    has_external = external is not None
+    chain_forces_kernel(pos, vel, k, rest_length, damping, mass, G, out,
+        tensions if update_tensions else EMPTY_1D, update_tensions,
+        external if has_external else EMPTY_2D, has_external)
+
+@numba.njit(cache=True)
+def network_forces_kernel(pos, vel, first, second, k, rest_length, damping, mass, g, out, tensions, update_tensions, external, has_external):
+    '''
+    Version of `topology.spring_network_forces` with a single pass over the springs, where each
+    spring force is added to its nodes as soon as it's computed. The floating point operations are
+    done in the same order, so results are identical.
+    '''
+    n = pos.shape[0]
+    for i in range(n):
+        out[i, 0] = 0.0
+        out[i, 1] = 0.0
+        if update_tensions:
+            tensions[i] = 0.0
+
+    for e in range(first.shape[0]):
+        a = first[e]
+        b = second[e]
+        dx = pos[b, 0] - pos[a, 0]
+        dy = pos[b, 1] - pos[a, 1]
+        length = math.hypot(dx, dy)
+        force = (length - rest_length[e]) * k[e]
+        factor = force / length
+
+        spring_fx = dx * factor
+        spring_fy = dy * factor
+        out[a, 0] += spring_fx
+        out[a, 1] += spring_fy
+        out[b, 0] -= spring_fx
+        out[b, 1] -= spring_fy
+
+        if update_tensions:
+            force = abs(force)
+            tensions[a] = max(tensions[a], force)
+            tensions[b] = max(tensions[b], force)
+
+    for i in range(n):
+        out[i, 0] = -(vel[i, 0] * damping[i]) + out[i, 0]
+        out[i, 1] = -(vel[i, 1] * damping[i]) + out[i, 1]
+        out[i, 1] -= g * mass[i]
+        if has_external:
+            out[i, 0] += external[i, 0]
+            out[i, 1] += external[i, 1]
+
+def numba_network_forces(pos: np.ndarray, vel: np.ndarray, topology, k: np.ndarray, rest_length: np.ndarray, damping: np.ndarray,
+    mass: np.ndarray, work, out: np.ndarray, tensions: np.ndarray = None, external: np.ndarray = None):
+    '''
+    Same as `topology.spring_network_forces`, but without temporaries. `work` is not used.
+    '''
+    update_tensions = tensions is not None
+    has_external = external is not None
+    network_forces_kernel(pos, vel, topology.first, topology.second, k, rest_length, damping, mass, G, out,
+        tensions if update_tensions else EMPTY_1D, update_tensions,
+        external if has_external else EMPTY_2D, has_external)
@@ -0,0 +1,265 @@
+'''
+Recording of simulations to binary files.
+
+Layout of a recording file (all numbers little endian):
+
+    header:
+        Fixed fields (`HEADER_DTYPE`), followed by the metadata in JSON.
+    static arrays:
+        Node masses, fixed flags (as float), springs constants, springs rest lengths and, for
+        networks (states with a topology), the nodes of each spring (`Topology.edges`, as integers).
+    frames:
+        `num_frames` records of `frame_dtype(num_points)`.
+
+The header plus static arrays region is padded to a multiple of `ALIGNMENT`, so frames start at
+a page boundary.
+'''
+
+import numpy as np
+import json
+
+from solver import Solver
+from topology import Topology
+
+MAGIC = b"ROPEREC2"
+ALIGNMENT = 4096
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("data_offset", "<u8"), # Where the frames start.
+    ("num_points", "<u8"),
+    ("num_frames", "<u8"),
+    ("meta_size", "<u8"),
+    ("num_springs", "<u8"),
+    ("network", "<u8"), # 1 if the springs nodes (edges) are saved.
+])
+
+def frame_dtype(num_points: int):
+    '''
+    Data type of a single frame.
+    '''
+    return np.dtype([
+        ("step", "<i8"),
+        ("time", "<f8"),
+        ("pos", "<f8", (num_points, 2)),
+        ("vel", "<f8", (num_points, 2)),
+        ("tensions", "<f8", (num_points,)),
+    ])
+
+def static_sizes(num_points: int, num_springs: int, network=False):
+    '''
+    Number of elements and data type of each static array.
+    '''
+    sizes = (("mass", num_points, "<f8"), ("fix", num_points, "<f8"), ("k", num_springs, "<f8"), ("rest_length", num_springs, "<f8"))
+    if network:
+        sizes += (("edges", 2*num_springs, "<i8"),)
+    return sizes
+
+def config_to_dict(cfg) -> dict:
+    '''
+    Attributes of a configuration object (see `config.py`) as a dictionary that can be saved as JSON.
+    '''
+    d = {}
+    for name, value in vars(cfg).items():
+        name = name.split("__")[-1]
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        elif isinstance(value, np.generic):
+            value = value.item()
+        d[name] = value
+    return d
+
+class Recorder:
+    '''
+    Records the solver state (positions, velocities and tensions) every `every` steps into a
+    memory-mapped file. Add it to the solver with `Solver.add_monitor`.
+
+    The file space is preallocated in chunks of `chunk_frames` frames, and it's flushed to disk
+    only once per chunk, so recording is just a copy into memory most of the time. Call `close`
+    when done; the frame count in the header is updated on every flush, so a file whose writer
+    died is readable up to the last flush.
+    '''
+    def __init__(self, path: str, solver: Solver, every: int = 1, metadata: dict = None, chunk_frames: int = 1024) -> None:
+        '''
+        Parameters:
+        -----------
+        path:
+            File to write. It's overwritten if it exists.
+
+        solver:
+            Solver to be recorded. Its current state is the first frame.
+
+        every:
+            Number of steps between frames.
+
+        metadata:
+            Information to be saved in the header, must be serializable to JSON.
+
+        chunk_frames:
+            Number of frames allocated (and flushed) at once.
+        '''
+        self.path = path
+        self.every = every
+        self.chunk_frames = chunk_frames
+        self.num_points = solver.num_points
+        self.frame_dtype = frame_dtype(self.num_points)
+
+        st = solver.state
+        topology = st.topology
+        sizes = static_sizes(self.num_points, st.k.size, topology is not None)
+
+        if metadata is None:
+            metadata = {}
+        metadata = dict(metadata, dt=solver.dt, integrator=solver.integrator)
+        meta_bytes = json.dumps(metadata).encode()
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["num_points"] = self.num_points
+        header["meta_size"] = len(meta_bytes)
+        header["num_springs"] = st.k.size
+        header["network"] = topology is not None
+
+        static_size = sum(np.dtype(dtype).itemsize * size for _, size, dtype in sizes)
+        data_offset = HEADER_DTYPE.itemsize + len(meta_bytes) + static_size
+        data_offset = -(-data_offset // ALIGNMENT) * ALIGNMENT
+        header["data_offset"] = data_offset
+        self.data_offset = data_offset
+
+        with open(path, "wb") as f:
+            f.write(header.tobytes())
+            f.write(meta_bytes)
+            for name, _, dtype in sizes:
+                source = topology if name == "edges" else st
+                f.write(np.ascontiguousarray(getattr(source, name), dtype=dtype).tobytes())
+            f.truncate(data_offset)
+
+        self.header = np.memmap(path, dtype=HEADER_DTYPE, mode="r+", shape=(1,))
+
+        self.capacity = 0
+        self.frames: np.memmap = None
+        self.grow()
+
+        self.num_frames = 0
+        self.steps = 0
+        self.write_frame(solver)
+
+    def grow(self):
+        '''
+        Allocates one more chunk of frames in the file.
+        '''
+        if self.frames is not None:
+            self.frames.flush()
+            del self.frames
+
+        self.capacity += self.chunk_frames
+        with open(self.path, "r+b") as f:
+            f.truncate(self.data_offset + self.capacity * self.frame_dtype.itemsize)
+
+        self.frames = np.memmap(self.path, dtype=self.frame_dtype, mode="r+", offset=self.data_offset, shape=(self.capacity,))
+
+    def write_frame(self, solver: Solver):
+        if self.num_frames == self.capacity:
+            self.flush()
+            self.grow()
+
+        frame = self.frames[self.num_frames]
+        frame["step"] = self.steps
+        frame["time"] = solver.time
+        frame["pos"] = solver.state.pos
+        frame["vel"] = solver.state.vel
+        frame["tensions"] = solver.tensions
+        self.num_frames += 1
+
+        if self.num_frames % self.chunk_frames == 0:
+            self.flush()
+
+    def update(self, solver: Solver):
+        '''
+        Called by the solver after each step.
+        '''
+        self.steps += 1
+        if self.steps % self.every == 0:
+            self.write_frame(solver)
+
+    def flush(self):
+        self.frames.flush()
+        self.header["num_frames"] = self.num_frames
+        self.header.flush()
+
+    def close(self):
+        '''
+        Flushes the remaining frames and removes the unused preallocated space.
+        '''
+        self.flush()
+        del self.frames
+        self.frames = None
+
+        with open(self.path, "r+b") as f:
+            f.truncate(self.data_offset + self.num_frames * self.frame_dtype.itemsize)
+
+class Recording:
+    '''
+    Recording read from a file written by `Recorder`. Frames are memory-mapped, so slicing
+    them (e.g. `recording.pos[:, node_id]`) does not load the whole file.
+
+    Recordings of networks have the `topology` of the recorded state, otherwise it's `None`.
+    '''
+    def __init__(self, path: str) -> None:
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+        if header["magic"] != MAGIC:
+            raise ValueError(f"'{path}' não é um arquivo de gravação.")
+
+        self.path = path
+        self.num_points = int(header["num_points"])
+        self.num_frames = int(header["num_frames"])
+        num_springs = int(header["num_springs"])
+        network = bool(header["network"])
+
+        offset = HEADER_DTYPE.itemsize
+        meta_size = int(header["meta_size"])
+        with open(path, "rb") as f:
+            f.seek(offset)
+            self.metadata: dict = json.loads(f.read(meta_size))
+        offset += meta_size
+
+        for name, size, dtype in static_sizes(self.num_points, num_springs, network):
+            setattr(self, name, np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(size,)))
+            offset += size * np.dtype(dtype).itemsize
+        self.fix = self.fix.astype(bool)
+
+        self.topology: Topology = None
+        if network:
+            self.topology = Topology(self.num_points, np.array(self.edges).reshape(-1, 2))
+
+        if self.num_frames == 0:
+            self.frames = np.zeros(0, dtype=frame_dtype(self.num_points))
+        else:
+            self.frames = np.memmap(path, dtype=frame_dtype(self.num_points), mode="r",
+                offset=int(header["data_offset"]), shape=(self.num_frames,))
+
+    @property
+    def steps(self):
+        return self.frames["step"]
+
+    @property
+    def times(self):
+        return self.frames["time"]
+
+    @property
+    def pos(self):
+        return self.frames["pos"]
+
+    @property
+    def vel(self):
+        return self.frames["vel"]
+
+    @property
+    def tensions(self):
+        return self.frames["tensions"]
+
+    def node_history(self, id: int):
+        '''
+        Positions of the node `id` in all frames.
+        '''
+        return self.pos[:, id]
@@ -1,7 +1,7 @@
 import numpy as np
 
 from curves import Curve
-from rope_elements import Point, Spring, Side
+from rope_elements import Spring, Side, RopeState, ElementViews
 from config import ElementConfig, CreateConfig
 
 class Rope:
@@ -35,7 +35,27 @@ class Rope:
         self.create_cfg = create_cfg
 
         self.num_points = 0
-        self.points = []
+        self.points: ElementViews = []
+        self.springs: ElementViews = []
+        self.state: RopeState = None
+
+    def node_parameters(self) -> np.ndarray:
+        '''
+        Curve parameter (arc length) of each node: zero, then the spring length, and then increments 
+        of the spring length times `multiplier`, while smaller than the curve length. The last node is
+        moved to the end of the curve by `create`.
+        '''
+        step = self.spring_length * self.create_cfg.multiplier
+        num_max = max(int((self.curve.length - self.spring_length) / step) + 2, 1)
+
+        # Accumulated in sequence, giving the same values of adding the step node by node.
+        s = np.full(num_max + 1, step)
+        s[0] = 0
+        s[1] = self.spring_length
+        np.add.accumulate(s[1:], out=s[1:])
+
+        num_points = 1 + np.count_nonzero(s[1:] < self.curve.length)
+        return s[:num_points]
 
     def create(self):
         '''
@@ -44,50 +64,44 @@ class Rope:
         Neighboring springs of the node are attached to the node. 
 
         The first and last node are fixed.
+
+        The state of all elements is created directly in contiguous arrays (`self.state`), and
+        the elements are views into them (see `RopeState.create_elements`).
         '''
+        s = self.node_parameters()
+        self.num_points = s.size
 
-        self.points = [Point(self.curve.curve(0), self.point_mass/2, fix=self.create_cfg.first_fix)]
-        s = self.spring_length
+        st = RopeState(self.num_points)
+        st.pos[:] = self.curve.curve(s)
+        st.pos[-1] = self.curve.curve(self.curve.length)
 
-        while s < self.curve.length:
-            point = Point(self.curve.curve(s), self.point_mass, damping=self.damping)
-            
-            self.points.append(point)
+        st.mass[:] = self.point_mass
+        st.mass[0] = self.point_mass/2
+        st.mass[-1] *= 1/2
+        st.damping[1:] = self.damping
+        st.fix[0] = self.create_cfg.first_fix
+        st.fix[-1] = self.create_cfg.last_fix
 
-            spring = Spring(self.k, self.spring_length)
-            self.points[-1].attach_spring(Side.left, spring)
-            self.points[-2].attach_spring(Side.right, spring)
+        st.k[:] = self.k
+        st.rest_length[:] = self.spring_length
 
-            s += self.spring_length* self.create_cfg.multiplier
-        
-        self.points[-1].mass *= 1/2
-        self.points[-1].pos = self.curve.curve(self.curve.length)
-        
-        self.points[-1].fix = self.create_cfg.last_fix
+        self.set_state(st)
 
-        self.num_points = len(self.points)
+    def set_state(self, state: RopeState):
+        '''
+        Replaces the rope by the one in `state` (used directly, not copied), instead of creating it with `create`.
+        '''
+        self.state = state
+        self.points = state.create_elements()
+        self.springs = ElementViews(state, Spring)
+        self.num_points = state.num_points
     
     def plot(self):
         '''
         Graph of the rope (node positions).
         '''
 
-        x_list = np.zeros(self.num_points)
-        y_list = np.zeros(self.num_points)
-        for id in range(self.num_points):
-            x_list[id] = self.points[id].pos[0]
-            y_list[id] = self.points[id].pos[1]
-
-            # xs = [self.points[id -1].pos[0], self.points[id].pos[0]]
-            # ys = [self.points[id -1].pos[1], self.points[id].pos[1]]
-
-            # x_list.extend(xs)
-            # y_list.extend(ys)
-
-            # plt.plot(xs, ys, color="black")
-            # plt.plot(xs, ys, "o-", color="black")
-            # plt.scatter(xs, ys)
-        # plt.show()
+        x_list = self.state.pos[:, 0].copy()
+        y_list = self.state.pos[:, 1].copy()
 
         return x_list, y_list
-
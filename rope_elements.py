@@ -1,5 +1,7 @@
 import numpy as np
 
+from topology import Topology
+
 class Side:
     '''
     Class for naming the side index.
@@ -11,6 +13,133 @@ class Side:
     def sides() -> tuple[int]:
         return Side.left, Side.right
 
+class RopeState:
+    '''
+    State of all rope elements stored in contiguous arrays. Node `i` is connected to
+    node `i+1` by spring `i`, unless a `topology` is given, in which case the springs link
+    the nodes given by it (see `topology.py`).
+
+    `Point` and `Spring` instances bound to a state are lightweight views into these arrays.
+    '''
+
+    def __init__(self, num_points: int, topology: Topology = None) -> None:
+        self.num_points = num_points
+        self.topology = topology
+
+        # Nodes
+        self.pos = np.zeros((num_points, 2))
+        self.vel = np.zeros((num_points, 2))
+        self.mass = np.zeros(num_points)
+        self.damping = np.zeros(num_points)
+        self.fix = np.zeros(num_points, dtype=bool)
+
+        # Springs
+        num_springs = max(num_points - 1, 0) if topology is None else topology.num_edges
+        self.k = np.zeros(num_springs)
+        self.rest_length = np.zeros(num_springs)
+
+    @staticmethod
+    def from_points(points: list["Point"]) -> "RopeState":
+        '''
+        State of the chain formed by `points` (in order). If they already are views of
+        the same state, in the same order, that state is returned, otherwise a new one
+        is created and `points` (and the springs between them) are bound to it.
+        '''
+        if isinstance(points, ElementViews) and points.element_type is Point:
+            return points.state
+
+        state = points[0].state
+        if state.num_points == len(points) and all(p.state is state and p.id == id for id, p in enumerate(points)):
+            return state
+
+        state = RopeState(len(points))
+        for id, p in enumerate(points):
+            p.bind(state, id)
+            spring = p.springs[Side.right]
+            if spring is not None and id < len(points) - 1:
+                spring.bind(state, id)
+
+        return state
+
+    def copy(self) -> "RopeState":
+        state = RopeState(self.num_points, self.topology)
+        for name in ("pos", "vel", "mass", "damping", "fix", "k", "rest_length"):
+            np.copyto(getattr(state, name), getattr(self, name))
+        return state
+
+    def create_elements(self) -> "ElementViews":
+        '''
+        Points, with the springs between them attached, that are views of this state (see `ElementViews`).
+        '''
+        return ElementViews(self, Point)
+
+    def point(self, id: int) -> "Point":
+        '''
+        View of the node `id`, with views of its springs attached. The springs are attached to views 
+        of the neighbor nodes as well, which have no other spring attached.
+
+        Nodes of networks (states with a topology) have no springs attached, since `Point.springs`
+        only holds the two sides of a chain. Use `Topology.node_springs` for them.
+        '''
+        point = Point.view(self, id)
+        if self.topology is not None:
+            return point
+        if id > 0:
+            spring = Spring.view(self, id - 1)
+            Point.view(self, id - 1).attach_spring(Side.right, spring)
+            point.attach_spring(Side.left, spring)
+        if id < self.num_points - 1:
+            spring = Spring.view(self, id)
+            point.attach_spring(Side.right, spring)
+            Point.view(self, id + 1).attach_spring(Side.left, spring)
+        return point
+
+    def spring(self, id: int) -> "Spring":
+        '''
+        View of the spring `id`, attached to views of its nodes.
+        '''
+        left, right = id, id + 1
+        if self.topology is not None:
+            left, right = self.topology.edges[id]
+
+        spring = Spring.view(self, id)
+        Point.view(self, left).attach_spring(Side.right, spring)
+        Point.view(self, right).attach_spring(Side.left, spring)
+        return spring
+
+class ElementViews:
+    '''
+    Sequence of the points (or springs) of a state. Elements are created only when accessed, as
+    views of the state (see `RopeState.point`), so the sequence costs nothing to create for any 
+    number of elements. Each access creates a new view, changes are only kept in the state.
+    '''
+    def __init__(self, state: RopeState, element_type: type) -> None:
+        self.state = state
+        self.element_type = element_type
+        if element_type is Point:
+            self.size = state.num_points
+            self.create = state.point
+        else:
+            self.size = state.k.size
+            self.create = state.spring
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, id):
+        if isinstance(id, slice):
+            return [self.create(i) for i in range(*id.indices(self.size))]
+
+        if id < 0:
+            id += self.size
+        if not 0 <= id < self.size:
+            raise IndexError(f"Índice {id} fora do intervalo.")
+        return self.create(id)
+
+    def __iter__(self):
+        for id in range(self.size):
+            yield self.create(id)
+
 class Spring:
     '''
     Massless Spring
@@ -26,11 +155,52 @@ class Spring:
                 Length of the spring at equilibrium.
         '''
 
+        # Until the spring is bound to a rope state, it owns a state of its own.
+        self.state = RopeState(2)
+        self.id = 0
+
         self.k = k
         self.default_lenght = default_lenght
 
         self.points: list[Point] = [None, None] # Points which this spring is attached to.
 
+    @staticmethod
+    def view(state: "RopeState", id: int) -> "Spring":
+        '''
+        Spring that is a view of the spring `id` of `state`, without changing it.
+        '''
+        spring = Spring.__new__(Spring)
+        spring.state = state
+        spring.id = id
+        spring.points = [None, None]
+        return spring
+
+    @property
+    def k(self):
+        return self.state.k[self.id]
+
+    @k.setter
+    def k(self, value: float):
+        self.state.k[self.id] = value
+
+    @property
+    def default_lenght(self):
+        return self.state.rest_length[self.id]
+
+    @default_lenght.setter
+    def default_lenght(self, value: float):
+        self.state.rest_length[self.id] = value
+
+    def bind(self, state: "RopeState", id: int):
+        '''
+        Moves this spring properties to the spring `id` of `state`, after that this spring is a view of it.
+        '''
+        state.k[id] = self.k
+        state.rest_length[id] = self.default_lenght
+
+        self.state = state
+        self.id = id
+
     def get_pos(self, side: int):
         '''
         Position of the attached point in the side `side`.
@@ -79,6 +249,10 @@ class Point:
             If `True`, this elements can't be moved by any force.
         '''
 
+        # Until the point is bound to a rope state, it owns a state of its own.
+        self.state = RopeState(1)
+        self.id = 0
+
         self.mass = mass
         self.pos = pos
         self.vel = vel
@@ -89,6 +263,71 @@ class Point:
 
         self.springs: list[Spring] = [None, None] # Spring thar are attached to this element.
 
+    @staticmethod
+    def view(state: "RopeState", id: int) -> "Point":
+        '''
+        Point that is a view of the node `id` of `state`, without changing it.
+        '''
+        point = Point.__new__(Point)
+        point.state = state
+        point.id = id
+        point.acel = np.zeros([0, 0])
+        point.springs = [None, None]
+        return point
+
+    @property
+    def pos(self):
+        return self.state.pos[self.id]
+
+    @pos.setter
+    def pos(self, value: np.ndarray):
+        self.state.pos[self.id] = value
+
+    @property
+    def vel(self):
+        return self.state.vel[self.id]
+
+    @vel.setter
+    def vel(self, value: np.ndarray):
+        self.state.vel[self.id] = value
+
+    @property
+    def mass(self):
+        return self.state.mass[self.id]
+
+    @mass.setter
+    def mass(self, value: float):
+        self.state.mass[self.id] = value
+
+    @property
+    def damping(self):
+        return self.state.damping[self.id]
+
+    @damping.setter
+    def damping(self, value: float):
+        self.state.damping[self.id] = value
+
+    @property
+    def fix(self):
+        return self.state.fix[self.id]
+
+    @fix.setter
+    def fix(self, value: bool):
+        self.state.fix[self.id] = value
+
+    def bind(self, state: "RopeState", id: int):
+        '''
+        Moves this point properties to the node `id` of `state`, after that this point is a view of it.
+        '''
+        state.pos[id] = self.pos
+        state.vel[id] = self.vel
+        state.mass[id] = self.mass
+        state.damping[id] = self.damping
+        state.fix[id] = self.fix
+
+        self.state = state
+        self.id = id
+
     def get_pos(self, side: int):
         return self.pos
 
@@ -1,23 +1,55 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.widgets import Button
-import matplotlib.animation as animation
+import time
 
 # from PauloTCC.cabo import Cabo
 import curves
-from solver import Solver
+from solver import Solver, Integrator, Backend
 from rope import Rope
 from config import *
-from graph import PlotMode, rope_graph_manager_type, RopeGraph, AnalyticalRopesGraph, TensionGraph, Info
-from timer import TimeIt
+from timer import profiler
+from worker import PhysicsWorker
+from steady_state import SteadyStateDetector
+from checkpoint import Checkpoint, save_checkpoint
 
 
+class HeadlessResult:
+    '''
+    Result of `Simulation.run_headless`.
+    '''
+    def __init__(self) -> None:
+        # Final state
+        self.pos: np.ndarray = None
+        self.vel: np.ndarray = None
+        self.tensions: np.ndarray = None
+        self.time: float = None
+        
+        self.num_steps: int = 0
+        self.wall_time: float = 0 # Real time spent stepping (s).
+
+        # Steady state, if it was detected (see `steady_state.SteadyStateDetector`).
+        self.settled = False
+        self.settle_time: float = None # Time and step since when the rope is settled.
+        self.settle_step: int = None
+        
+        # Sampled snapshots, the first axis is the sample index.
+        self.sample_times: np.ndarray = None
+        self.sample_pos: np.ndarray = None
+        self.sample_vel: np.ndarray = None
+        self.sample_tensions: np.ndarray = None
+
+    @property
+    def steps_per_second(self):
+        if self.wall_time == 0:
+            return 0
+        return self.num_steps / self.wall_time
+
 class Simulation: 
     '''
     Simulated the rope with the given configurations and plot the simulation.
     '''
     def __init__(self, rope_cfg: RopeConfig, element_cfg: ElementConfig, create_cfg: CreateConfig, curve: curves.Curve, 
-        dt:float, rope_plot_mode=PlotMode.points, rope_graph_cfg=None, show_tension=False, match_spring_props=True, fps=60, num_frame_steps=1) -> None:
+        dt:float, rope_plot_mode=PlotMode.points, rope_graph_cfg=None, show_tension=False, match_spring_props=True, fps=60, num_frame_steps=1,
+        integrator=Integrator.rk4, integrator_cfg=None, backend=Backend.numpy) -> None:
         self.rope_cfg = rope_cfg
         self.element_cfg = element_cfg
         self.curve = curve
@@ -27,7 +59,7 @@ class Simulation:
 
         self.rope = Rope(curve=curve, element_cfg=element_cfg, create_cfg=create_cfg)
         self.rope.create()
-        self.solver = Solver(self.rope.points, dt)
+        self.solver = Solver(self.rope.points, dt, integrator, integrator_cfg, backend)
 
         self.plot_mode = rope_plot_mode
         self.rope_graph_cfg = rope_graph_cfg
@@ -36,8 +68,6 @@ class Simulation:
         self.fps = fps
         self.num_frame_steps = num_frame_steps
 
-        self.time_it = TimeIt(num_samples=200)
-
     @staticmethod
     def match_springs_properties(cable_cfg: RopeConfig, element_cfg: ElementConfig):
         '''
@@ -55,79 +85,277 @@ class Simulation:
             element_cfg.lenght = element_cfg.mass / cable_cfg.mass_density
             element_cfg.k = cable_cfg.elastic_constant * cable_cfg.area / element_cfg.lenght
 
-    def run(self):
+    def run_headless(self, num_steps: int = None, until_time: float = None, sample_every: int = None, 
+        steady_state: SteadyStateConfig = None) -> HeadlessResult:
+        '''
+        Run the simulation as fast as possible, without plotting it (matplotlib is never imported).
+
+        Parameters:
+        -----------
+        num_steps:
+            Number of steps to advance.
+        
+        until_time:
+            Simulated time to stop at. If both `num_steps` and `until_time` are given, 
+            the simulation stops at whichever is reached first.
+
+        sample_every:
+            If given, a snapshot of the state is saved every `sample_every` steps 
+            (the initial state included).
+
+        steady_state:
+            If given, the simulation stops when the rope settles (see `steady_state.SteadyStateDetector`),
+            or at `num_steps` or `until_time`, whichever is reached first. If only this is given, the
+            simulation runs until the rope settles.
+        '''
+        if num_steps is None and until_time is None and steady_state is None:
+            raise TypeError("Simulation.run_headless() precisa de 'num_steps', 'until_time' ou 'steady_state'.")
+
+        solver = self.solver
+        state = solver.state
+        
+        samples = []
+        def take_sample():
+            samples.append((solver.time, state.pos.copy(), state.vel.copy(), solver.tensions.copy()))
+
+        detector = None
+        if steady_state is not None:
+            detector = SteadyStateDetector(steady_state)
+            solver.add_monitor(detector)
+
+        step = 0
+        t1 = time.perf_counter()
+        while True:
+            if sample_every is not None and step % sample_every == 0:
+                take_sample()
+
+            if num_steps is not None and step >= num_steps:
+                break
+            if until_time is not None and solver.time >= until_time - solver.dt * 1e-6:
+                break
+            if detector is not None and detector.settled:
+                break
+
+            if until_time is not None and solver.integrator == Integrator.dopri5:
+                # Adaptive steps must not overshoot the final time.
+                solver.dt = min(solver.dt, until_time - solver.time)
+
+            solver.update()
+            step += 1
+        t2 = time.perf_counter()
+
+        if detector is not None:
+            solver.remove_monitor(detector)
+
+        result = HeadlessResult()
+        result.pos = state.pos.copy()
+        result.vel = state.vel.copy()
+        result.tensions = solver.tensions.copy()
+        result.time = solver.time
+        result.num_steps = step
+        result.wall_time = t2 - t1
+        if detector is not None:
+            result.settled = detector.settled
+            result.settle_time = detector.settle_time
+            result.settle_step = detector.settle_step
+
+        if samples:
+            times, pos, vel, tensions = zip(*samples)
+            result.sample_times = np.array(times)
+            result.sample_pos = np.stack(pos)
+            result.sample_vel = np.stack(vel)
+            result.sample_tensions = np.stack(tensions)
+
+        return result
+
+    def multiresolution_init(self, levels: int = 3, factor: float = 2, steady_state: SteadyStateConfig = None, max_time: float = 100):
+        '''
+        Moves the rope to a shape close to its equilibrium, found by settling coarser discretizations
+        of the same rope (see `multiresolution.py`). The velocities are set to zero.
+
+        Parameters:
+        -----------
+        levels:
+            Number of discretizations, including the one of the simulation.
+
+        factor:
+            Ratio between the elements lengths of consecutive levels. The time step of each level is 
+            the one of the simulation times the same ratio.
+
+        steady_state:
+            When a level is settled. By default, thresholds looser than the `SteadyStateConfig` defaults 
+            are used, since the shape is refined by the next levels.
+
+        max_time:
+            Maximum simulated time (s) of each level.
+
+        Returns the statistics of each coarse level (`multiresolution.LevelResult`), from the coarsest.
+        Levels that would have less than two springs are skipped (with a warning).
+        '''
+        from multiresolution import settle_coarse_to_fine
+        return settle_coarse_to_fine(self, levels, factor, steady_state, max_time)
+
+    def save_checkpoint(self, path: str, metadata: dict = None):
+        '''
+        Saves the current state of the simulation to `path` (see `checkpoint.py`). For periodic
+        checkpoints, add a `checkpoint.Checkpointer` to the solver.
+        '''
+        save_checkpoint(self.solver, path, metadata)
+
+    def load_checkpoint(self, path: str) -> Checkpoint:
+        '''
+        Continues the simulation from the checkpoint in `path`, replacing the rope and the solver. 
+        The rope configurations used to create this simulation are ignored.
+        '''
+        checkpoint = Checkpoint(path)
+        self.rope.set_state(checkpoint.state)
+        self.solver = checkpoint.create_solver(points=self.rope.points)
+        return checkpoint
+
+    def run(self, profile=True, worker=None, steady_state: SteadyStateConfig = None):
         '''
         Run the simulation while plotting it.
+
+        Parameters:
+        -----------
+        profile:
+            If `True`, the module profiler (`timer.profiler`) is enabled while the simulation
+            runs and its statistics are shown in the info panel. Its previous state is restored
+            when the window is closed.
+
+        worker:
+            If it's one of the values in `WorkerMode`, the physics runs in background as fast 
+            as possible (see `worker.PhysicsWorker`), and each frame shows its newest state. 
+            Otherwise, `num_frame_steps` steps are done before each frame.
+
+        steady_state:
+            If given, the animation stops when the rope settles (see `steady_state.SteadyStateDetector`).
+            It's not detected when `worker` is given.
         '''
-        ## Create and set figure and axes ###
-        if self.show_tension:
-            fig, (ax_rope, ax_tension) = plt.subplots(1, 2, figsize=(14, 6))
-            ax_tension.set_ylim(0, 0.01)
-        else:
-            fig, ax_rope = plt.subplots(figsize=(13, 5))
-        ax_rope.set_ylim(-1, 0.5)
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Button
+        from graph import SimulationGraphs, BlitManager
+
+        fig = plt.figure(figsize=SimulationGraphs.figure_size(self.show_tension))
+        graphs = SimulationGraphs(fig, self.rope, self.solver, self.plot_mode, self.rope_graph_cfg, self.show_tension,
+            profiler, self.rope_cfg)
 
         # Analytical ropes
-        fig.subplots_adjust(left=0.15)
-        ax_y1 = ax_rope.get_position().y1
+        ax_y1 = graphs.ax_rope.get_position().y1
         button_height = 0.04
         offset = 0.01
         button_ax = fig.add_axes([offset,ax_y1-button_height, 0.1, button_height])
         button = Button(button_ax, 'Cabos', hovercolor='0.975')
 
         def draw_analytical_ropes(event):
-            analytical_ropes_graph.update()
+            graphs.analytical.update()
             fig.canvas.draw_idle()
         button.on_clicked(draw_analytical_ropes)
-        
-        # Info
-        info_ax = fig.add_axes([0.01, 0.9, 0.1, 0.04])
-        ####
-
-        # Creates graphs managers ###
-        additional_pars = None
-        if self.plot_mode == PlotMode.color_tension:
-            additional_pars = {"solver": self.solver}
-        rope_graph: RopeGraph = rope_graph_manager_type[self.plot_mode](fig, ax_rope, self.rope, additional_pars, self.rope_graph_cfg)
-        
-        analytical_ropes_graph = AnalyticalRopesGraph(ax_rope, self.rope, self.solver, self.rope_cfg)
-        
-        tension_graph = TensionGraph(ax_tension, self.solver)
 
-        info_widget = Info(info_ax, self.solver, self.time_it)
-        ###
+        # Full draws of the figure, which may also happen outside of `update`.
+        fig.draw = profiler.wrap("draw", fig.draw)
+
+        graphs.init()
 
-        info_widget.init()
-        rope_graph.init()
-        analytical_ropes_graph.init()
-        if self.show_tension:
-            tension_graph.init()
+        # Only the artists that change every frame are redrawn.
+        blit_manager = BlitManager(fig, graphs.animated_artists(), graphs.cached_artists())
 
         # damp_vec =  ax.quiver([pos[0], pos[0]], [pos[1], pos[1]], [0.1, -0.1], [2, 2], color=["red", "green"], angles='xy', scale_units='xy', scale=1)
-        def update(frame):
-            i = 0
-            while i < self.num_frame_steps:
-                self.time_it.decorator(self.solver.update)
-                i += 1
-
-            info_widget.update()
-            rope_graph.update()
-            if self.show_tension:
-                tension_graph.update()
-
-            # print(np.linalg.norm(damping_force))
-            # damp_vec.set_offsets([p.pos[0], p.pos[1]])
-            # damp_vec.set_UVC([damping_force[0]], [damping_force[1]])
-            # update_buttom(None)
+        detector = None
+        if steady_state is not None:
+            detector = SteadyStateDetector(steady_state)
+            self.solver.add_monitor(detector)
 
-            fig.canvas.draw_idle()
+        physics_worker = None
+        if worker is not None:
+            physics_worker = PhysicsWorker(self.solver, worker)
+            physics_worker.start()
 
-        # Save animation
-        # duration = 5 # in seconds
-        # ani = animation.FuncAnimation(fig, update, interval=1/(self.fps)*1000, frames= duration * self.fps)
-        # ani.save("teste.gif", fps=self.fps)
-        
-        ani = animation.FuncAnimation(fig, update, interval=1/(self.fps)*1000, frames= 5 * self.fps)
-        plt.show()
-        
+        # Exception raised by the physics worker, raised again when the window is closed.
+        worker_error: RuntimeError = None
+
+        section = profiler.section
+        def update():
+            nonlocal detector, worker_error
+            with section("frame"):
+                if physics_worker is None:
+                    i = 0
+                    while i < self.num_frame_steps:
+                        self.solver.update()
+                        i += 1
+                else:
+                    with section("worker.read"):
+                        try:
+                            physics_worker.read()
+                        except RuntimeError as e:
+                            # Exceptions in timer callbacks don't leave the GUI loop.
+                            worker_error = e
+                            timer.stop()
+                            plt.close(fig)
+                            return
+                    section("solver.update").record(int(physics_worker.step_time * 1e9))
+
+                full_redraw = graphs.update()
+
+                # print(np.linalg.norm(damping_force))
+                # damp_vec.set_offsets([p.pos[0], p.pos[1]])
+                # damp_vec.set_UVC([damping_force[0]], [damping_force[1]])
+                # update_buttom(None)
+
+                with section("blit"):
+                    blit_manager.update(full_redraw)
+
+            if detector is not None and detector.settled:
+                timer.stop()
+                self.solver.remove_monitor(detector)
+                print(f"Corda em repouso em t = {detector.settle_time:.3f} s ({detector.settle_step} passos).")
+                detector = None
+
+        # To save the animation, see `Simulation.export`.
+        timer = fig.canvas.new_timer(interval=1/(self.fps)*1000)
+        timer.add_callback(update)
+
+        # The module profiler is shared by the whole process, so it's only enabled during the run.
+        previous_profile = profiler.enabled
+        profiler.enabled = profile
+        try:
+            timer.start()
+            plt.show()
+            if worker_error is not None:
+                raise worker_error
+        finally:
+            profiler.enabled = previous_profile
+            if physics_worker is not None:
+                physics_worker.stop()
+            if detector is not None:
+                self.solver.remove_monitor(detector)
 
+    def export(self, path: str, duration: float, fps: float = None, workers: int = None, dpi: float = 100, frames_dir: str = None):
+        '''
+        Saves the animation of the simulation, without showing it. The simulation is advanced by 
+        `duration` (in frames, `num_frame_steps` steps per frame), then the frames are rendered in 
+        parallel (see `export.py`).
+
+        Parameters:
+        -----------
+        path:
+            Output file. Its extension gives the format: ".gif", a video (e.g. ".mp4", requires ffmpeg) 
+            or, if it's none of these, a directory where the frames are saved as PNG.
+
+        duration:
+            Duration of the animation (s).
+
+        fps:
+            Frames per second of the animation, `self.fps` if not given.
+
+        workers:
+            Number of processes rendering frames, the number of processors by default.
+
+        dpi:
+            Resolution of the frames.
+
+        frames_dir:
+            If given, the PNG frames are kept in this directory.
+        '''
+        import export
+        export.export(self, path, duration, fps, workers, dpi, frames_dir)
@@ -1,22 +1,478 @@
-from rope_elements import Point, Side
+from rope_elements import Point, Side, RopeState
 import numpy as np
+import warnings
+from scipy.linalg import solve_banded
 from constant import G
+from config import AdaptiveStepConfig, ImplicitConfig, XPBDConfig
+from timer import profiler, Profiler, NULL_SECTION
+from topology import Topology, spring_network_forces
+from xpbd import DistanceConstraints
+
+class Integrator:
+    '''
+    Available integrators for `Solver`.
+    '''
+    rk4 = 0 # Classic Runge Kutta with fixed step.
+    dopri5 = 1 # Dormand–Prince 5(4) with adaptive step.
+    backward_euler = 2 # Implicit Euler, stable with time steps much larger than the stiffest spring period.
+    verlet = 3 # Velocity Verlet (leapfrog) with fixed step, symplectic, with a single forces evaluation per step.
+    xpbd = 4 # Position based: springs are distance constraints with compliance, stable with frame sized time steps.
+
+# Names of the profiler sections of the integrator stages.
+STAGE_SECTIONS = tuple(f"stage {i}" for i in range(1, 8))
+
+class IntegratorStats:
+    '''
+    Statistics about the steps taken by the integrator. Only counters and the last step size are
+    kept, so memory does not grow with the number of steps. The start time and size of the last
+    `history` accepted steps can be kept in a ring buffer, e.g. with
+    `solver.stats = IntegratorStats(history=1000)`.
+    '''
+    def __init__(self, history: int = 0) -> None:
+        '''
+        Parameters:
+        -----------
+        history:
+            Number of accepted steps kept in `step_times` and `step_sizes`, zero to keep none.
+        '''
+        self.accepted = 0
+        self.rejected = 0
+        self.last_dt: float = None # Size of the last accepted step.
+
+        # Ring buffers with the time at the start and the size of the last accepted steps.
+        self.history_times = np.zeros(history)
+        self.history_sizes = np.zeros(history)
+
+    def add_step(self, time: float, dt: float):
+        size = self.history_sizes.size
+        if size > 0:
+            self.history_times[self.accepted % size] = time
+            self.history_sizes[self.accepted % size] = dt
+        self.accepted += 1
+        self.last_dt = dt
+
+    def ordered(self, ring: np.ndarray) -> np.ndarray:
+        if self.accepted <= ring.size:
+            return ring[:self.accepted].copy()
+        if ring.size == 0:
+            return ring.copy()
+        return np.roll(ring, -(self.accepted % ring.size))
+
+    @property
+    def step_times(self) -> np.ndarray:
+        '''
+        Time at the start of the last accepted steps (at most `history`), oldest first.
+        '''
+        return self.ordered(self.history_times)
+
+    @property
+    def step_sizes(self) -> np.ndarray:
+        '''
+        Size of the last accepted steps (at most `history`), oldest first.
+        '''
+        return self.ordered(self.history_sizes)
+
+class ChainJacobian:
+    '''
+    Banded matrix `D - s*K`, where `D` is a diagonal matrix (with the same value for both 
+    coordinates of a node), `s` a scalar and `K` is the stiffness matrix of the spring chain.
+    The implicit step uses `D = M + dt*C` (mass and damping) and `s = dt^2`, and the static
+    equilibrium uses `s = 1`.
+
+    The unknowns are ordered as (x_0, y_0, x_1, y_1, ...), so the matrix is block tridiagonal 
+    with 2x2 blocks, which is a banded matrix with 3 diagonals above and below the main one. 
+    It's stored in the format used by `scipy.linalg.solve_banded`.
+    '''
+    bandwidth = 3
+
+    def __init__(self, num_points: int) -> None:
+        num_springs = max(num_points - 1, 0)
+        self.ab = np.zeros((2*self.bandwidth + 1, 2*num_points))
+        
+        # Components of the stiffness block of each spring.
+        self.kxx = np.zeros(num_springs)
+        self.kyy = np.zeros(num_springs)
+        self.kxy = np.zeros(num_springs)
+
+    def assemble(self, pos: np.ndarray, state: RopeState, free: np.ndarray, diag: np.ndarray, scale: float, work: "ForceWorkspace",
+        min_force_density: float = 0):
+        '''
+        Assembles the matrix at the positions `pos`, with `diag` being the diagonal of `D` for each 
+        node and `scale` being `s`. Rows and columns of nodes that are not `free` are replaced by the identity.
+
+        The transverse stiffness of each spring (tension over length) is at least `min_force_density`.
+        '''
+        vec = np.subtract(pos[1:], pos[:-1], out=work.spring_vec)
+        length = np.hypot(vec[:, 0], vec[:, 1], out=work.spring_len)
+        vec /= length[:, None]
+        ux, uy = vec[:, 0], vec[:, 1]
+
+        # Spring block: k u u^T + alpha (I - u u^T), with alpha = k (1 - L0/l). The transverse term alpha
+        # is clamped at `min_force_density` (>= 0) for compressed springs, to keep the matrix positive definite.
+        alpha = np.divide(state.rest_length, length, out=work.spring_force)
+        np.subtract(1, alpha, out=alpha)
+        alpha *= state.k
+        np.maximum(alpha, min_force_density, out=alpha)
+        beta = np.subtract(state.k, alpha, out=work.spring_force_abs)
+        
+        np.multiply(ux, ux, out=self.kxx)
+        np.multiply(uy, uy, out=self.kyy)
+        np.multiply(ux, uy, out=self.kxy)
+        for k_comp in (self.kxx, self.kyy):
+            k_comp *= beta
+            k_comp += alpha
+            k_comp *= scale
+        self.kxy *= beta
+        self.kxy *= scale
+
+        # Springs linking a fixed node do not couple it to the system.
+        spring_free = free[:-1] & free[1:]
+        
+        ab = self.ab
+        ab.fill(0)
+        main, upper1, lower1 = ab[3], ab[2], ab[4]
+        
+        # Diagonal blocks
+        diag_x, diag_y = main[0::2], main[1::2]
+        diag_x[:] = diag
+        diag_y[:] = diag
+        for d, k_comp in ((diag_x, self.kxx), (diag_y, self.kyy)):
+            d[:-1] += k_comp
+            d[1:] += k_comp
+        upper1[1::2][:-1] += self.kxy
+        upper1[1::2][1:] += self.kxy
+        lower1[0::2] = upper1[1::2]
+
+        # Off diagonal blocks
+        ab[1, 2::2] = -self.kxx * spring_free
+        ab[1, 3::2] = -self.kyy * spring_free
+        ab[0, 3::2] = -self.kxy * spring_free
+        ab[2, 2::2] = -self.kxy * spring_free
+        ab[5, 0:-2:2] = ab[1, 2::2]
+        ab[5, 1:-2:2] = ab[1, 3::2]
+        ab[6, 0:-2:2] = ab[0, 3::2]
+        ab[4, 1:-2:2] = ab[2, 2::2]
+
+        # Fixed nodes
+        fixed = ~free
+        for comp in (0, 1):
+            main[comp::2][fixed] = 1
+            upper1[1::2][fixed] = 0
+            lower1[0::2][fixed] = 0
+
+    def solve(self, rhs: np.ndarray):
+        '''
+        Solves the system with right hand side `rhs` (shape (N, 2)) in place.
+        '''
+        b = rhs.reshape(-1)
+        b[:] = solve_banded((self.bandwidth, self.bandwidth), self.ab, b, overwrite_ab=True, check_finite=False)
+
+class EquilibriumResult:
+    '''
+    Result of `Solver.equilibrium`.
+    '''
+    def __init__(self) -> None:
+        self.pos: np.ndarray = None # Node positions.
+        self.tensions: np.ndarray = None # Tension of each spring.
+        
+        # Forces that the supports (fixed nodes) apply on the rope.
+        self.reaction_ids: np.ndarray = None # Fixed nodes indices.
+        self.reactions: np.ndarray = None
+        
+        self.iterations = 0
+        self.residual: float = None # Biggest net force on a free node (N).
+        self.converged = False
+
+class Diagnostics:
+    '''
+    Diagnostics of the rope state, computed by `Solver.diagnostics`.
+    '''
+    def __init__(self) -> None:
+        # Energies
+        self.kinetic_energy: float = None
+        self.elastic_energy: float = None
+        self.potential_energy: float = None # Gravitational and of external forces.
+        
+        self.length: float = None # Sum of the springs lengths.
+        
+        # Node with smallest height
+        self.lowest_id: int = None
+        self.lowest_pos: np.ndarray = None
+        
+        # Forces that the supports (fixed nodes) apply on the rope.
+        self.reaction_ids: np.ndarray = None # Fixed nodes indices.
+        self.reactions: np.ndarray = None
+        
+        # Resultant of springs, weight and external forces on the free nodes. It's zero at equilibrium.
+        self.net_force: np.ndarray = None
+
+    @property
+    def total_energy(self):
+        return self.kinetic_energy + self.elastic_energy + self.potential_energy
+
+class DormandPrince:
+    '''
+    Butcher tableau of the Dormand–Prince 5(4) pair.
+    '''
+    a = (
+        (),
+        (1/5,),
+        (3/40, 9/40),
+        (44/45, -56/15, 32/9),
+        (19372/6561, -25360/2187, 64448/6561, -212/729),
+        (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+        (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84),
+    )
+
+    # Fifth order weights are the last row of `a`, so the last stage is evaluated at the new state.
+    b5 = (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0)
+    b4 = (5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40)
+    
+    # Error estimation weights
+    e = tuple(w5 - w4 for w5, w4 in zip(b5, b4))
+
+    num_stages = 7
+
+class ForceWorkspace:
+    '''
+    Preallocated temporaries used by `spring_chain_forces`, for chains with `num_points` nodes
+    batched along the leading axes `batch_shape`, or by `spring_network_forces`, for the network
+    given by `topology` (without batching).
+    '''
+    def __init__(self, num_points: int, batch_shape: tuple[int] = (), topology: Topology = None) -> None:
+        num_springs = max(num_points - 1, 0) if topology is None else topology.num_edges
+        self.spring_vec = np.zeros((*batch_shape, num_springs, 2))
+        self.spring_len = np.zeros((*batch_shape, num_springs))
+        self.spring_force = np.zeros((*batch_shape, num_springs))
+        self.spring_force_abs = np.zeros((*batch_shape, num_springs))
+
+        # Temporaries of `Topology.node_max`.
+        self.node_values: np.ndarray = None
+        self.hub_values: np.ndarray = None
+        if topology is not None:
+            self.node_values = np.zeros(num_points)
+            self.hub_values = np.zeros(topology.hub_springs.size)
+
+def spring_chain_forces(pos: np.ndarray, vel: np.ndarray, k: np.ndarray, rest_length: np.ndarray, damping: np.ndarray, 
+    mass: np.ndarray, work: ForceWorkspace, out: np.ndarray, tensions: np.ndarray = None, external: np.ndarray = None):
+    '''
+    Total force (springs, damping, weight and external forces) on every node of a chain where node `i` 
+    is linked to node `i+1` by spring `i`. The chain can be batched along the leading axes of all arrays.
+
+    This is the reference implementation of the force kernels, see `force_backends`.
+
+    Parameters:
+    -----------
+    pos, vel:
+        Nodes positions and velocities, with shape (..., N, 2).
+
+    k, rest_length:
+        Springs properties, with shape (..., N-1).
+
+    damping, mass:
+        Nodes properties, with shape (..., N).
+    
+    work:
+        Preallocated temporaries.
+
+    out:
+        Array with shape (..., N, 2) where the forces are written.
+
+    tensions:
+        If given, array with shape (..., N) which is filled with the biggest
+        spring force intensity acting on each node.
+
+    external:
+        If given, external forces on each node, with shape (..., N, 2).
+    '''
+    vec = np.subtract(pos[..., 1:, :], pos[..., :-1, :], out=work.spring_vec)
+    length = np.hypot(vec[..., 0], vec[..., 1], out=work.spring_len)
+
+    # Spring force intensity (positive when stretched)
+    force = np.subtract(length, rest_length, out=work.spring_force)
+    force *= k
+
+    if tensions is not None:
+        force_abs = np.abs(force, out=work.spring_force_abs)
+        tensions[..., 0] = force_abs[..., 0]
+        tensions[..., -1] = force_abs[..., -1]
+        np.maximum(force_abs[..., :-1], force_abs[..., 1:], out=tensions[..., 1:-1])
+
+    # Spring force on the left node of each spring (the right one receives the opposite).
+    np.divide(force, length, out=length)
+    vec *= length[..., None]
+
+    np.multiply(vel, damping[..., None], out=out)
+    np.negative(out, out=out)
+    out[..., :-1, :] += vec
+    out[..., 1:, :] -= vec
+    out[..., 1] -= G * mass
+
+    if external is not None:
+        out += external
+
+class Backend:
+    '''
+    Implementations of the force kernel available for `Solver`.
+    '''
+    numpy = "numpy" # Reference implementation, `spring_chain_forces`.
+    numba = "numba" # Single pass kernel compiled with Numba (available if it's installed).
+
+'''
+Registry of force kernels. A kernel has the same signature and results as `spring_chain_forces`
+(batching is not required).
+'''
+force_backends: dict[str, callable] = {Backend.numpy: spring_chain_forces}
+
+'''
+Registry of force kernels for spring networks (states with a topology). A kernel has the same
+signature and results as `spring_network_forces`.
+'''
+network_force_backends: dict[str, callable] = {Backend.numpy: spring_network_forces}
+
+try:
+    from numba_kernels import numba_chain_forces, numba_network_forces
+    force_backends[Backend.numba] = numba_chain_forces
+    network_force_backends[Backend.numba] = numba_network_forces
+except ImportError:
+    pass
+
+def verify_backend(backend: str, num_points: int = 1000, seed: int = 0) -> float:
+    '''
+    Biggest absolute difference between the forces and tensions computed by the kernels of `backend`
+    and by the reference kernels, on a random rope state and on a random network (a chain with
+    extra springs between random nodes).
+    '''
+    rng = np.random.default_rng(seed)
+    pos = np.cumsum(rng.uniform(0.5, 1, (num_points, 2)), axis=0)
+    vel = rng.normal(size=(num_points, 2))
+    damping = rng.uniform(0, 1, num_points)
+    mass = rng.uniform(0.1, 1, num_points)
+    external = rng.normal(size=(num_points, 2))
+
+    extra_edges = rng.integers(0, num_points, (num_points, 2))
+    extra_edges = extra_edges[extra_edges[:, 0] != extra_edges[:, 1]]
+    network = Topology(num_points, np.concatenate([Topology.chain(num_points).edges, extra_edges]))
+
+    cases = [(spring_chain_forces, force_backends[backend], None, num_points - 1)]
+    if backend in network_force_backends:
+        cases.append((spring_network_forces, network_force_backends[backend], network, network.num_edges))
+
+    diff = 0
+    for ref_kernel, backend_kernel, topology, num_springs in cases:
+        k = rng.uniform(1, 100, num_springs)
+        rest_length = rng.uniform(0.5, 1.5, num_springs)
+        
+        results = []
+        for kernel in (ref_kernel, backend_kernel):
+            out = np.zeros((num_points, 2))
+            tensions = np.zeros(num_points)
+            args = (pos, vel, k, rest_length, damping, mass) if topology is None else (pos, vel, topology, k, rest_length, damping, mass)
+            kernel(*args, ForceWorkspace(num_points, topology=topology), out, tensions, external)
+            results.append((out, tensions))
+
+        (ref_out, ref_tensions), (out, tensions) = results
+        diff = max(diff, np.abs(out - ref_out).max(), np.abs(tensions - ref_tensions).max())
+
+    return diff
+
+def rk4_stages(acceleration: callable, pos: np.ndarray, vel: np.ndarray, free: np.ndarray, dt, work, section: callable = None):
+    '''
+    Advances the state (`pos`, `vel`) in place by a classic Runge Kutta (RK4) step. Used by `Solver`
+    and `ensemble.EnsembleSolver`, which can have batched states.
+
+    Parameters:
+    -----------
+    acceleration:
+        Function `acceleration(pos, vel, out, update_tensions)` that writes the acceleration at the
+        state (`pos`, `vel`) to `out`. Tensions are updated at the first stage.
+
+    free:
+        Array that multiplies the velocities (zero for fixed nodes), broadcastable to `pos`.
+
+    dt:
+        Time step, a scalar or an array broadcastable to `pos`.
+
+    work:
+        Object with the workspace arrays `pos_old`, `vel_old`, `pos_stage`, `vel_stage` (same shape
+        as `pos`) and `k_pos`, `k_vel` (at least 4 stages), e.g. the solver itself.
+
+    section:
+        Profiler sections factory (`Profiler.section`) for the stages, by default they are not timed.
+    '''
+    if section is None:
+        section = lambda name: NULL_SECTION
+
+    np.copyto(work.pos_old, pos)
+    np.copyto(work.vel_old, vel)
+
+    k_pos, k_vel = work.k_pos, work.k_vel
+    stage_pos, stage_vel = work.pos_old, work.vel_old
+    for k_id, q in enumerate((1/2, 1/2, 1, None)):
+        with section(STAGE_SECTIONS[k_id]):
+            np.multiply(stage_vel, free, out=k_pos[k_id])
+            acceleration(stage_pos, stage_vel, k_vel[k_id], update_tensions=(k_id == 0))
+
+            if q is None:
+                break
+            
+            stage_pos, stage_vel = work.pos_stage, work.vel_stage
+            np.multiply(k_pos[k_id], q * dt, out=stage_pos)
+            stage_pos += work.pos_old
+            np.multiply(k_vel[k_id], q * dt, out=stage_vel)
+            stage_vel += work.vel_old
+
+    with section("state update"):
+        for state_arr, k_arr in ((pos, k_pos), (vel, k_vel)):
+            k_arr[1] += k_arr[2]
+            k_arr[1] *= 2
+            k_arr[0] += k_arr[1]
+            k_arr[0] += k_arr[3]
+            k_arr[0] *= dt/6
+            state_arr += k_arr[0]
 
 class Solver:
     '''
     Differential solver for newton second law.
     '''
-    def __init__(self, points: list[Point], dt: float) -> None:
+    def __init__(self, points: list[Point], dt: float, integrator=Integrator.rk4, integrator_cfg=None, backend=Backend.numpy) -> None:
         '''
         Parameters:
             points:
-                Rope nodes in order.
+                Rope nodes in order, or the nodes of a network state (see `from_state`).
+            
+            dt:
+                Time step. With adaptive integrators it's the initial time step.
+
+            integrator:
+                Integration method, one of the values in `Integrator`.
+
+            integrator_cfg:
+                Configuration of the integrator. For `Integrator.dopri5` it's an `AdaptiveStepConfig`,
+                for `Integrator.backward_euler` an `ImplicitConfig` and for `Integrator.xpbd` an `XPBDConfig`.
+
+            backend:
+                Implementation of the force kernel, one of the keys of `force_backends`. If it's not 
+                available, the reference (NumPy) kernel is used.
         '''
         self.points = points
         self.num_points = len(points)
         self.dt = dt
         self.time = 0
 
+        self.integrator = integrator
+        if integrator_cfg is None:
+            integrator_cfg = {Integrator.dopri5: AdaptiveStepConfig, Integrator.backward_euler: ImplicitConfig,
+                Integrator.xpbd: XPBDConfig}.get(integrator, lambda: None)()
+        self.integrator_cfg = integrator_cfg
+        self.stats = IntegratorStats()
+
+        self.state = RopeState.from_points(points)
+
+        # Springs links, `None` for a rope (chain), see `topology.py`.
+        self.topology: Topology = self.state.topology
+        if self.topology is not None and integrator == Integrator.backward_euler:
+            raise ValueError("O integrador implícito só está disponível para cordas (sem topologia).")
 
         '''
         Elements of external_forces are tuples of the form: 
@@ -33,8 +489,72 @@ class Solver:
         for p, f in external_forces:
             self.external_forces.append((int((self.num_points-1) * p), f))
 
+        # External forces on each node, `None` if there are none.
+        self.external_force: np.ndarray = None
+        if self.external_forces:
+            self.external_force = np.zeros((self.num_points, 2))
+            for f_id, f in self.external_forces:
+                self.external_force[f_id] += f
+
+        backends = force_backends if self.topology is None else network_force_backends
+        if backend not in backends:
+            warnings.warn(f"Backend '{backend}' não está disponível, utilizando '{Backend.numpy}'.")
+            backend = Backend.numpy
+        self.backend = backend
+        self.force_kernel = backends[backend]
+
         self.tensions = np.zeros(len(self.points))
 
+        # Workspaces
+        shape = (self.num_points, 2)
+        self.force_work = ForceWorkspace(self.num_points, topology=self.topology)
+        self.free = np.logical_not(self.state.fix)
+        self.pos_old = np.zeros(shape)
+        self.vel_old = np.zeros(shape)
+        self.pos_stage = np.zeros(shape)
+        self.vel_stage = np.zeros(shape)
+        self.work_arr = np.zeros(shape)
+        self.err_arr = np.zeros(shape)
+        self.err_scale = np.zeros(shape)
+        self.diagnostics_force = np.zeros(shape)
+        self.diagnostics_zero_vel = np.zeros(shape)
+        
+        num_stages = {Integrator.rk4: 4, Integrator.dopri5: DormandPrince.num_stages}.get(integrator, 1)
+        self.k_pos = np.zeros((num_stages, *shape))
+        self.k_vel = np.zeros((num_stages, *shape))
+
+        self.steppers = {
+            Integrator.rk4: self.rk4_step,
+            Integrator.dopri5: self.dopri5_step,
+            Integrator.backward_euler: self.backward_euler_step,
+            Integrator.verlet: self.verlet_step,
+            Integrator.xpbd: self.xpbd_step,
+        }
+
+        # Acceleration at the end of the last step, reused by the next `Integrator.verlet` or
+        # `Integrator.dopri5` step while the state is still (`pos_old`, `vel_old`).
+        self.last_accel = self.k_vel[0]
+        self.last_accel_valid = False
+
+        # Objects with a method `update(solver)`, called after each step.
+        self.monitors = []
+
+        self.profiler: Profiler = profiler
+
+        self.jacobian: ChainJacobian = None
+        self.jacobian_diag = np.zeros(self.num_points)
+
+        self.constraints: DistanceConstraints = None
+        # Biggest constraint residual of the last `Integrator.xpbd` step, relative to the springs rest length.
+        self.constraint_error: float = None
+
+    @staticmethod
+    def from_state(state: RopeState, dt: float, integrator=Integrator.rk4, integrator_cfg=None, backend=Backend.numpy) -> "Solver":
+        '''
+        Solver of the rope (or network) whose state is `state` (it's used directly, not copied).
+        '''
+        return Solver(state.create_elements(), dt, integrator, integrator_cfg, backend)
+
     def spring_forces(self, node: Point, sides: list[int]=Side.sides()):
         '''
         Total force applied to the `node` by it's attached springs in the sides `sides`.
@@ -90,98 +610,555 @@ class Solver:
         return acceleration
 
     def energy(self):
-        energy = 0
-        for p in self.points:
-            energy += p.mass * np.linalg.norm(p.vel)**2 
-            
-            spring = p.springs[Side.left] 
-            if spring != None:
-                energy += spring.k * (spring.current_lenght - spring.default_lenght)**2            
+        '''
+        Total mechanical energy of the rope.
+        '''
+        return self.diagnostics().total_energy
 
-            energy += 2 * p.mass * G * p.pos[1]
+    def diagnostics(self) -> "Diagnostics":
+        '''
+        Diagnostics of the current state of the rope, see `Diagnostics`.
+        '''
+        with self.profiler.section("diagnostics"):
+            st = self.state
+            d = Diagnostics()
 
-        return energy
+            # Static forces (no damping)
+            force = self.diagnostics_force
+            self.forces(st.pos, self.diagnostics_zero_vel, force)
+        
+            length = self.spring_lengths(st.pos)
+            d.length = length.sum()
 
-    def update(self):
+            stretch = np.subtract(length, st.rest_length, out=self.force_work.spring_force)
+            d.elastic_energy = 0.5 * np.dot(st.k, stretch * stretch)
+            d.kinetic_energy = 0.5 * np.dot(st.mass, np.einsum("ij,ij->i", st.vel, st.vel))
+            d.potential_energy = G * np.dot(st.mass, st.pos[:, 1])
+            for f_id, f in self.external_forces:
+                d.potential_energy -= np.dot(f, st.pos[f_id])
+
+            d.lowest_id = int(np.argmin(st.pos[:, 1]))
+            d.lowest_pos = st.pos[d.lowest_id].copy()
+
+            d.reaction_ids = np.flatnonzero(st.fix)
+            d.reactions = -force[d.reaction_ids]
+            d.net_force = force[~st.fix].sum(axis=0)
+
+        return d
+
+    def forces(self, pos: np.ndarray, vel: np.ndarray, out: np.ndarray, update_tensions=False):
         '''
-        Advance one time step.
+        Total force on all nodes (fixed ones included) when the rope is at the state (`pos`, `vel`), 
+        written to `out`.
+
+        If `update_tensions` is `True`, `self.tensions` is updated with the tensions of this state.
         '''
-        self.middle_id = self.num_points//3
+        st = self.state
+        tensions = self.tensions if update_tensions else None
+        with self.profiler.section("forces"):
+            if self.topology is None:
+                self.force_kernel(pos, vel, st.k, st.rest_length, st.damping, st.mass, self.force_work, out, tensions, self.external_force)
+            else:
+                self.force_kernel(pos, vel, self.topology, st.k, st.rest_length, st.damping, st.mass, self.force_work, out,
+                    tensions, self.external_force)
 
-        ## Runge Kutta (RK4) ##
-        pos_old = np.zeros((self.num_points, 2))
-        vel_old = np.zeros((self.num_points, 2))
-        for id, p in enumerate(self.points):
-            pos_old[id] = p.pos
-            vel_old[id] = p.vel
+    def spring_lengths(self, pos: np.ndarray) -> np.ndarray:
+        '''
+        Length of every spring when the nodes are at `pos`. The result is a workspace array, 
+        overwritten by the next forces evaluation.
+        '''
+        if self.topology is None:
+            vec = np.subtract(pos[1:], pos[:-1], out=self.force_work.spring_vec)
+        else:
+            vec = self.topology.spring_vectors(pos)
+        return np.hypot(vec[:, 0], vec[:, 1], out=self.force_work.spring_len)
 
-        k1_values = np.zeros((self.num_points, 4, 2))
-        k2_values = np.zeros((self.num_points, 4, 2))
+    def acceleration(self, pos: np.ndarray, vel: np.ndarray, out: np.ndarray, update_tensions=False):
+        '''
+        Acceleration of all nodes when the rope is at the state (`pos`, `vel`), written to `out`.
+        Fixed nodes have zero acceleration.
+
+        If `update_tensions` is `True`, `self.tensions` is updated with the tensions of this state.
+        '''
+        self.forces(pos, vel, out, update_tensions)
+        out /= self.state.mass[:, None]
+        out *= self.free[:, None]
+
+    def equilibrium(self, max_iterations: int = 200, tol: float = 1e-10, update_state=True) -> EquilibriumResult:
+        '''
+        Static equilibrium of the rope (fixed nodes stay where they are), found directly with
+        Newton's method on the banded stiffness matrix, starting from the current positions.
+
+        Each iteration solves `-K dx = F`, where `F` are the forces on the free nodes. In slack or 
+        straight configurations `K` is singular (springs without tension have no transverse stiffness), 
+        so, as a Levenberg–Marquardt shift, the transverse stiffness of each spring is floored at a 
+        force density `q`. This turns the first steps from a straight rope into parabola-like sags 
+        (as in the force density method). `q` shrinks towards zero as iterations succeed, recovering
+        Newton's quadratic convergence near the solution. A backtracking line search only accepts
+        steps that sufficiently reduce the potential energy (which equilibrium minimizes), or,
+        near the solution where energy differences are lost to round off, steps that reduce `|F|`.
+
+        Parameters:
+        -----------
+        max_iterations:
+            Maximum number of linear systems solved.
+
+        tol:
+            Convergence tolerance, relative to the total weight of the rope. It's never
+            smaller than the round off error of the spring forces.
+
+        update_state:
+            If `True`, the rope is moved to the equilibrium, with zero velocity, 
+            and `self.tensions` is updated.
+        '''
+        if self.topology is not None:
+            raise ValueError("O equilíbrio estático só está disponível para cordas (sem topologia).")
+
+        st = self.state
+        free = np.logical_not(st.fix)
+        free_col = free[:, None]
+
+        if self.jacobian is None:
+            self.jacobian = ChainJacobian(self.num_points)
         
-        k_id_to_update_tension = {0: True}
-        k_id_to_q = {0: 1/2, 1: 1/2, 2: 1}
+        pos = st.pos.copy()
+        trial = np.zeros_like(pos)
+        force = np.zeros_like(pos)
+        delta = np.zeros_like(pos)
+        zero_vel = np.zeros_like(pos)
         
-        def calc_ki(k_id, k1_values, k2_values):
-            update_tension = k_id_to_update_tension.get(k_id, False)
-            for id, p in enumerate(self.points):
-                if p.fix:
-                    self.point_acceleration(p, update_tensions=update_tension, id=id)
-                    continue
-                
-                accel = self.point_acceleration(p, update_tensions=update_tension, id=id)
-                k1 = p.vel
-                k2 = accel
-
-                k1_values[id][k_id] = k1
-                k2_values[id][k_id] = k2
-        
-        def update_pos(k_id, k1_values, k2_values):
-            q = k_id_to_q[k_id]
-            for id, p in enumerate(self.points):
-                if p.fix:
-                    continue
-                
-                p.pos = pos_old[id] + q * self.dt * k1_values[id][k_id]
-                p.vel = vel_old[id] + q * self.dt * k2_values[id][k_id]
+        def free_force(pos: np.ndarray):
+            self.forces(pos, zero_vel, force)
+            np.multiply(force, free_col, out=force)
+            return np.vdot(force, force)
+
+        # Forces can't be resolved below the round off of the stiffest spring.
+        total_weight = G * st.mass.sum()
+        round_off = 10 * np.finfo(float).eps * st.k.max() * np.abs(pos).max()
+        abs_tol = max(tol * total_weight, round_off)
         
-        for k_id in (0, 1, 2, 3):
-            calc_ki(k_id, k1_values, k2_values)
+        # Force density of springs with tension equal to the rope weight.
+        q_scale = total_weight / st.rest_length.mean()
+        q = q_scale
+
+        result = EquilibriumResult()
+        merit = free_force(pos)
+        energy = self.potential_energy(pos)
+        while result.iterations < max_iterations:
+            if np.abs(force).max() <= abs_tol:
+                result.converged = True
+                break
+            
+            result.iterations += 1
+            self.jacobian_diag.fill(0)
+            self.jacobian.assemble(pos, st, free, self.jacobian_diag, 1, self.force_work, min_force_density=q)
+            np.copyto(delta, force)
+            try:
+                self.jacobian.solve(delta)
+            except np.linalg.LinAlgError:
+                q = max(10 * q, q_scale)
+                free_force(pos)
+                continue
             
-            if k_id != 3:
-                update_pos(k_id, k1_values, k2_values)
+            # Energy derivative along `delta`
+            slope = -np.vdot(force, delta)
+
+            accepted = False
+            step = 1
+            while step > 1e-4:
+                np.multiply(delta, step, out=trial)
+                trial += pos
+                trial_energy = self.potential_energy(trial)
+                trial_merit = free_force(trial)
+                if trial_energy <= energy + 1e-4 * step * slope or trial_merit < merit:
+                    accepted = True
+                    break
+                step /= 2
+
+            if accepted:
+                pos, trial = trial, pos
+                merit = trial_merit
+                energy = trial_energy
+                q = q / 10 if q > 1e-8 * q_scale else 0
+            else:
+                q = max(10 * q, q_scale)
+                free_force(pos)
+
+        self.forces(pos, zero_vel, force)
+        result.pos = pos
+        result.residual = np.abs(force[free]).max(initial=0)
+        
+        vec = pos[1:] - pos[:-1]
+        result.tensions = st.k * (np.hypot(vec[:, 0], vec[:, 1]) - st.rest_length)
+        
+        result.reaction_ids = np.flatnonzero(st.fix)
+        result.reactions = -force[st.fix]
+
+        if update_state:
+            st.pos[:] = pos
+            st.vel[:] = 0
+            self.forces(st.pos, st.vel, force, update_tensions=True)
+
+        return result
+
+    def potential_energy(self, pos: np.ndarray = None):
+        '''
+        Potential energy (elastic, gravitational and of the external forces) of the rope 
+        at the positions `pos` (by default, the current ones).
+        '''
+        st = self.state
+        if pos is None:
+            pos = st.pos
+
+        stretch = self.spring_lengths(pos)
+        stretch -= st.rest_length
+        
+        energy = 0.5 * np.dot(st.k, stretch**2) + G * np.dot(st.mass, pos[:, 1])
+        for f_id, force in self.external_forces:
+            energy -= np.dot(force, pos[f_id])
+
+        return energy
+
+    def rk4_step(self):
+        '''
+        Runge Kutta (RK4) step with fixed time step.
+        '''
+        st = self.state
+        dt = self.dt
+        rk4_stages(self.acceleration, st.pos, st.vel, self.free[:, None], dt, self, self.profiler.section)
+
+        self.stats.add_step(self.time, dt)
+        self.time += dt
 
-        for id, p in enumerate(self.points):
-            if p.fix:
+    def combine_stages(self, base: np.ndarray, k_arr: np.ndarray, weights: tuple[float], dt: float, out: np.ndarray):
+        '''
+        Writes `base + dt * sum(weights[i] * k_arr[i])` to `out`. If `base` is `None` it's taken as zero.
+        '''
+        if base is None:
+            out.fill(0)
+        else:
+            np.copyto(out, base)
+        for i, w in enumerate(weights):
+            if w == 0:
                 continue
+            np.multiply(k_arr[i], w * dt, out=self.work_arr)
+            out += self.work_arr
+
+    def dopri5_step(self):
+        '''
+        Dormand–Prince 5(4) step with error control. The step is retried with a smaller time 
+        step until the error is within tolerance, and `self.dt` is set to the time step 
+        proposed for the next step.
+
+        The last stage is evaluated at the new state, so it's reused as the first stage of the
+        next step (first same as last), and an accepted step costs 6 forces evaluations. Tensions
+        are updated at the new state. As in `verlet_step`, the first stage is evaluated again if the
+        state was changed since the last step.
+        '''
+        st = self.state
+        cfg: AdaptiveStepConfig = self.integrator_cfg
+        tableau = DormandPrince
+        free = self.free[:, None]
+
+        k_pos, k_vel = self.k_pos, self.k_vel
+        pos, vel = self.pos_stage, self.vel_stage
+        last = tableau.num_stages - 1
+        
+        # The first stage does not depend on the time step.
+        section = self.profiler.section
+        if not (self.last_accel_valid and np.array_equal(st.pos, self.pos_old) and np.array_equal(st.vel, self.vel_old)):
+            np.copyto(self.pos_old, st.pos)
+            np.copyto(self.vel_old, st.vel)
+            with section(STAGE_SECTIONS[0]):
+                self.acceleration(self.pos_old, self.vel_old, k_vel[0], update_tensions=True)
+        np.multiply(self.vel_old, free, out=k_pos[0])
+
+        max_factor = cfg.max_factor
+        while True:
+            dt = self.dt
+            if cfg.dt_max is not None:
+                dt = min(dt, cfg.dt_max)
+            dt = max(dt, cfg.dt_min)
+
+            for stage in range(1, tableau.num_stages):
+                with section(STAGE_SECTIONS[stage]):
+                    weights = tableau.a[stage]
+                    self.combine_stages(self.pos_old, k_pos, weights, dt, pos)
+                    self.combine_stages(self.vel_old, k_vel, weights, dt, vel)
+                    
+                    np.multiply(vel, free, out=k_pos[stage])
+                    self.acceleration(pos, vel, k_vel[stage], update_tensions=(stage == last))
+            
+            # `pos` and `vel` now hold the fifth order solution. The error of each 
+            # component is scaled by its tolerance.
+            with section("error"):
+                err, scale = self.err_arr, self.err_scale
+                err_norm = 0
+                for old, new, k_arr in ((self.pos_old, pos, k_pos), (self.vel_old, vel, k_vel)):
+                    self.combine_stages(None, k_arr, tableau.e, dt, err)
+                    np.maximum(np.abs(old, out=scale), np.abs(new, out=self.work_arr), out=scale)
+                    scale *= cfg.rtol
+                    scale += cfg.atol
+                    err /= scale
+                    err_norm += np.vdot(err, err)
+                err_norm = np.sqrt(err_norm / (2 * err.size))
+
+            if err_norm <= 1 or dt <= cfg.dt_min:
+                break
+            
+            self.stats.rejected += 1
+            self.dt = dt * max(cfg.safety * err_norm**(-1/5), cfg.min_factor)
+            max_factor = 1 # Don't increase the step right after a rejection.
+
+        np.copyto(st.pos, pos)
+        np.copyto(st.vel, vel)
+        np.copyto(self.pos_old, pos)
+        np.copyto(self.vel_old, vel)
+        np.copyto(k_vel[0], k_vel[last])
+        self.last_accel_valid = True
+
+        self.stats.add_step(self.time, dt)
+        self.time += dt
 
-            k11, k12, k13, k14 = k1_values[id]
-            k21, k22, k23, k24 = k2_values[id]
-            p.pos = pos_old[id] + self.dt/6 * (k11 + 2*(k12 + k13) + k14)
-            p.vel = vel_old[id] + self.dt/6 * (k21 + 2*(k22 + k23) + k24)
-        ##############
+        if err_norm == 0:
+            factor = max_factor
+        else:
+            factor = min(max(cfg.safety * err_norm**(-1/5), cfg.min_factor), max_factor)
+        self.dt = dt * factor
 
+    def newton_solve(self, dt: float) -> bool:
+        '''
+        Solves the velocity `v1` of a backward Euler step of size `dt` from `self.pos_old` and
+        `self.vel_old` (see `backward_euler_step`), writing it to `self.vel_stage`. Returns 
+        whether the Newton iterations converged.
+        '''
+        st = self.state
+        cfg: ImplicitConfig = self.integrator_cfg
+        free = self.free[:, None]
+
+        vel, pos = self.vel_stage, self.pos_stage
+        residual = self.work_arr
+        accel = self.k_vel[0]
+        np.copyto(vel, self.vel_old)
+
+        if self.jacobian is None:
+            self.jacobian = ChainJacobian(self.num_points)
+        np.multiply(st.damping, dt, out=self.jacobian_diag)
+        self.jacobian_diag += st.mass
 
-        ## Euler ##
-        # ids: list[int] = []
-        # new_pos = []
-        # new_vel = []
+        section = self.profiler.section
+        for _ in range(cfg.max_iterations):
+            np.multiply(vel, dt, out=pos)
+            pos *= free
+            pos += self.pos_old
 
-        # for id, p in enumerate(self.points):
-        #     accel = self.point_acceleration(p, update_tensions=True, id=id)
-        #     if p.fix:
-        #         continue
+            self.acceleration(pos, vel, accel, update_tensions=True)
 
-        #     next_pos = p.pos + p.vel * self.dt + self.dt**2/2 * accel
-        #     next_vel = p.vel + accel * self.dt
+            # Minus the residual: M (v0 - v1) + dt * F
+            np.subtract(self.vel_old, vel, out=residual)
+            accel *= dt
+            residual += accel
+            residual *= st.mass[:, None]
+            residual *= free
 
-        #     new_pos.append(next_pos)
-        #     new_vel.append(next_vel)
-        #     ids.append(id)
+            with section("jacobian"):
+                self.jacobian.assemble(pos, st, self.free, self.jacobian_diag, dt**2, self.force_work)
+                self.jacobian.solve(residual)
+            vel += residual
+
+            # `np.abs(nan) < tol` is false, so a diverged iteration is not converged.
+            if np.abs(residual).max() < cfg.tol:
+                return True
         
-        # for id, pos, vel in zip(ids, new_pos, new_vel):
-        #     self.points[id].pos = pos 
-        #     self.points[id].vel = vel
-        ##############
+        return cfg.max_iterations == 1
+
+    def backward_euler_step(self):
+        '''
+        Implicit (backward) Euler step. The new velocity `v1` solves
+
+            M (v1 - v0) = dt * F(x0 + dt*v1, v1)
 
-        self.time += self.dt
+        which is solved by Newton's method, each iteration solving the banded system assembled
+        by `ChainJacobian` in O(N). Tensions are updated at the last Newton iterate.
+
+        If the iterations don't converge (the biggest velocity correction is not smaller than
+        `ImplicitConfig.tol` after `ImplicitConfig.max_iterations`), the step is rejected and 
+        `self.dt` is covered by sub-steps of half the size, down to `self.dt / 2**max_halvings`.
+        Each sub-step is counted as an accepted step in `self.stats`.
+        
+        This method is stable for any time step, but numerically dissipates energy.
+        '''
+        st = self.state
+        cfg: ImplicitConfig = self.integrator_cfg
+        pos = self.pos_stage
+
+        # `done` sub-steps of size `self.dt / 2**level` were taken.
+        level = 0
+        done = 0
+        while done < 2**level:
+            dt = self.dt / 2**level
+            np.copyto(self.pos_old, st.pos)
+            np.copyto(self.vel_old, st.vel)
+
+            if not self.newton_solve(dt):
+                if level < cfg.max_halvings:
+                    self.stats.rejected += 1
+                    level += 1
+                    done *= 2
+                    continue
+                warnings.warn(f"O método de Newton do integrador implícito não convergiu em t={self.time:.6g} s "
+                    f"(passo de {dt:.3g} s), o passo foi aceito mesmo assim.")
+
+            np.multiply(self.vel_stage, dt, out=pos)
+            pos *= self.free[:, None]
+            st.pos += pos
+            np.copyto(st.vel, self.vel_stage)
+
+            self.stats.add_step(self.time, dt)
+            self.time += dt
+            done += 1
+
+    def verlet_step(self):
+        '''
+        Velocity Verlet step with fixed time step:
+
+            v(t + dt/2) = v(t) + dt/2 * a(t)
+            x(t + dt) = x(t) + dt * v(t + dt/2)
+            v(t + dt) = v(t + dt/2) + dt/2 * a(t + dt)
+
+        The acceleration at the end of a step is reused at the start of the next one, so there is a
+        single forces evaluation per step. Without damping the method is symplectic, so the energy
+        oscillates around its initial value instead of drifting. The damping force of `a(t + dt)` is
+        evaluated with `v(t + dt/2)`. Tensions are updated at the end of the step.
+
+        If the state was changed since the last step (e.g. by `Rope.set_state`), the acceleration
+        is evaluated again. Changes in the elements properties are not detected, call
+        `reset_integrator` after them.
+        '''
+        st = self.state
+        dt = self.dt
+        free = self.free[:, None]
+        accel = self.last_accel
+        
+        section = self.profiler.section
+        if not (self.last_accel_valid and np.array_equal(st.pos, self.pos_old) and np.array_equal(st.vel, self.vel_old)):
+            with section(STAGE_SECTIONS[0]):
+                self.acceleration(st.pos, st.vel, accel, update_tensions=True)
+
+        with section("state update"):
+            np.multiply(accel, dt/2, out=self.work_arr)
+            st.vel += self.work_arr
+            np.multiply(st.vel, dt, out=self.work_arr)
+            self.work_arr *= free
+            st.pos += self.work_arr
+
+        with section(STAGE_SECTIONS[1]):
+            self.acceleration(st.pos, st.vel, accel, update_tensions=True)
+
+        with section("state update"):
+            np.multiply(accel, dt/2, out=self.work_arr)
+            st.vel += self.work_arr
+            np.copyto(self.pos_old, st.pos)
+            np.copyto(self.vel_old, st.vel)
+        self.last_accel_valid = True
+
+        self.stats.add_step(self.time, dt)
+        self.time += dt
+
+    def xpbd_step(self):
+        '''
+        Position based step (XPBD, see `xpbd.py`). Damping (implicitly, so it's stable for any damping),
+        gravity and external forces change the velocities, the nodes are moved with them and then
+        projected onto the springs constraints, and the velocities are set to the displacements 
+        over `dt`. Tensions and `self.constraint_error` are updated at the end of the step.
+        '''
+        st = self.state
+        dt = self.dt
+        cfg: XPBDConfig = self.integrator_cfg
+        free = self.free[:, None]
+
+        if self.constraints is None:
+            self.constraints = DistanceConstraints(st)
+            self.constraints_work = self.force_work
+            if self.topology is None:
+                self.constraints_work = ForceWorkspace(self.num_points, topology=self.constraints.topology)
+        constraints = self.constraints
+
+        section = self.profiler.section
+        with section("state update"):
+            # Implicit damping of the current velocity: m (v1 - v0) = -c dt v1
+            vel = self.vel_stage
+            damping_factor = np.multiply(st.damping, dt, out=constraints.damping_factor)
+            damping_factor /= st.mass
+            damping_factor += 1
+            np.divide(st.vel, damping_factor[:, None], out=vel)
+
+            vel[:, 1] -= G * dt
+            if self.external_force is not None:
+                np.multiply(self.external_force, dt, out=self.work_arr)
+                self.work_arr /= st.mass[:, None]
+                vel += self.work_arr
+            vel *= free
+
+            pos = self.pos_stage
+            np.multiply(vel, dt, out=pos)
+            pos += st.pos
+
+        with section("constraints"):
+            constraints.prepare(st, self.free, dt, cfg)
+            constraints.project(pos, st, cfg)
+
+        with section("state update"):
+            np.subtract(pos, st.pos, out=vel)
+            vel /= dt
+            np.copyto(st.vel, vel, where=free)
+            np.copyto(st.pos, pos)
+
+            self.constraint_error = constraints.error(st.pos, st.rest_length)
+            force = self.force_work.spring_force
+            constraints.spring_forces(dt, force)
+            np.abs(force, out=force)
+            constraints.topology.node_max(force, self.tensions, self.constraints_work)
+
+        self.stats.add_step(self.time, dt)
+        self.time += dt
+
+    def reset_integrator(self):
+        '''
+        Forgets the values kept between steps (the last acceleration of `Integrator.verlet` and
+        `Integrator.dopri5`). Needed only after changing the elements properties (masses, springs, ...)
+        between steps.
+        '''
+        self.last_accel_valid = False
+
+    def restore_acceleration(self, accel: np.ndarray):
+        '''
+        Sets the acceleration at the current state, reused by the next `Integrator.verlet` or
+        `Integrator.dopri5` step (e.g. the one saved in a checkpoint).
+        '''
+        np.copyto(self.last_accel, accel)
+        np.copyto(self.pos_old, self.state.pos)
+        np.copyto(self.vel_old, self.state.vel)
+        self.last_accel_valid = True
+
+    def update(self):
+        '''
+        Advance one time step.
+        '''
+        section = self.profiler.section
+        with section("solver.update"):
+            np.logical_not(self.state.fix, out=self.free)
+            self.steppers[self.integrator]()
+
+            with section("monitors"):
+                for monitor in self.monitors:
+                    monitor.update(self)
+
+    def add_monitor(self, monitor):
+        '''
+        Adds an object with a method `update(solver)`, which is called after each step.
+        '''
+        self.monitors.append(monitor)
 
+    def remove_monitor(self, monitor):
+        self.monitors.remove(monitor)
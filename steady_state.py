@@ -0,0 +1,129 @@
+'''
+Detection of the rope steady state (the rope settled at its equilibrium).
+'''
+import numpy as np
+
+from solver import Solver
+from config import SteadyStateConfig
+from constant import G
+
+class SteadyStateDetector:
+    '''
+    Tracks convergence metrics of the rope after each step. Add it to the solver with `Solver.add_monitor`.
+
+    The metrics that cost a single pass over the nodes (max speed, kinetic energy and tensions change)
+    are computed every step. The net force needs a forces evaluation, so it's only computed when the
+    other metrics are below their thresholds, at the start and at the end of the window. After it fails,
+    it's not computed again during the next window, so a rope that is slowly creeping towards the
+    equilibrium costs at most one forces evaluation per window.
+    '''
+    def __init__(self, cfg: SteadyStateConfig = None) -> None:
+        if cfg is None:
+            cfg = SteadyStateConfig()
+        self.cfg = cfg
+
+        # Metrics of the last step, `None` if not computed.
+        self.max_speed: float = None
+        self.kinetic_energy: float = None
+        self.tension_change: float = None
+        self.net_force: float = None
+
+        self.settled = False
+        # Time and step (counted from the detector creation) when the metrics fell below the thresholds for the last time.
+        self.settle_time: float = None
+        self.settle_step: int = None
+        # Time and step when the steady state was detected (end of the window).
+        self.detect_time: float = None
+        self.detect_step: int = None
+
+        self.steps = 0
+        # Time before which the net force is not computed again, after it was above its threshold.
+        self.net_force_retry_time: float = None
+        self.speed2: np.ndarray = None
+        self.last_tensions: np.ndarray = None
+        self.last_time: float = None
+
+    def reset(self):
+        '''
+        Forgets the steady state, e.g. after the rope was disturbed.
+        '''
+        self.__init__(self.cfg)
+
+    def compute_net_force(self, solver: Solver):
+        '''
+        Biggest resultant force on a free node, relative to its weight.
+        '''
+        solver.diagnostics()
+        force = solver.diagnostics_force[solver.free]
+        weight = solver.state.mass[solver.free] * G
+        if force.size == 0:
+            return 0
+        return float((np.hypot(force[:, 0], force[:, 1]) / weight).max())
+
+    def below_thresholds(self) -> bool:
+        cfg = self.cfg
+        return not (
+            (cfg.max_speed is not None and not self.max_speed < cfg.max_speed) or
+            (cfg.kinetic_energy is not None and not self.kinetic_energy < cfg.kinetic_energy) or
+            (cfg.tension_change is not None and not self.tension_change < cfg.tension_change)
+        )
+
+    def net_force_ok(self, solver: Solver) -> bool:
+        if self.cfg.net_force is None:
+            return True
+        self.net_force = self.compute_net_force(solver)
+        if self.net_force < self.cfg.net_force:
+            return True
+        self.net_force_retry_time = solver.time + self.cfg.window
+        return False
+
+    def update(self, solver: Solver):
+        '''
+        Called by the solver after each step.
+        '''
+        self.steps += 1
+        if self.settled:
+            return
+
+        st = solver.state
+        if self.speed2 is None:
+            self.speed2 = np.zeros(st.num_points)
+            self.last_tensions = solver.tensions.copy()
+            self.last_time = solver.time
+            self.tension_change = np.inf
+        else:
+            tensions = solver.tensions
+            scale = np.abs(tensions).max() * (solver.time - self.last_time)
+            change = np.abs(tensions - self.last_tensions).max()
+            if scale > 0:
+                self.tension_change = change / scale
+            else:
+                # All tensions are zero (e.g. slack rope): settled if they stay zero.
+                self.tension_change = 0 if change == 0 else np.inf
+            np.copyto(self.last_tensions, tensions)
+            self.last_time = solver.time
+
+        speed2 = np.einsum("ij,ij->i", st.vel, st.vel, out=self.speed2)
+        self.max_speed = float(np.sqrt(speed2.max()))
+        self.kinetic_energy = 0.5 * float(np.dot(st.mass, speed2))
+        self.net_force = None
+
+        if not self.below_thresholds():
+            self.settle_time = None
+            return
+
+        if self.settle_time is None:
+            if self.net_force_retry_time is not None and solver.time < self.net_force_retry_time:
+                return
+            if self.net_force_ok(solver):
+                self.settle_time = solver.time
+                self.settle_step = self.steps
+            return
+
+        if solver.time - self.settle_time >= self.cfg.window:
+            if self.net_force_ok(solver):
+                self.settled = True
+                self.detect_time = solver.time
+                self.detect_step = self.steps
+            else:
+                self.settle_time = None
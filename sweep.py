@@ -0,0 +1,357 @@
+'''
+Parameter sweeps: many simulations run headless, in parallel, until the rope settles.
+
+Each case is a dictionary of parameters (see `DEFAULT_CASE`), which is turned into the rope
+configurations by a case builder (`line_case` by default, any function with the same signature
+defined at module level can be used). Cases are created with `grid` or `random_samples`.
+
+Results (sag, max tension, horizontal tension, run time, ...) are written to a CSV file as the
+cases finish, one row per case. A case that raises an error, diverges or exceeds its wall time
+limit gets a row with its status, the remaining cases are not affected.
+
+Usage:
+    python sweep.py -o results.csv --grid diameter=0.01,0.02 span=2,4
+    python sweep.py -o results.csv --random 50 --range elastic_constant=1e3:1e5 --grid element_length=0.05,0.1
+'''
+import numpy as np
+import argparse
+import csv
+import itertools
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import curves
+from config import RopeConfig, ElementConfig, CreateConfig, SteadyStateConfig
+from simulation import Simulation
+from solver import Integrator, Backend
+from steady_state import SteadyStateDetector
+
+DEFAULT_CASE = {
+    # RopeConfig
+    "elastic_constant": 1e4,
+    "diameter": 0.01,
+    "weight_density": 0.7,
+    # ElementConfig
+    "element_length": 0.05,
+    "damping": 0.1,
+    # CreateConfig
+    "multiplier": 1,
+    # Curve (line from the origin)
+    "span": 4,
+    "height": 0, # Height of the last node relative to the first one.
+    # Solver
+    "dt": 0.01,
+}
+
+class CaseStatus:
+    '''
+    How the simulation of a case ended.
+    '''
+    converged = "converged" # The rope settled (see `steady_state.SteadyStateDetector`).
+    max_time = "max_time" # Simulated time limit reached before the rope settled.
+    timeout = "timeout" # Wall time limit reached.
+    diverged = "diverged" # The state is not finite.
+    failed = "failed" # An error was raised (or the process died).
+
+RESULT_FIELDS = ("status", "sag", "max_tension", "horizontal_tension", "settle_time", "settle_step", "sim_time", "num_steps", "num_points", 
+    "run_time", "error")
+
+class SweepConfig:
+    '''
+    How each case of a sweep is simulated.
+    '''
+
+    def __init__(self, integrator=Integrator.rk4, backend=Backend.numpy, steady_state: SteadyStateConfig = None, check_every: int = 100,
+        max_time: float = 200, timeout: float = 600) -> None:
+        '''
+        Parameters:
+        -----------
+        steady_state:
+            When the rope is considered settled, see `SteadyStateConfig`.
+
+        check_every:
+            Number of steps between checks of the limits and of divergence.
+
+        max_time:
+            Maximum simulated time (s) of a case.
+
+        timeout:
+            Maximum wall time (s) of a case.
+        '''
+        self.integrator = integrator
+        self.backend = backend
+        if steady_state is None:
+            steady_state = SteadyStateConfig()
+        self.steady_state = steady_state
+        self.check_every = check_every
+        self.max_time = max_time
+        self.timeout = timeout
+
+def grid(**values) -> list[dict]:
+    '''
+    Cases with all combinations of the given parameter values, e.g. `grid(diameter=[0.01, 0.02], span=[2, 4])`.
+    '''
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+def random_samples(num_samples: int, seed: int = None, **ranges) -> list[dict]:
+    '''
+    `num_samples` cases with random parameter values. A parameter given by a tuple `(low, high)` is
+    sampled uniformly in this interval, by a list, one of its elements is chosen.
+    '''
+    rng = np.random.default_rng(seed)
+    cases = [{} for _ in range(num_samples)]
+    for name, values in ranges.items():
+        if isinstance(values, tuple):
+            samples = rng.uniform(values[0], values[1], num_samples)
+        else:
+            samples = [values[i] for i in rng.integers(len(values), size=num_samples)]
+        for case, value in zip(cases, samples):
+            case[name] = value.item() if isinstance(value, np.generic) else value
+    return cases
+
+def combine(*case_lists: list[dict]) -> list[dict]:
+    '''
+    Cases with all combinations of one case from each list, e.g. random materials for each span of a grid.
+    '''
+    return [dict(item for case in cases for item in case.items()) for cases in itertools.product(*case_lists)]
+
+def line_case(params: dict) -> tuple[RopeConfig, ElementConfig, CreateConfig, curves.Curve]:
+    '''
+    Configurations of a rope created along a line, with the parameters of `DEFAULT_CASE`.
+    '''
+    rope_cfg = RopeConfig(elastic_constant=params["elastic_constant"], diameter=params["diameter"], weight_density=params["weight_density"])
+    element_cfg = ElementConfig(length=params["element_length"], damping=params["damping"])
+    create_cfg = CreateConfig(multiplier=params["multiplier"])
+    curve = curves.Line(np.array([0, 0]), np.array([params["span"], params["height"]]))
+    return rope_cfg, element_cfg, create_cfg, curve
+
+def case_results(sim: Simulation) -> dict:
+    '''
+    Results of the current state of the simulation.
+    '''
+    solver = sim.solver
+    d = solver.diagnostics()
+    pos = solver.state.pos
+
+    # Vertical distance from the lowest node to the line between the ends.
+    start, end = pos[0], pos[-1]
+    x = d.lowest_pos[0]
+    chord_y = start[1] + (end[1] - start[1]) * (x - start[0]) / (end[0] - start[0])
+
+    return {
+        "sag": float(chord_y - d.lowest_pos[1]),
+        "max_tension": float(solver.tensions.max()),
+        "horizontal_tension": float(np.abs(d.reactions[:, 0]).mean()),
+        "sim_time": float(solver.time),
+        "num_points": solver.num_points,
+    }
+
+def simulate_case(params: dict, cfg: SweepConfig, case_builder, result: dict):
+    '''
+    Simulates the case until the rope settles (or a limit of `cfg` is reached), filling `result`.
+    '''
+    t1 = time.perf_counter()
+    rope_cfg, element_cfg, create_cfg, curve = case_builder(params)
+    sim = Simulation(rope_cfg, element_cfg, create_cfg, curve, dt=params["dt"], integrator=cfg.integrator, backend=cfg.backend)
+    solver = sim.solver
+    detector = SteadyStateDetector(cfg.steady_state)
+    solver.add_monitor(detector)
+
+    while True:
+        for _ in range(cfg.check_every):
+            solver.update()
+            if detector.settled:
+                break
+        result["num_steps"] = detector.steps
+
+        vel = solver.state.vel
+        if not np.isfinite(vel).all() or not np.isfinite(solver.state.pos).all():
+            result["status"] = CaseStatus.diverged
+            break
+        if detector.settled:
+            result["status"] = CaseStatus.converged
+            break
+        if solver.time >= cfg.max_time:
+            result["status"] = CaseStatus.max_time
+            break
+        if time.perf_counter() - t1 > cfg.timeout:
+            result["status"] = CaseStatus.timeout
+            break
+
+    result["settle_time"] = detector.settle_time
+    result["settle_step"] = detector.settle_step
+    result.update(case_results(sim))
+
+def run_case(params: dict, cfg: SweepConfig, case_builder=line_case) -> dict:
+    '''
+    Simulates the case given by `params` (see `simulate_case`). Never raises, errors are reported
+    in the result.
+    '''
+    params = dict(DEFAULT_CASE, **params)
+    result = {"status": CaseStatus.failed, "num_steps": 0, "error": ""}
+
+    t1 = time.perf_counter()
+    try:
+        # Diverging cases are detected by the checks.
+        with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+            simulate_case(params, cfg, case_builder, result)
+    except Exception as e:
+        result["status"] = CaseStatus.failed
+        result["error"] = "".join(traceback.format_exception_only(e)).strip()
+
+    result["run_time"] = time.perf_counter() - t1
+    return result
+
+class Sweep:
+    '''
+    Runs the cases in a pool of processes and writes the results to a CSV file as they finish.
+    '''
+    def __init__(self, cases: list[dict], cfg: SweepConfig = None, case_builder=line_case, workers: int = None) -> None:
+        '''
+        Parameters:
+        -----------
+        cases:
+            Parameters of each case, the missing ones are taken from `DEFAULT_CASE`.
+
+        case_builder:
+            Function that receives the parameters of a case and returns its configurations
+            (rope_cfg, element_cfg, create_cfg, curve). It must be defined at module level,
+            so it can be sent to the processes.
+
+        workers:
+            Number of processes, the number of processors by default.
+        '''
+        if cfg is None:
+            cfg = SweepConfig()
+
+        self.cases = cases
+        self.cfg = cfg
+        self.case_builder = case_builder
+        self.workers = workers or os.cpu_count() or 1
+
+        self.param_names = list(DEFAULT_CASE)
+        for case in cases:
+            self.param_names += [name for name in case if name not in self.param_names]
+
+    def collect(self, futures: dict, write) -> list[int]:
+        '''
+        Calls `write(case_id, result)` for each future of `futures` (future -> case id) as it finishes.
+        Returns the cases that were not finished because their pool broke.
+        '''
+        broken = []
+        for future in as_completed(futures):
+            case_id = futures[future]
+            try:
+                write(case_id, future.result())
+            except BrokenProcessPool:
+                broken.append(case_id)
+        return sorted(broken)
+
+    def run_pool(self, case_ids: list[int], write) -> list[int]:
+        '''
+        Runs the cases `case_ids` in one pool of `self.workers` processes, calling `write(case_id, result)`
+        for each finished case. Returns the cases that were not finished because the pool broke.
+        '''
+        if not case_ids:
+            return []
+        executor = ProcessPoolExecutor(min(self.workers, len(case_ids)))
+        try:
+            futures = {executor.submit(run_case, self.cases[case_id], self.cfg, self.case_builder): case_id for case_id in case_ids}
+            return self.collect(futures, write)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def run_alone(self, case_ids: list[int], write) -> list[int]:
+        '''
+        Runs each case of `case_ids` in its own process, at most `self.workers` at a time, calling
+        `write(case_id, result)` for each finished case. Returns the cases whose process died.
+        '''
+        broken = []
+        for i in range(0, len(case_ids), self.workers):
+            executors = {case_id: ProcessPoolExecutor(1) for case_id in case_ids[i:i+self.workers]}
+            try:
+                futures = {executor.submit(run_case, self.cases[case_id], self.cfg, self.case_builder): case_id 
+                    for case_id, executor in executors.items()}
+                broken += self.collect(futures, write)
+            finally:
+                for executor in executors.values():
+                    executor.shutdown(cancel_futures=True)
+        return broken
+
+    def run(self, path: str, callback=None) -> list[dict]:
+        '''
+        Runs all cases, writing a row to the CSV file `path` as each one finishes. Returns the rows
+        in the order of the cases.
+
+        `callback(row)` is called after each row is written.
+        '''
+        rows: list[dict] = [None] * len(self.cases)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["case", *self.param_names, *RESULT_FIELDS])
+            writer.writeheader()
+
+            def write(case_id: int, result: dict):
+                row = {"case": case_id, **DEFAULT_CASE, **self.cases[case_id], **result}
+                rows[case_id] = row
+                writer.writerow(row)
+                f.flush()
+                if callback is not None:
+                    callback(row)
+
+            # A case that kills its process breaks the pool, making all unfinished cases fail. These
+            # are run again, each one in its own process, so only the case that killed it fails.
+            broken = self.run_pool(list(range(len(self.cases))), write)
+            for case_id in self.run_alone(broken, write):
+                write(case_id, {"status": CaseStatus.failed, "error": "O processo do caso terminou inesperadamente."})
+
+        return rows
+
+def parse_values(text: str):
+    name, values = text.split("=")
+    return name, [float(v) for v in values.split(",")]
+
+def parse_range(text: str):
+    name, values = text.split("=")
+    low, high = values.split(":")
+    return name, (float(low), float(high))
+
+def print_row(row: dict):
+    if "sag" not in row:
+        print(f"caso {row['case']:>5}: {row['status']:<10} {row['error']}")
+        return
+    print(f"caso {row['case']:>5}: {row['status']:<10} flecha={row['sag']:.5g} T_max={row['max_tension']:.5g} "
+        f"H={row['horizontal_tension']:.5g} ({row['run_time']:.2f} s) {row['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweep of the rope simulator (ropes along a line).")
+    parser.add_argument("-o", "--output", default="sweep.csv", help="CSV file for the results.")
+    parser.add_argument("--grid", nargs="+", default=[], metavar="NAME=V1,V2,...", help="Values of a parameter, all combinations are run.")
+    parser.add_argument("--random", type=int, metavar="N", help="Number of random samples of the '--range' parameters, for each grid case.")
+    parser.add_argument("--range", nargs="+", default=[], metavar="NAME=LOW:HIGH", help="Interval of a randomly sampled parameter.")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--max-speed", type=float, default=1e-4, help="Steady state speed threshold (m/s).")
+    parser.add_argument("--max-time", type=float, default=200)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    for name, _ in [*map(parse_values, args.grid), *map(parse_range, args.range)]:
+        if name not in DEFAULT_CASE:
+            parser.error(f"parâmetro '{name}' não existe, os parâmetros são: {', '.join(DEFAULT_CASE)}")
+
+    cases = grid(**dict(map(parse_values, args.grid)))
+    if args.random:
+        cases = combine(cases, random_samples(args.random, args.seed, **dict(map(parse_range, args.range))))
+
+    cfg = SweepConfig(steady_state=SteadyStateConfig(max_speed=args.max_speed), max_time=args.max_time, timeout=args.timeout)
+    rows = Sweep(cases, cfg, workers=args.workers).run(args.output, callback=print_row)
+
+    num_failed = sum(row["status"] in (CaseStatus.failed, CaseStatus.diverged, CaseStatus.timeout) for row in rows)
+    print(f"{len(rows)} casos, {num_failed} com falha. Resultados em '{args.output}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+'''
+Statistics of the tension of each node over a run, accumulated while the solver steps,
+with memory proportional to the number of nodes (no tension history is kept).
+'''
+import numpy as np
+
+from solver import Solver
+
+class TensionStatistics:
+    '''
+    Running statistics of `Solver.tensions` of each node: max, min, mean, variance and a histogram
+    of the tension ranges of the load half cycles. Add it to the solver with `Solver.add_monitor`,
+    the statistics can be read at any time.
+
+    Mean and variance are weighted by the step size (so they are time averages also with adaptive
+    steps), and are updated with Welford's algorithm, which is numerically stable for long runs.
+
+    Half cycles are counted between consecutive turning points of the tension of each node (range
+    counting, like rainflow counting without pairing interrupted cycles). A turning point is only
+    confirmed after the tension moves away from it by more than `threshold`, so small oscillations
+    (e.g. round off at the steady state) don't count as cycles. The open half cycle since the last
+    turning point is not counted.
+
+    Statistics of different runs of the same rope can be combined with `merge`, and saved to a file
+    with `save` (see `load`).
+    '''
+    def __init__(self, num_points: int = None, range_bins: np.ndarray = None, threshold: float = 0, every: int = 1) -> None:
+        '''
+        Parameters:
+        -----------
+        num_points:
+            Number of nodes, taken from the solver at the first update if not given.
+
+        range_bins:
+            Edges of the bins of the tension range histogram (N). Ranges outside them are counted
+            in the first or last bin. If not given, half cycles are not counted.
+
+        threshold:
+            Smallest tension change (N) that confirms a turning point.
+
+        every:
+            The statistics are updated every `every` steps, with a weight equal to the duration
+            of these steps.
+        '''
+        self.range_bins = None if range_bins is None else np.asarray(range_bins, dtype=float)
+        self.threshold = threshold
+        self.every = every
+        self.steps = 0
+        self.pending_weight: float = 0 # Duration of the steps since the last sample.
+
+        self.num_samples = 0
+        self.total_weight: float = 0 # Sum of the samples weights (time).
+        self.num_points: int = None
+        if num_points is not None:
+            self.allocate(num_points)
+
+    def allocate(self, num_points: int):
+        self.num_points = num_points
+        self.max = np.full(num_points, -np.inf)
+        self.min = np.full(num_points, np.inf)
+        self.mean = np.zeros(num_points)
+        self.m2 = np.zeros(num_points) # Weighted sum of the squared deviations from the mean.
+
+        # Half cycles of each node in each range bin.
+        self.half_cycles: np.ndarray = None
+        if self.range_bins is not None:
+            self.half_cycles = np.zeros((num_points, self.range_bins.size - 1), dtype=np.int64)
+
+        # Turning points tracking: tension at the last turning point, extreme tension since then, and
+        # direction of the tension since then (1 rising, -1 falling, 0 before the first turning point).
+        self.last_turn = np.zeros(num_points)
+        self.extreme = np.zeros(num_points)
+        self.direction = np.zeros(num_points)
+
+        self.work = np.zeros(num_points)
+        self.work_delta = np.zeros(num_points)
+
+    def update(self, solver: Solver):
+        '''
+        Called by the solver after each step.
+        '''
+        self.steps += 1
+        self.pending_weight += solver.dt if solver.stats.last_dt is None else solver.stats.last_dt
+        if self.steps % self.every != 0:
+            return
+
+        # The sample stands for all the steps since the previous one.
+        self.add_sample(solver.tensions, self.pending_weight)
+        self.pending_weight = 0
+
+    def add_sample(self, tensions: np.ndarray, weight: float = 1):
+        '''
+        Adds the tensions of all nodes at some instant, representing an interval of duration `weight`.
+        '''
+        if self.num_points is None:
+            self.allocate(tensions.size)
+
+        if self.num_samples == 0:
+            np.copyto(self.last_turn, tensions)
+            np.copyto(self.extreme, tensions)
+
+        self.num_samples += 1
+        self.total_weight += weight
+        np.maximum(self.max, tensions, out=self.max)
+        np.minimum(self.min, tensions, out=self.min)
+
+        # Welford: mean += w/W (x - mean), m2 += w (x - mean_old) (x - mean_new)
+        delta = np.subtract(tensions, self.mean, out=self.work_delta)
+        np.multiply(delta, weight / self.total_weight, out=self.work)
+        self.mean += self.work
+        np.subtract(tensions, self.mean, out=self.work)
+        self.work *= delta
+        self.work *= weight
+        self.m2 += self.work
+
+        if self.range_bins is not None:
+            self.count_cycles(tensions)
+
+    def count_cycles(self, tensions: np.ndarray):
+        # Signed change from the extreme, positive if the tension keeps its direction.
+        change = np.subtract(tensions, self.extreme, out=self.work)
+        change *= self.direction
+
+        # Reversals (rare) and nodes still without a direction are handled by index.
+        reversed_ids = np.flatnonzero(change < -self.threshold)
+        np.copyto(self.extreme, tensions, where=change > 0)
+        if reversed_ids.size > 0:
+            extreme = self.extreme[reversed_ids]
+            self.add_half_cycles(reversed_ids, np.abs(extreme - self.last_turn[reversed_ids]))
+            self.last_turn[reversed_ids] = extreme
+            self.extreme[reversed_ids] = tensions[reversed_ids]
+            self.direction[reversed_ids] *= -1
+
+        if self.undetermined:
+            ids = np.flatnonzero(self.direction == 0)
+            rise = tensions[ids] - self.last_turn[ids]
+            started = np.abs(rise) > self.threshold
+            self.direction[ids[started]] = np.sign(rise[started])
+            self.extreme[ids[started]] = tensions[ids[started]]
+
+    @property
+    def undetermined(self) -> bool:
+        '''
+        `True` if there are nodes whose tension didn't leave the threshold around its first value.
+        '''
+        return self.num_samples > 0 and not self.direction.all()
+
+    def add_half_cycles(self, ids: np.ndarray, ranges: np.ndarray):
+        bins = np.searchsorted(self.range_bins, ranges, side="right") - 1
+        np.clip(bins, 0, self.half_cycles.shape[1] - 1, out=bins)
+        np.add.at(self.half_cycles, (ids, bins), 1)
+
+    @property
+    def variance(self) -> np.ndarray:
+        if self.total_weight == 0:
+            return np.full(self.num_points, np.nan)
+        return self.m2 / self.total_weight
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    @property
+    def cycles(self) -> np.ndarray:
+        '''
+        Number of cycles of each node in each range bin, with shape (N, number of bins).
+        '''
+        return self.half_cycles / 2
+
+    def merge(self, other: "TensionStatistics"):
+        '''
+        Adds the statistics of `other` (of the same rope, e.g. another run) to these ones.
+        Turning points tracking continues from the state of this object.
+        '''
+        if other.num_samples == 0:
+            return
+        if self.num_samples == 0 and self.num_points is None:
+            self.allocate(other.num_points)
+        if other.num_points != self.num_points:
+            raise ValueError(f"Estatísticas de cordas com {self.num_points} e {other.num_points} nós não podem ser combinadas.")
+        has_bins, other_has_bins = self.range_bins is not None, other.range_bins is not None
+        if has_bins != other_has_bins or (has_bins and not np.array_equal(self.range_bins, other.range_bins)):
+            raise ValueError("Estatísticas com intervalos de variação de tração diferentes não podem ser combinadas.")
+
+        if self.num_samples == 0:
+            np.copyto(self.last_turn, other.last_turn)
+            np.copyto(self.extreme, other.extreme)
+            np.copyto(self.direction, other.direction)
+
+        # Chan et al. parallel combination of mean and m2.
+        weight = self.total_weight + other.total_weight
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta**2 * (self.total_weight * other.total_weight / weight)
+        self.mean += delta * (other.total_weight / weight)
+        self.total_weight = weight
+        self.num_samples += other.num_samples
+
+        np.maximum(self.max, other.max, out=self.max)
+        np.minimum(self.min, other.min, out=self.min)
+        if has_bins:
+            self.half_cycles += other.half_cycles
+
+    # Attributes saved by `save`.
+    saved_arrays = ("max", "min", "mean", "m2", "half_cycles", "last_turn", "extreme", "direction", "range_bins")
+
+    def save(self, path: str):
+        '''
+        Saves the statistics to `path` (NumPy `.npz` file).
+        '''
+        arrays = {name: getattr(self, name) for name in self.saved_arrays if getattr(self, name, None) is not None}
+        np.savez(path, num_samples=self.num_samples, total_weight=self.total_weight, threshold=self.threshold, **arrays)
+
+    @staticmethod
+    def load(path: str) -> "TensionStatistics":
+        '''
+        Statistics saved by `save`.
+        '''
+        with np.load(path) as data:
+            stats = TensionStatistics(data["mean"].size, data["range_bins"] if "range_bins" in data else None, float(data["threshold"]))
+            stats.num_samples = int(data["num_samples"])
+            stats.total_weight = float(data["total_weight"])
+            for name in stats.saved_arrays:
+                if name in data and name != "range_bins":
+                    np.copyto(getattr(stats, name), data[name])
+        return stats
@@ -0,0 +1,20 @@
+'''
+Ropes used by the tests.
+'''
+import numpy as np
+
+from config import RopeConfig, ElementConfig, CreateConfig
+from curves import Line
+from simulation import Simulation
+from solver import Integrator
+
+def make_simulation(spring_length: float = 0.1, dt: float = 0.005, integrator: int = Integrator.rk4, integrator_cfg=None,
+    multiplier: float = 1.1, damping: float = 0.1, elastic_constant: float = 1e4) -> Simulation:
+    '''
+    Simulation of a rope with fixed ends, created straight between (0, 0) and (4, 0) with its springs
+    stretched by `multiplier`, so it starts to fall.
+    '''
+    rope_cfg = RopeConfig(elastic_constant=elastic_constant, diameter=0.01, weight_density=0.7)
+    element_cfg = ElementConfig(length=spring_length, damping=damping)
+    return Simulation(rope_cfg, element_cfg, CreateConfig(multiplier=multiplier), Line(np.array([0, 0]), np.array([4, 0])), dt=dt,
+        integrator=integrator, integrator_cfg=integrator_cfg)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from scipy import integrate
+from scipy.optimize import fsolve
+
+import analitycal
+from config import ElasticRopeConfig
+
+def baseline_elastic_rope(horizontal_tension: float, gap_length: float, rope_cfg: ElasticRopeConfig, n: int):
+    '''
+    Original numerical solution: slope solved point by point, then integrated with the trapezoidal rule.
+    '''
+    a = horizontal_tension / rope_cfg.weight_density
+    b = a * rope_cfg.weight_density / (rope_cfg.elastic_constant * rope_cfg.cross_section_area)
+    x = np.linspace(-gap_length/2, gap_length/2, n)
+    slope = np.array([fsolve(lambda z: z - np.sinh(xi/a - b*z), np.sinh(xi/a) / (b + 1))[0] for xi in x])
+    y = np.zeros(n)
+    y[1:] = integrate.cumulative_trapezoid(slope, x)
+    return x + gap_length/2, y
+
+def test_elastic_rope_matches_baseline():
+    rope_cfg = ElasticRopeConfig(weight_density=0.7, cross_section_area=np.pi * 0.005**2, elastic_constant=1e6)
+    x, y = analitycal.elastic_rope(3, 4, rope_cfg, n=2001)
+    ref_x, ref_y = baseline_elastic_rope(3, 4, rope_cfg, n=2001)
+
+    # The baseline has the error of the trapezoidal rule.
+    assert np.allclose(x, ref_x)
+    assert np.abs(y - ref_y).max() <= 1e-6 * np.abs(ref_y).max()
+
+def test_rigid_elastic_rope_is_a_catenary():
+    rope_cfg = ElasticRopeConfig(weight_density=0.7, cross_section_area=1, elastic_constant=1e300)
+    x, y = analitycal.elastic_rope(3, 4, rope_cfg, n=501)
+    a = 3 / 0.7
+    assert np.allclose(y, a * (np.cosh((x - 2) / a) - np.cosh(2 / a)), rtol=0, atol=1e-12)
+
+def test_catenary_parameters_match_baseline():
+    x0 = np.array([0.5, 1, 2, 2, 10, 1e-3])
+    y0 = np.array([1, 1, 0.1, 5, 0.01, 1e3])
+    a = analitycal.catenary_parameters(x0, y0)
+
+    for x0_i, y0_i, a_i in zip(x0, y0, a):
+        func = lambda a: a * np.arccosh(y0_i/a + 1) - x0_i
+        ref = fsolve(func, a_i * 1.1, xtol=1e-14)[0]
+        assert np.isclose(a_i, ref, rtol=1e-10)
+
+        t = y0_i / a_i
+        assert abs(a_i * np.log1p(t + np.sqrt(t * (t + 2))) - x0_i) <= 1e-12 * x0_i
+
+def test_catenary_passes_through_points():
+    x, y, a = analitycal.catenary(2, 0.5)
+    assert x[0] == 0 and x[-1] == 4
+    assert np.isclose(y[0], 0) and np.isclose(y[-1], 0, atol=1e-12)
+    assert np.isclose(y.min(), -0.5, rtol=1e-6)
+
+def test_straight_catenary():
+    assert np.isinf(analitycal.catenary_parameters(np.array([1.0]), np.array([0.0]))[0])
+
+def test_catenary_invalid_points():
+    for x0 in (0, -1, np.nan):
+        with pytest.raises(ValueError):
+            analitycal.catenary_parameters(np.array([x0]), np.array([1.0]))
+
+    with pytest.raises(ValueError):
+        analitycal.catenary_parameters(np.array([1.0]), np.array([1e-300]), max_expansions=1)
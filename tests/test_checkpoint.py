@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from solver import Integrator
+from tests.ropes import make_simulation
+
+INTEGRATOR_DTS = [(Integrator.rk4, 0.005), (Integrator.dopri5, 0.01), (Integrator.backward_euler, 0.05), (Integrator.verlet, 0.002),
+    (Integrator.xpbd, 1/60)]
+
+@pytest.mark.parametrize("integrator, dt", INTEGRATOR_DTS)
+def test_resume_is_bit_for_bit(tmp_path, integrator, dt):
+    path = str(tmp_path / "rope.ckpt")
+    ref = make_simulation(integrator=integrator, dt=dt)
+    ref.run_headless(num_steps=60)
+
+    first = make_simulation(integrator=integrator, dt=dt)
+    first.run_headless(num_steps=30)
+    first.save_checkpoint(path, {"case": "test"})
+
+    resumed = make_simulation(integrator=integrator, dt=0.123)
+    checkpoint = resumed.load_checkpoint(path)
+    resumed.run_headless(num_steps=30)
+
+    assert checkpoint.metadata == {"case": "test"}
+    for name in ("pos", "vel"):
+        assert np.array_equal(getattr(resumed.solver.state, name), getattr(ref.solver.state, name))
+    assert np.array_equal(resumed.solver.tensions, ref.solver.tensions)
+    assert resumed.solver.time == ref.solver.time
+    assert resumed.solver.dt == ref.solver.dt
+    assert resumed.solver.stats.accepted == ref.solver.stats.accepted
@@ -0,0 +1,57 @@
+import numpy as np
+
+from config import RopeConfig, ElementConfig, CreateConfig
+from curves import Line
+from ensemble import EnsembleSolver
+from rope import Rope
+from simulation import Simulation
+from solver import Solver
+
+def cases():
+    '''
+    Ropes with different numbers of nodes (so some are padded) and damping.
+    '''
+    return [(RopeConfig(1e4, 0.01, weight_density=0.7), ElementConfig(length=length, damping=damping), CreateConfig(multiplier=1.1),
+        Line(np.array([0, 0]), np.array([4, 0]))) for length in (0.1, 0.15, 0.2) for damping in (0.05, 0.2)]
+
+def single_solvers(dts) -> list[Solver]:
+    solvers = []
+    for (rope_cfg, element_cfg, create_cfg, curve), dt in zip(cases(), dts):
+        Simulation.match_springs_properties(rope_cfg, element_cfg)
+        rope = Rope(curve, element_cfg, create_cfg)
+        rope.create()
+        solvers.append(Solver(rope.points, dt))
+    return solvers
+
+def test_ensemble_matches_single_solvers():
+    dts = np.linspace(0.005, 0.01, 6)
+    ensemble = EnsembleSolver.from_configs(cases(), dts)
+    solvers = single_solvers(dts)
+    assert len(set(ensemble.num_points)) > 1
+
+    ensemble.add_external_force(1, 3, np.array([0.1, -0.2]))
+    solvers[1].external_force = np.zeros((solvers[1].num_points, 2))
+    solvers[1].external_force[3] = [0.1, -0.2]
+    solvers[1].external_forces = [(3, np.array([0.1, -0.2]))]
+
+    for _ in range(50):
+        ensemble.update()
+        for solver in solvers:
+            solver.update()
+
+    energy = ensemble.energy()
+    for id, solver in enumerate(solvers):
+        assert np.array_equal(ensemble.ropes[id].state.pos, solver.state.pos)
+        assert np.array_equal(ensemble.ropes[id].state.vel, solver.state.vel)
+        assert np.array_equal(ensemble.rope_tensions(id), solver.tensions)
+        assert ensemble.time[id] == solver.time
+        assert np.isclose(energy[id], solver.energy(), rtol=1e-12, atol=1e-12)
+
+def test_padding_nodes_stay_fixed():
+    ensemble = EnsembleSolver.from_configs(cases(), 0.005)
+    padding = ~ensemble.mask
+    pos = ensemble.pos[padding].copy()
+    for _ in range(10):
+        ensemble.update()
+    assert np.array_equal(ensemble.pos[padding], pos)
+    assert not np.any(ensemble.vel[padding])
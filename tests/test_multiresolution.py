@@ -0,0 +1,33 @@
+import numpy as np
+
+from multiresolution import coarsen
+from tests.ropes import make_simulation
+
+def test_coarsen_keeps_totals():
+    st = make_simulation(spring_length=0.05).solver.state
+    st.mass *= np.linspace(1, 2, st.num_points)
+    st.damping *= np.linspace(2, 1, st.num_points)
+
+    coarse = coarsen(st, 10)
+    assert coarse.num_points == 11
+    assert np.isclose(coarse.mass.sum(), st.mass.sum())
+    assert np.isclose(coarse.damping.sum(), st.damping.sum())
+    assert np.isclose(coarse.rest_length.sum(), st.rest_length.sum())
+    assert np.isclose((1 / coarse.k).sum(), (1 / st.k).sum())
+    assert np.array_equal(coarse.fix[[0, -1]], st.fix[[0, -1]])
+
+def test_coarsen_keeps_damping_rate():
+    st = make_simulation(spring_length=0.05).solver.state
+    st.damping[:] = 2 * st.mass
+
+    coarse = coarsen(st, 10)
+    assert np.allclose(coarse.damping / coarse.mass, 2)
+
+def test_multiresolution_init_approaches_equilibrium():
+    sim = make_simulation(spring_length=0.05, dt=0.005)
+    equilibrium = sim.solver.equilibrium(update_state=False).pos
+    start_error = np.abs(sim.solver.state.pos - equilibrium).max()
+
+    sim.multiresolution_init(levels=3, max_time=20)
+    assert np.abs(sim.solver.state.pos - equilibrium).max() < 0.1 * start_error
+    assert not np.any(sim.solver.state.vel)
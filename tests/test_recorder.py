@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+from recorder import Recorder, Recording, frame_dtype
+from rope_elements import RopeState
+from solver import Solver
+from topology import Topology
+from tests.ropes import make_simulation
+
+def record(path: str, solver: Solver, num_steps: int, **kwargs):
+    '''
+    Records `num_steps` steps of `solver`, returning the recorder (not closed) and the expected
+    frames (step, time, positions, velocities and tensions).
+    '''
+    recorder = Recorder(path, solver, **kwargs)
+    solver.add_monitor(recorder)
+    expected = [(0, solver.time, solver.state.pos.copy(), solver.state.vel.copy(), solver.tensions.copy())]
+    for step in range(1, num_steps + 1):
+        solver.update()
+        if step % recorder.every == 0:
+            expected.append((step, solver.time, solver.state.pos.copy(), solver.state.vel.copy(), solver.tensions.copy()))
+    return recorder, expected
+
+def assert_frames(recording: Recording, expected: list):
+    assert recording.num_frames == len(expected)
+    steps, times, pos, vel, tensions = (np.array(values) for values in zip(*expected))
+    assert np.array_equal(recording.steps, steps)
+    assert np.array_equal(recording.times, times)
+    assert np.array_equal(recording.pos, pos)
+    assert np.array_equal(recording.vel, vel)
+    assert np.array_equal(recording.tensions, tensions)
+
+def test_recording_round_trip(tmp_path):
+    path = str(tmp_path / "rope.rec")
+    solver = make_simulation().solver
+    recorder, expected = record(path, solver, 30, every=3, chunk_frames=4, metadata={"name": "corda"})
+    assert recorder.capacity == 12 # Grown past the first chunks.
+    recorder.close()
+
+    # The preallocated space after the last frame is removed.
+    assert os.path.getsize(path) == recorder.data_offset + 11 * frame_dtype(solver.num_points).itemsize
+
+    recording = Recording(path)
+    assert_frames(recording, expected)
+    assert recording.metadata == {"name": "corda", "dt": solver.dt, "integrator": solver.integrator}
+    st = solver.state
+    assert np.array_equal(recording.mass, st.mass)
+    assert np.array_equal(recording.fix, st.fix)
+    assert np.array_equal(recording.k, st.k)
+    assert np.array_equal(recording.rest_length, st.rest_length)
+    assert recording.topology is None
+    assert np.array_equal(recording.node_history(3), recording.pos[:, 3])
+
+def test_unclosed_recording_is_readable_up_to_last_flush(tmp_path):
+    path = str(tmp_path / "rope.rec")
+    recorder, expected = record(path, make_simulation().solver, 10, chunk_frames=4)
+
+    # 11 frames were written, but the frame count is only updated when a chunk is flushed.
+    recording = Recording(path)
+    assert_frames(recording, expected[:8])
+    del recorder
+
+def test_network_recording(tmp_path):
+    topology = Topology.grid(4, 5)
+    state = RopeState(20, topology)
+    state.pos[:] = np.stack(np.meshgrid(np.arange(5.0), -np.arange(4.0)), axis=-1).reshape(-1, 2)
+    state.k[:] = np.linspace(100, 200, topology.num_edges)
+    state.rest_length[:] = 1
+    state.mass[:] = 0.1
+    state.fix[:5] = True
+
+    path = str(tmp_path / "net.rec")
+    solver = Solver.from_state(state, 1e-3)
+    recorder, expected = record(path, solver, 10)
+    recorder.close()
+
+    recording = Recording(path)
+    assert_frames(recording, expected)
+    assert np.array_equal(recording.k, state.k)
+    assert np.array_equal(recording.rest_length, state.rest_length)
+    assert np.array_equal(recording.fix, state.fix)
+    assert recording.topology.num_points == 20
+    assert np.array_equal(recording.topology.edges, topology.edges)
@@ -0,0 +1,61 @@
+import numpy as np
+from scipy.integrate import quad
+
+from config import ElementConfig, CreateConfig
+from curves import Curve, Line, UCurve, ParametricCurve
+from rope import Rope
+
+def baseline_u_curve(curve: UCurve, s: float):
+    '''
+    `UCurve.curve` of the original implementation, one point at a time.
+    '''
+    if s < curve.height:
+        return np.array([0, -1]) * s
+    elif s < (curve.height + curve.ulength):
+        return np.array([0, -curve.height]) + np.array([s-curve.height, 0])
+    else:
+        return np.array([curve.ulength, -curve.height]) + np.array([0, s - curve.height - curve.ulength])
+
+def baseline_node_positions(curve: Curve, point_curve, spring_length: float, multiplier: float):
+    '''
+    Node positions of the original `Rope.create`, placed node by node.
+    '''
+    pos = [point_curve(0)]
+    s = spring_length
+    while s < curve.length:
+        pos.append(point_curve(s))
+        s += spring_length * multiplier
+    pos[-1] = point_curve(curve.length)
+    return np.array(pos, dtype=float)
+
+def create_rope(curve: Curve, spring_length: float, multiplier: float = 1) -> Rope:
+    rope = Rope(curve, ElementConfig(k=100, length=spring_length, mass=0.01), CreateConfig(multiplier=multiplier))
+    rope.create()
+    return rope
+
+def test_node_positions_match_baseline():
+    line = Line(np.array([0, 0]), np.array([4, 0.5]))
+    u_curve = UCurve(3, 1.3)
+    cases = [
+        (line, lambda s: s * line.c),
+        (u_curve, lambda s: baseline_u_curve(u_curve, s)),
+    ]
+    for curve, point_curve in cases:
+        for spring_length, multiplier in ((0.1, 1), (0.1, 1.1), (0.07, 0.93), (0.013, 1)):
+            rope = create_rope(curve, spring_length, multiplier)
+            expected = baseline_node_positions(curve, point_curve, spring_length, multiplier)
+            assert np.array_equal(rope.state.pos, expected)
+
+def test_parametric_curve_nodes_are_equally_spaced():
+    # On y = sin(x) the parameter is the x coordinate, so the arc length between nodes is known.
+    curve = ParametricCurve(lambda t: np.stack((t, np.sin(t)), axis=-1), 0, 2*np.pi)
+    def arc_length(x0: float, x1: float):
+        return quad(lambda t: np.sqrt(1 + np.cos(t)**2), x0, x1, epsabs=1e-13)[0]
+
+    assert abs(curve.length - arc_length(0, 2*np.pi)) < 1e-7
+    rope = create_rope(curve, 0.1)
+    pos = rope.state.pos
+    assert np.allclose(pos[:, 1], np.sin(pos[:, 0]), rtol=0, atol=1e-12)
+    spacing = [arc_length(pos[i, 0], pos[i + 1, 0]) for i in range(rope.num_points - 2)]
+    assert np.allclose(spacing, 0.1, rtol=0, atol=1e-7)
+    assert np.array_equal(pos[-1], [2*np.pi, np.sin(2*np.pi)])
@@ -0,0 +1,156 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from config import ImplicitConfig
+from constant import G
+from rope_elements import Point
+from solver import Solver, Integrator, IntegratorStats
+from tests.ropes import make_simulation
+
+def baseline_update(solver: Solver):
+    '''
+    RK4 step of the original solver, node by node with `Solver.point_acceleration`.
+    '''
+    points: list[Point] = [solver.points[i] for i in range(solver.num_points)]
+    pos_old = np.array([p.pos for p in points])
+    vel_old = np.array([p.vel for p in points])
+    k_pos = np.zeros((4, solver.num_points, 2))
+    k_vel = np.zeros((4, solver.num_points, 2))
+
+    for k_id, q in enumerate((1/2, 1/2, 1, None)):
+        for id, p in enumerate(points):
+            accel = solver.point_acceleration(p, update_tensions=(k_id == 0), id=id)
+            if not p.fix:
+                k_pos[k_id, id] = p.vel
+                k_vel[k_id, id] = accel
+
+        if q is None:
+            break
+        for id, p in enumerate(points):
+            if not p.fix:
+                p.pos = pos_old[id] + q * solver.dt * k_pos[k_id, id]
+                p.vel = vel_old[id] + q * solver.dt * k_vel[k_id, id]
+
+    for id, p in enumerate(points):
+        if not p.fix:
+            p.pos = pos_old[id] + solver.dt/6 * (k_pos[0, id] + 2*(k_pos[1, id] + k_pos[2, id]) + k_pos[3, id])
+            p.vel = vel_old[id] + solver.dt/6 * (k_vel[0, id] + 2*(k_vel[1, id] + k_vel[2, id]) + k_vel[3, id])
+    solver.time += solver.dt
+
+def test_rk4_matches_baseline():
+    sim, ref = make_simulation(), make_simulation()
+    for _ in range(100):
+        sim.solver.update()
+        baseline_update(ref.solver)
+
+    st, ref_st = sim.solver.state, ref.solver.state
+    scale = np.abs(ref_st.pos).max()
+    assert np.abs(st.pos - ref_st.pos).max() <= 1e-12 * scale
+    assert np.abs(st.vel - ref_st.vel).max() <= 1e-9 * np.abs(ref_st.vel).max()
+    assert np.allclose(sim.solver.tensions, ref.solver.tensions, rtol=1e-9)
+    assert sim.solver.time == ref.solver.time
+
+def test_integrator_stats_history_is_bounded():
+    stats = IntegratorStats()
+    for i in range(10):
+        stats.add_step(i, 0.1 * i)
+    assert stats.accepted == 10 and stats.last_dt == 0.9
+    assert stats.step_sizes.size == 0
+
+    stats = IntegratorStats(history=3)
+    for i in range(10):
+        stats.add_step(i, 0.1 * i)
+    assert np.array_equal(stats.step_times, [7, 8, 9])
+    assert np.allclose(stats.step_sizes, [0.7, 0.8, 0.9])
+
+def test_dopri5_reuses_last_stage():
+    sim = make_simulation(integrator=Integrator.dopri5, dt=0.01)
+    solver = sim.solver
+    forces = solver.forces
+    num_evaluations = 0
+    def counted_forces(*args, **kwargs):
+        nonlocal num_evaluations
+        num_evaluations += 1
+        forces(*args, **kwargs)
+    solver.forces = counted_forces
+
+    for _ in range(50):
+        solver.update()
+    stats = solver.stats
+    assert num_evaluations == 1 + 6 * (stats.accepted + stats.rejected)
+
+    # The reused stage is the acceleration at the current state.
+    accel = np.zeros_like(solver.state.pos)
+    solver.acceleration(solver.state.pos, solver.state.vel, accel)
+    assert np.array_equal(solver.last_accel, accel)
+
+def test_backward_euler_large_steps_reach_equilibrium():
+    # Steel rope, far too stiff for explicit integrators with these time steps.
+    for dt in (0.05, 0.1):
+        solver = make_simulation(spring_length=0.05, dt=dt, integrator=Integrator.backward_euler, multiplier=1, 
+            elastic_constant=2e11).solver
+        eq = solver.equilibrium(update_state=False)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            while solver.time < 20:
+                solver.update()
+        assert solver.stats.rejected > 0
+        assert np.abs(solver.state.pos - eq.pos).max() < 1e-9
+
+def test_backward_euler_warns_when_newton_fails():
+    solver = make_simulation(spring_length=0.05, dt=0.1, integrator=Integrator.backward_euler, multiplier=1, elastic_constant=2e11, 
+        integrator_cfg=ImplicitConfig(max_halvings=0)).solver
+    with pytest.warns(UserWarning, match="não convergiu"):
+        solver.update()
+    assert solver.stats.accepted == 1 and solver.stats.rejected == 0
+
+def test_equilibrium():
+    sim = make_simulation(integrator=Integrator.backward_euler, dt=0.5, damping=0.01)
+    solver = sim.solver
+    total_weight = G * solver.state.mass.sum()
+
+    eq = solver.equilibrium(update_state=False)
+    assert eq.converged
+    assert eq.residual < 1e-10 * total_weight
+
+    # Time integration until the rope is at rest.
+    while solver.time < 50:
+        solver.update()
+    assert abs(solver.state.pos[:, 1].min() - eq.pos[:, 1].min()) < 1e-12
+    assert np.abs(solver.state.pos - eq.pos).max() < 1e-12
+
+    solver.equilibrium()
+    d = solver.diagnostics()
+    assert np.array_equal(d.reaction_ids, eq.reaction_ids)
+    assert np.allclose(d.reactions, eq.reactions, rtol=0, atol=1e-12 * total_weight)
+    assert np.allclose(eq.reactions.sum(axis=0), [0, total_weight], rtol=1e-12)
+
+def test_verlet_energy_is_bounded():
+    # Small oscillations of an undamped rope around its equilibrium.
+    solver = make_simulation(spring_length=0.2, integrator=Integrator.verlet, damping=0).solver
+    st = solver.state
+    solver.equilibrium()
+    free = ~st.fix
+    st.vel[free] = 0.1 * np.random.default_rng(0).normal(size=st.vel.shape)[free]
+    solver.reset_integrator()
+
+    # Half of the stability limit 2/w of the fastest mode.
+    solver.dt = 1 / (2 * np.sqrt(st.k.max() / st.mass[free].min()))
+
+    def energy():
+        d = solver.diagnostics()
+        return d.kinetic_energy + d.elastic_energy + d.potential_energy
+    kinetic = solver.diagnostics().kinetic_energy
+    energies = []
+    for i in range(20000):
+        if i % 10 == 0:
+            energies.append(energy())
+        solver.update()
+
+    # The error oscillates, without drifting or growing.
+    error = np.array(energies).reshape(4, -1) - energies[0]
+    assert np.abs(error).max() < 0.1 * kinetic
+    assert abs(error[-1].mean() - error[0].mean()) < 1e-3 * kinetic
+    assert np.abs(error[-1]).max() < 1.5 * np.abs(error[0]).max()
@@ -0,0 +1,46 @@
+import numpy as np
+
+from config import SteadyStateConfig
+from steady_state import SteadyStateDetector
+from tests.ropes import make_simulation
+
+def test_rope_settles_at_equilibrium():
+    sim = make_simulation(spring_length=0.4, dt=0.01, damping=0.5)
+    cfg = SteadyStateConfig(max_speed=1e-3, net_force=1e-2, tension_change=1e-2, window=0.5)
+    result = sim.run_headless(until_time=200, steady_state=cfg)
+    assert result.settled
+
+    equilibrium = sim.solver.equilibrium(update_state=False)
+    assert np.abs(result.pos - equilibrium.pos).max() < 1e-2
+
+def test_zero_tensions_can_settle():
+    sim = make_simulation()
+    st = sim.solver.state
+    st.fix[:] = True
+    st.k[:] = 0
+
+    detector = SteadyStateDetector(SteadyStateConfig(window=0.1))
+    sim.solver.add_monitor(detector)
+    for _ in range(50):
+        sim.solver.update()
+    assert detector.tension_change == 0
+    assert detector.settled
+
+def test_failing_net_force_is_checked_once_per_window():
+    sim = make_simulation(dt=0.01)
+    solver = sim.solver
+    diagnostics = solver.diagnostics
+    num_calls = 0
+    def counted_diagnostics():
+        nonlocal num_calls
+        num_calls += 1
+        return diagnostics()
+    solver.diagnostics = counted_diagnostics
+
+    # Only the net force can fail.
+    detector = SteadyStateDetector(SteadyStateConfig(max_speed=None, tension_change=None, net_force=1e-12, window=0.5))
+    solver.add_monitor(detector)
+    for _ in range(200):
+        solver.update()
+    assert not detector.settled
+    assert num_calls <= 200 * solver.dt / 0.5 + 1
@@ -0,0 +1,38 @@
+import os
+
+from sweep import Sweep, SweepConfig, CaseStatus, line_case, grid
+
+def logging_case(params: dict):
+    '''
+    `line_case` that writes the id of the process running the case to the directory `params["log_dir"]`.
+    '''
+    with open(os.path.join(params["log_dir"], f"{params['case']}.pid"), "w") as f:
+        f.write(str(os.getpid()))
+    return line_case(params)
+
+def test_sweep_uses_at_most_workers_processes(tmp_path):
+    log_dir = tmp_path / "pids"
+    log_dir.mkdir()
+    cases = grid(case=list(range(8)), log_dir=[str(log_dir)])
+    cfg = SweepConfig(max_time=0.5, check_every=10)
+    rows = Sweep(cases, cfg, case_builder=logging_case, workers=2).run(str(tmp_path / "sweep.csv"))
+
+    assert [row["status"] for row in rows] == [CaseStatus.max_time] * 8
+    pids = {path.read_text() for path in log_dir.iterdir()}
+    assert len(list(log_dir.iterdir())) == 8
+    # The pool keeps its processes, so more ids would mean more processes alive at once.
+    assert len(pids) <= 2
+
+def crashing_case(params: dict):
+    '''
+    `line_case` whose process dies when `params["crash"]` is set.
+    '''
+    if params["crash"]:
+        os._exit(1)
+    return line_case(params)
+
+def test_sweep_reruns_cases_of_a_broken_pool(tmp_path):
+    cases = grid(crash=[0, 0, 1, 0, 0])
+    cfg = SweepConfig(max_time=0.5, check_every=10)
+    rows = Sweep(cases, cfg, case_builder=crashing_case, workers=2).run(str(tmp_path / "sweep.csv"))
+    assert [row["status"] for row in rows] == [CaseStatus.max_time] * 2 + [CaseStatus.failed] + [CaseStatus.max_time] * 2
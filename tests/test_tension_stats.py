@@ -0,0 +1,55 @@
+import numpy as np
+
+from solver import Integrator
+from tension_stats import TensionStatistics
+from tests.ropes import make_simulation
+
+def samples(num_samples: int = 500, num_points: int = 4, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_samples) * 0.01
+    tensions = 100 + np.sin(t[:, None] * np.arange(1, num_points + 1)) * np.arange(1, num_points + 1)
+    tensions += 0.01 * rng.normal(size=tensions.shape)
+    weights = rng.uniform(0.5, 1.5, num_samples)
+    return tensions, weights
+
+def test_welford_matches_one_pass():
+    tensions, weights = samples()
+    stats = TensionStatistics()
+    for row, weight in zip(tensions, weights):
+        stats.add_sample(row, weight)
+
+    mean = np.average(tensions, axis=0, weights=weights)
+    variance = np.average((tensions - mean)**2, axis=0, weights=weights)
+    assert np.allclose(stats.mean, mean, rtol=1e-12)
+    assert np.allclose(stats.variance, variance, rtol=1e-9)
+    assert np.array_equal(stats.max, tensions.max(axis=0))
+    assert np.array_equal(stats.min, tensions.min(axis=0))
+    assert np.isclose(stats.total_weight, weights.sum())
+
+def test_merge_matches_one_pass(tmp_path):
+    tensions, weights = samples()
+    bins = np.linspace(0, 10, 11)
+    full = TensionStatistics(range_bins=bins, threshold=0.05)
+    first = TensionStatistics(range_bins=bins, threshold=0.05)
+    second = TensionStatistics(range_bins=bins, threshold=0.05)
+    for id, (row, weight) in enumerate(zip(tensions, weights)):
+        full.add_sample(row, weight)
+        (first if id < 200 else second).add_sample(row, weight)
+
+    first.merge(second)
+    assert np.allclose(first.mean, full.mean, rtol=1e-12)
+    assert np.allclose(first.variance, full.variance, rtol=1e-9)
+    assert np.array_equal(first.max, full.max)
+    assert first.num_samples == full.num_samples
+
+    full.save(str(tmp_path / "stats.npz"))
+    loaded = TensionStatistics.load(str(tmp_path / "stats.npz"))
+    for name in ("mean", "m2", "max", "min", "half_cycles"):
+        assert np.array_equal(getattr(loaded, name), getattr(full, name))
+
+def test_sample_weights_cover_adaptive_steps():
+    sim = make_simulation(integrator=Integrator.dopri5, dt=0.01)
+    stats = TensionStatistics(every=3)
+    sim.solver.add_monitor(stats)
+    sim.run_headless(num_steps=30)
+    assert np.isclose(stats.total_weight, sim.solver.time)
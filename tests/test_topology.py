@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from rope_elements import RopeState
+from solver import Solver, ForceWorkspace, Integrator, Backend, spring_chain_forces, force_backends, verify_backend
+from topology import Topology, spring_network_forces
+
+def random_chain(num_points: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    pos = np.cumsum(rng.uniform(0.5, 1, (num_points, 2)), axis=0)
+    vel = rng.normal(size=(num_points, 2))
+    k = rng.uniform(1, 100, num_points - 1)
+    rest_length = rng.uniform(0.5, 1.5, num_points - 1)
+    damping = rng.uniform(0, 1, num_points)
+    mass = rng.uniform(0.1, 1, num_points)
+    external = rng.normal(size=(num_points, 2))
+    return pos, vel, k, rest_length, damping, mass, external
+
+def test_network_kernel_matches_chain_kernel():
+    num_points = 200
+    pos, vel, k, rest_length, damping, mass, external = random_chain(num_points)
+    topology = Topology.chain(num_points)
+
+    out, tensions = np.zeros((num_points, 2)), np.zeros(num_points)
+    spring_chain_forces(pos, vel, k, rest_length, damping, mass, ForceWorkspace(num_points), out, tensions, external)
+    net_out, net_tensions = np.zeros((num_points, 2)), np.zeros(num_points)
+    spring_network_forces(pos, vel, topology, k, rest_length, damping, mass, ForceWorkspace(num_points, topology=topology),
+        net_out, net_tensions, external)
+
+    assert np.allclose(net_out, out, rtol=0, atol=1e-12 * np.abs(out).max())
+    assert np.array_equal(net_tensions, tensions)
+
+def test_network_solver_matches_chain_solver():
+    num_points = 30
+    chain = RopeState(num_points)
+    chain.pos[:, 0] = np.linspace(0, 3, num_points)
+    chain.mass[:] = 0.1
+    chain.damping[:] = 0.05
+    chain.k[:] = 1e3
+    chain.rest_length[:] = 0.09
+    chain.fix[[0, -1]] = True
+
+    network = chain.copy()
+    network.topology = Topology.chain(num_points)
+
+    for integrator in (Integrator.rk4, Integrator.verlet):
+        chain_solver = Solver.from_state(chain.copy(), 1e-3, integrator)
+        network_solver = Solver.from_state(network.copy(), 1e-3, integrator)
+        for _ in range(100):
+            chain_solver.update()
+            network_solver.update()
+        assert np.allclose(network_solver.state.pos, chain_solver.state.pos, rtol=0, atol=1e-12)
+        assert np.allclose(network_solver.tensions, chain_solver.tensions, rtol=1e-9)
+
+@pytest.mark.skipif(Backend.numba not in force_backends, reason="Numba não está instalado.")
+def test_numba_backend_matches_numpy():
+    assert verify_backend(Backend.numba) == 0
+
+@pytest.mark.skipif(Backend.numba not in force_backends, reason="Numba não está instalado.")
+def test_numba_network_solver_matches_numpy():
+    topology = Topology.grid(6, 7)
+    state = RopeState(42, topology)
+    state.pos[:] = np.stack(np.meshgrid(np.arange(7.0), -np.arange(6.0)), axis=-1).reshape(-1, 2)
+    state.k[:] = np.linspace(100, 300, topology.num_edges)
+    state.rest_length[:] = 0.9
+    state.mass[:] = 0.1
+    state.damping[:] = 0.05
+    state.fix[:7] = True
+
+    for integrator in (Integrator.rk4, Integrator.verlet):
+        numpy_solver = Solver.from_state(state.copy(), 1e-3, integrator)
+        numba_solver = Solver.from_state(state.copy(), 1e-3, integrator, backend=Backend.numba)
+        for _ in range(100):
+            numpy_solver.update()
+            numba_solver.update()
+        assert np.array_equal(numba_solver.state.pos, numpy_solver.state.pos)
+        assert np.array_equal(numba_solver.state.vel, numpy_solver.state.vel)
+        assert np.array_equal(numba_solver.tensions, numpy_solver.tensions)
+
+def test_grid_adjacency():
+    topology = Topology.grid(3, 4)
+    assert topology.num_edges == 3*3 + 2*4
+    assert sorted(topology.node_neighbors(5)) == [1, 4, 6, 9]
+    assert np.array_equal(topology.degree, np.bincount(topology.edges.ravel(), minlength=12))
+
+    colors = topology.spring_colors()
+    for c in np.unique(colors):
+        nodes = topology.edges[colors == c].ravel()
+        assert nodes.size == np.unique(nodes).size
@@ -0,0 +1,41 @@
+import time
+
+import numpy as np
+import pytest
+
+from worker import PhysicsWorker, WorkerMode
+from tests.ropes import make_simulation
+
+def wait_for(condition, timeout: float = 10):
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError()
+        time.sleep(0.01)
+
+@pytest.mark.parametrize("mode", [WorkerMode.thread, WorkerMode.process])
+def test_worker_publishes_states(mode):
+    solver = make_simulation().solver
+    pos = solver.state.pos.copy()
+    worker = PhysicsWorker(solver, mode)
+    worker.start()
+    try:
+        wait_for(lambda: worker.read() and worker.step > 0)
+    finally:
+        worker.stop()
+    assert solver.time > 0
+    assert not np.array_equal(solver.state.pos, pos)
+
+@pytest.mark.parametrize("mode", [WorkerMode.thread, WorkerMode.process])
+def test_worker_exception_is_raised_by_read(mode):
+    solver = make_simulation().solver
+    solver.integrator = -1 # There is no stepper, so the first step raises `KeyError`.
+    worker = PhysicsWorker(solver, mode)
+    worker.start()
+    try:
+        wait_for(lambda: worker.buffer.failed)
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="KeyError"):
+                worker.read()
+    finally:
+        worker.stop()
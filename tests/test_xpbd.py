@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from config import XPBDConfig, ConstraintMethod
+from solver import Integrator
+from tests.ropes import make_simulation
+
+@pytest.mark.parametrize("method", [ConstraintMethod.gauss_seidel, ConstraintMethod.jacobi])
+def test_xpbd_settles_at_equilibrium(method):
+    solver = make_simulation(spring_length=0.2, dt=1/60, integrator=Integrator.xpbd, integrator_cfg=XPBDConfig(method=method)).solver
+    eq = solver.equilibrium(update_state=False)
+
+    max_error = 0
+    while solver.time < 20:
+        solver.update()
+        max_error = max(max_error, solver.constraint_error)
+    assert max_error < 1e-4
+
+    sag, eq_sag = -solver.state.pos[:, 1].min(), -eq.pos[:, 1].min()
+    assert abs(sag - eq_sag) < 1e-4 * eq_sag
+    assert np.abs(solver.state.pos - eq.pos).max() < 1e-3
@@ -1,30 +1,188 @@
+'''
+Hierarchical profiler of the simulation hot path.
+
+Code is instrumented with named sections, which can be nested:
+
+    with profiler.section("solver.update"):
+        with profiler.section("forces"):
+            ...
+
+Each section keeps the last `num_samples` durations (ring buffer, in nanoseconds from
+`time.perf_counter_ns`), from which the percentiles are computed. A section is identified by its
+name and the section it is nested in, so the same name in different places gives different entries.
+
+When the profiler is disabled, `section` returns a shared object whose `__enter__`/`__exit__`
+do nothing, so instrumentation costs only a method call. The module profiler (`profiler`) is
+disabled by default, it can be enabled by setting `profiler.enabled = True` or the environment
+variable `ROPE_PROFILE=1`.
+
+A profiler is not thread safe: the running section (`Profiler.current`) is shared, so each
+profiler must only be used from one thread. Code running in other threads (e.g. `worker.py`)
+uses its own `Profiler`.
+'''
 import numpy as np
-import time
+import json
+import os
+from time import perf_counter_ns
 
-class TimeIt:
-    def __init__(self, num_samples: int = 100) -> None:
-        self.num_samples = num_samples
-        self.times = np.zeros(num_samples)
-    
-        self.count = 0
-        self.is_full = False
+PERCENTILES = (50, 95, 99)
+
+class Section:
+    '''
+    Timed section of code, used as a context manager.
+    '''
+    def __init__(self, profiler: "Profiler", name: str, parent: "Section", num_samples: int) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.parent = parent
+        self.children: dict[str, Section] = {}
+
+        self.samples = np.zeros(num_samples, dtype=np.int64)
+        self.count = 0 # Total number of samples recorded, including the overwritten ones.
+        self.start = 0
 
-    def decorator(self, func: callable):
-        t1 = time.time()
-        func()
-        t2 = time.time()
+    def __enter__(self):
+        self.profiler.current = self
+        self.start = perf_counter_ns()
+        return self
 
-        self.times[self.count] = (t2 - t1)*1000
+    def __exit__(self, *exc):
+        self.record(perf_counter_ns() - self.start)
+        self.profiler.current = self.parent
+
+    def record(self, duration: int):
+        '''
+        Adds a sample with the given duration (ns).
+        '''
+        self.samples[self.count % self.samples.size] = duration
         self.count += 1
-        if self.count == self.num_samples:
-            self.is_full = True
-            self.count = 0
-
-    def mean_time(self):
-        if self.is_full:
-            return self.times.mean()
-        else:
-            if self.count == 0:
-                return 0
-            else:
-                return self.times.sum() / self.count
\ No newline at end of file
+
+    def valid_samples(self):
+        return self.samples[:min(self.count, self.samples.size)]
+
+    def stats(self) -> dict:
+        '''
+        Statistics of the samples in the ring buffer, times in milliseconds.
+        '''
+        samples = self.valid_samples()
+        stats = {"count": self.count}
+        if samples.size == 0:
+            return stats
+
+        samples = samples * 1e-6
+        stats["mean_ms"] = float(samples.mean())
+        for p, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+            stats[f"p{p}_ms"] = float(value)
+        stats["max_ms"] = float(samples.max())
+        return stats
+
+    def to_dict(self) -> dict:
+        d = self.stats()
+        if self.children:
+            d["children"] = {name: child.to_dict() for name, child in self.children.items()}
+        return d
+
+class NullSection:
+    '''
+    Section of a disabled profiler, does nothing.
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def record(self, duration: int):
+        pass
+
+NULL_SECTION = NullSection()
+
+class Profiler:
+    '''
+    Tree of timed sections. It must only be used from one thread (see the module documentation).
+    '''
+    def __init__(self, num_samples: int = 200, enabled=True) -> None:
+        '''
+        Parameters:
+        -----------
+        num_samples:
+            Number of samples kept by each section.
+
+        enabled:
+            If `False`, sections are not timed.
+        '''
+        self.num_samples = num_samples
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        '''
+        Removes all sections.
+        '''
+        self.root = Section(self, "root", None, 0)
+        self.current = self.root
+
+    def section(self, name: str):
+        '''
+        Section `name` nested in the section currently running.
+        '''
+        if not self.enabled:
+            return NULL_SECTION
+
+        current = self.current
+        try:
+            return current.children[name]
+        except KeyError:
+            child = Section(self, name, current, self.num_samples)
+            current.children[name] = child
+            return child
+
+    def wrap(self, name: str, func: callable):
+        '''
+        `func` timed as the section `name`.
+        '''
+        def wrapped(*args, **kwargs):
+            with self.section(name):
+                return func(*args, **kwargs)
+        return wrapped
+
+    def find(self, path: str) -> Section:
+        '''
+        Section given by its path, the names of the nested sections separated by "/"
+        (e.g. "frame/solver.update"). Returns `None` if it doesn't exist.
+        '''
+        section = self.root
+        for name in path.split("/"):
+            section = section.children.get(name)
+            if section is None:
+                return None
+        return section
+
+    def to_dict(self) -> dict:
+        return {name: child.to_dict() for name, child in self.root.children.items()}
+
+    def dump(self, path: str):
+        '''
+        Saves the statistics of all sections as JSON.
+        '''
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self, max_depth: int = None) -> str:
+        '''
+        Statistics of the sections as text, one line per section, indented by its depth.
+        '''
+        lines = []
+        def add_lines(section: Section, depth: int):
+            if max_depth is not None and depth >= max_depth:
+                return
+            for child in section.children.values():
+                stats = child.stats()
+                if "mean_ms" in stats:
+                    percentiles = " ".join(f"p{p} {stats[f'p{p}_ms']:.3f}" for p in PERCENTILES)
+                    lines.append(f"{'  '*depth}{child.name}: {percentiles} ms")
+                add_lines(child, depth + 1)
+        add_lines(self.root, 0)
+        return "\n".join(lines)
+
+profiler = Profiler(enabled=os.environ.get("ROPE_PROFILE", "0") == "1")
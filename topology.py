@@ -0,0 +1,204 @@
+'''
+Topology of spring networks, where any pair of nodes can be linked by a spring.
+
+A `RopeState` without a topology is a chain: node `i` is linked to node `i+1` by spring `i`.
+With a `Topology`, spring `e` links the nodes `edges[e, 0]` and `edges[e, 1]`, which models
+nets, stays or ropes joined at a shared node. The springs are stored as edge index arrays, and
+the springs attached to each node as a CSR adjacency (see `Topology`).
+
+Forces are computed per spring and then scatter-added to the nodes, in a single pass over
+all springs, so the cost per spring does not depend on the network shape.
+'''
+import numpy as np
+import scipy.sparse as sparse
+
+from constant import G
+
+# Maximum number of springs per node handled by `Topology.spring_slots`.
+MAX_SLOTS = 8
+
+class Topology:
+    '''
+    Springs of a network with `num_points` nodes, given by the node pairs in `edges`.
+
+    Attributes:
+    -----------
+    edges:
+        Array with shape (E, 2), spring `e` links `edges[e, 0]` (its first node) to `edges[e, 1]`
+        (its second node).
+
+    offsets, incident_springs, neighbors:
+        CSR adjacency. The springs attached to node `i` are `incident_springs[offsets[i]:offsets[i+1]]`
+        and the nodes at the other end of them are `neighbors[offsets[i]:offsets[i+1]]`.
+
+    gather, scatter:
+        Sparse incidence matrices. `gather @ pos` are the spring vectors (second node minus first node)
+        and `scatter @ f` adds the force `f[e]` to the first node of spring `e` and subtracts it from the second one.
+
+    spring_slots, hubs, hub_springs, hub_offsets:
+        Springs of each node in a padded (ELL) layout, used by `node_max`. `spring_slots[j, i]` is the
+        `j`-th spring of node `i` (repeated if the node has less springs). Nodes with more than `MAX_SLOTS`
+        springs (`hubs`) have the remaining springs in `hub_springs`, starting at `hub_offsets`.
+    '''
+    def __init__(self, num_points: int, edges: np.ndarray) -> None:
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        if edges.size > 0 and (edges.min() < 0 or edges.max() >= num_points):
+            raise ValueError(f"As molas devem ligar nós entre 0 e {num_points - 1}.")
+        if np.any(edges[:, 0] == edges[:, 1]):
+            raise ValueError("Uma mola não pode ligar um nó a ele mesmo.")
+
+        self.num_points = num_points
+        self.num_edges = edges.shape[0]
+        self.edges = edges
+        self.first = np.ascontiguousarray(edges[:, 0])
+        self.second = np.ascontiguousarray(edges[:, 1])
+
+        spring_ids = np.arange(self.num_edges)
+        ends = np.concatenate([self.first, self.second])
+        order = np.argsort(ends, kind="stable")
+
+        self.degree = np.bincount(ends, minlength=num_points)
+        self.offsets = np.zeros(num_points + 1, dtype=np.int64)
+        np.cumsum(self.degree, out=self.offsets[1:])
+        self.incident_springs = np.concatenate([spring_ids, spring_ids])[order]
+        self.neighbors = np.concatenate([self.second, self.first])[order]
+
+        self.isolated = np.flatnonzero(self.degree == 0)
+
+        num_slots = min(int(self.degree.max(initial=0)), MAX_SLOTS)
+        slot = np.minimum(np.arange(num_slots)[:, None], np.maximum(self.degree - 1, 0))
+        self.spring_slots = np.zeros((num_slots, num_points), dtype=np.int64)
+        if self.num_edges > 0:
+            self.spring_slots[:] = self.incident_springs[np.minimum(self.offsets[:-1] + slot, 2*self.num_edges - 1)]
+        
+        self.hubs = np.flatnonzero(self.degree > MAX_SLOTS)
+        hub_ranges = [self.incident_springs[self.offsets[i] + MAX_SLOTS:self.offsets[i+1]] for i in self.hubs]
+        self.hub_springs = np.concatenate([np.zeros(0, dtype=np.int64), *hub_ranges])
+        self.hub_offsets = np.zeros(self.hubs.size, dtype=np.int64)
+        np.cumsum([r.size for r in hub_ranges[:-1]], out=self.hub_offsets[1:])
+
+        rows = np.concatenate([spring_ids, spring_ids])
+        signs = np.concatenate([-np.ones(self.num_edges), np.ones(self.num_edges)])
+        self.gather = sparse.csr_matrix((signs, (rows, ends)), shape=(self.num_edges, num_points))
+        self.scatter = (-self.gather).T.tocsr()
+
+        # Color of each spring, see `spring_colors`.
+        self.colors: np.ndarray = None
+
+    @staticmethod
+    def chain(num_points: int) -> "Topology":
+        '''
+        Chain where node `i` is linked to node `i+1` by spring `i`, the topology of a rope.
+        '''
+        ids = np.arange(max(num_points - 1, 0))
+        return Topology(num_points, np.stack([ids, ids + 1], axis=1))
+
+    @staticmethod
+    def grid(rows: int, cols: int) -> "Topology":
+        '''
+        Net with `rows` x `cols` nodes, where node `r*cols + c` is linked to its neighbors in
+        the same row and column. Springs along the rows come first.
+        '''
+        ids = np.arange(rows * cols).reshape(rows, cols)
+        row_edges = np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1)
+        col_edges = np.stack([ids[:-1].ravel(), ids[1:].ravel()], axis=1)
+        return Topology(rows * cols, np.concatenate([row_edges, col_edges]))
+
+    def is_chain(self) -> bool:
+        '''
+        `True` if this is the topology of a rope (see `Topology.chain`).
+        '''
+        ids = np.arange(self.num_edges)
+        return self.num_edges == max(self.num_points - 1, 0) and \
+            np.array_equal(self.first, ids) and np.array_equal(self.second, ids + 1)
+
+    def spring_colors(self) -> np.ndarray:
+        '''
+        Color of each spring, such that springs with the same color share no node (an edge coloring).
+        Springs with the same color can be processed at the same time by Gauss–Seidel like methods.
+
+        Chains are colored alternately with two colors, other networks greedily (in the springs order),
+        with at most `2*max_degree - 1` colors. The colors are computed only once.
+        '''
+        if self.colors is not None:
+            return self.colors
+
+        if self.is_chain():
+            self.colors = np.arange(self.num_edges) % 2
+            return self.colors
+
+        # Bit `c` of `used[i]` is set if node `i` has a spring with color `c`.
+        used = [0] * self.num_points
+        colors = [0] * self.num_edges
+        for e, (a, b) in enumerate(self.edges.tolist()):
+            mask = used[a] | used[b]
+            color_bit = ~mask & (mask + 1)
+            colors[e] = color_bit.bit_length() - 1
+            used[a] |= color_bit
+            used[b] |= color_bit
+        
+        self.colors = np.array(colors, dtype=np.int64)
+        return self.colors
+
+    def node_springs(self, id: int) -> np.ndarray:
+        return self.incident_springs[self.offsets[id]:self.offsets[id+1]]
+
+    def node_neighbors(self, id: int) -> np.ndarray:
+        return self.neighbors[self.offsets[id]:self.offsets[id+1]]
+
+    def spring_vectors(self, pos: np.ndarray) -> np.ndarray:
+        '''
+        Vector from the first to the second node of every spring, for node positions `pos`.
+        '''
+        return self.gather @ pos
+
+    def node_max(self, values: np.ndarray, out: np.ndarray, work):
+        '''
+        Biggest value in `values` (one per spring) among the springs of each node, written to `out`.
+        Nodes without springs get zero. `work` is a `solver.ForceWorkspace` of this topology.
+        '''
+        if self.spring_slots.shape[0] == 0:
+            out.fill(0)
+            return
+
+        np.take(values, self.spring_slots[0], out=out)
+        for slot in self.spring_slots[1:]:
+            np.take(values, slot, out=work.node_values)
+            np.maximum(out, work.node_values, out=out)
+
+        if self.hubs.size > 0:
+            np.take(values, self.hub_springs, out=work.hub_values)
+            out[self.hubs] = np.maximum(out[self.hubs], np.maximum.reduceat(work.hub_values, self.hub_offsets))
+        out[self.isolated] = 0
+
+def spring_network_forces(pos: np.ndarray, vel: np.ndarray, topology: Topology, k: np.ndarray, rest_length: np.ndarray,
+    damping: np.ndarray, mass: np.ndarray, work, out: np.ndarray, tensions: np.ndarray = None, external: np.ndarray = None):
+    '''
+    Same as `solver.spring_chain_forces`, for springs linking the nodes given by `topology`
+    (without batching). Spring arrays have shape (E,) and `work` is a `ForceWorkspace` created
+    with `topology`.
+
+    This is the reference implementation of the network force kernels, see `solver.network_force_backends`.
+    '''
+    vec = topology.spring_vectors(pos)
+    length = np.hypot(vec[:, 0], vec[:, 1], out=work.spring_len)
+
+    # Spring force intensity (positive when stretched)
+    force = np.subtract(length, rest_length, out=work.spring_force)
+    force *= k
+
+    if tensions is not None:
+        force_abs = np.abs(force, out=work.spring_force_abs)
+        topology.node_max(force_abs, tensions, work)
+
+    # Spring force on the first node of each spring (the second one receives the opposite).
+    np.divide(force, length, out=length)
+    vec *= length[:, None]
+
+    np.multiply(vel, damping[:, None], out=out)
+    np.negative(out, out=out)
+    out += topology.scatter @ vec
+    out[:, 1] -= G * mass
+
+    if external is not None:
+        out += external
@@ -0,0 +1,275 @@
+'''
+Physics running in background, decoupled from the rendering.
+
+The worker steps its own copy of the solver as fast as possible and publishes the rope state
+into a double buffer (two slots), which is in shared memory when the worker is a process. The
+reader (the GUI) copies the newest complete slot whenever it needs a frame.
+
+Each slot is guarded by a sequence number (seqlock): the writer makes it odd before writing
+and even after, so a reader that sees the same even number before and after copying has a
+consistent frame. The writer always writes the slot that is not the newest one.
+
+If the physics raises an exception, the worker stops, sets the `failed` flag of the buffer and sends
+the traceback through a queue. The next `PhysicsWorker.read` raises it in the reader.
+'''
+import numpy as np
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+
+from solver import Solver
+from recorder import frame_dtype
+from timer import Profiler
+
+class WorkerMode:
+    '''
+    Where the physics runs.
+    '''
+    process = "process" # Separate process, physics never competes with the GUI for the GIL.
+    thread = "thread" # Only worth it for big ropes, where NumPy releases the GIL most of the time.
+
+HEADER_DTYPE = np.dtype([
+    ("latest", "<i8"), # Slot with the newest frame, -1 if nothing was published yet.
+    ("seq", "<i8", (2,)), # Sequence number of each slot, odd while it's being written.
+    ("stop", "<i8"),
+    ("step_time", "<f8"), # Mean wall time of a step (s) since the last publication.
+    ("failed", "<i8"), # 1 if the physics raised an exception, sent through the errors queue.
+])
+
+class StateBuffer:
+    '''
+    Double buffer of frames (see `recorder.frame_dtype`), on top of `buffer`.
+    '''
+    def __init__(self, buffer, num_points: int) -> None:
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=buffer)
+        self.slots = np.ndarray((2,), dtype=frame_dtype(num_points), buffer=buffer, offset=HEADER_DTYPE.itemsize)
+
+    @staticmethod
+    def size(num_points: int):
+        return HEADER_DTYPE.itemsize + 2 * frame_dtype(num_points).itemsize
+
+    def init(self):
+        self.header["latest"] = -1
+        self.header["seq"] = 0
+        self.header["stop"] = 0
+        self.header["step_time"] = 0
+        self.header["failed"] = 0
+
+    @property
+    def stopped(self):
+        return bool(self.header["stop"])
+
+    @property
+    def failed(self):
+        return bool(self.header["failed"])
+
+    def write(self, solver: Solver, step: int):
+        header = self.header
+        slot_id = 1 - header["latest"] if header["latest"] >= 0 else 0
+
+        header["seq"][slot_id] += 1
+        slot = self.slots[slot_id]
+        slot["step"] = step
+        slot["time"] = solver.time
+        slot["pos"] = solver.state.pos
+        slot["vel"] = solver.state.vel
+        slot["tensions"] = solver.tensions
+        header["seq"][slot_id] += 1
+
+        header["latest"] = slot_id
+
+    def read(self, out: np.ndarray) -> bool:
+        '''
+        Copies the newest frame to `out` (an array with the frame data type). Returns `False`
+        if there is no frame yet.
+        '''
+        header = self.header
+        while True:
+            slot_id = int(header["latest"])
+            if slot_id < 0:
+                return False
+
+            seq = int(header["seq"][slot_id])
+            if seq % 2 == 1:
+                continue
+            out[...] = self.slots[slot_id]
+            if int(header["seq"][slot_id]) == seq:
+                return True
+
+def solver_spec(solver: Solver) -> tuple:
+    '''
+    What is needed to create a copy of `solver` with `create_solver`. Unlike the solver, 
+    it can be pickled for any rope size (the rope elements are linked recursively).
+    '''
+    return solver.state.copy(), solver.time, solver.dt, solver.integrator, solver.integrator_cfg, solver.backend
+
+def create_solver(spec: tuple) -> Solver:
+    state, sim_time, dt, integrator, integrator_cfg, backend = spec
+    solver = Solver.from_state(state, dt, integrator, integrator_cfg, backend)
+    solver.time = sim_time
+
+    # Profiling is not shared between threads/processes.
+    solver.profiler = Profiler(enabled=False)
+    return solver
+
+def physics_loop(spec: tuple, buffer: StateBuffer, publish_interval: float, errors):
+    '''
+    Runs `step_loop`. If it raises an exception, its traceback is put in the queue `errors` and 
+    the buffer is marked as failed.
+    '''
+    try:
+        step_loop(spec, buffer, publish_interval)
+    except Exception:
+        errors.put(traceback.format_exc())
+        buffer.header["failed"] = 1
+
+def step_loop(spec: tuple, buffer: StateBuffer, publish_interval: float):
+    '''
+    Steps a copy of the solver described by `spec` (see `solver_spec`) until the buffer 
+    is stopped, publishing its state at most every `publish_interval` seconds (wall time).
+    '''
+    solver = create_solver(spec)
+
+    step = 0
+    last_step = 0
+    last_time = time.perf_counter()
+    buffer.write(solver, step)
+    while True:
+        solver.update()
+        step += 1
+
+        now = time.perf_counter()
+        if now - last_time >= publish_interval:
+            buffer.header["step_time"] = (now - last_time) / (step - last_step)
+            buffer.write(solver, step)
+            last_time = now
+            last_step = step
+
+            if buffer.stopped:
+                break
+
+def process_main(spec: tuple, shm_name: str, publish_interval: float, errors):
+    shm = SharedMemory(name=shm_name)
+    try:
+        buffer = StateBuffer(shm.buf, spec[0].num_points)
+        physics_loop(spec, buffer, publish_interval, errors)
+        del buffer
+    finally:
+        shm.close()
+
+class PhysicsWorker:
+    '''
+    Runs a copy of `solver` in background. Call `read` to get the newest state into `solver`.
+
+    The monitors of `solver` are not copied to the worker, so they are not called while it runs.
+    If the physics fails, `read` raises a `RuntimeError` with the traceback of the worker.
+    '''
+    def __init__(self, solver: Solver, mode=WorkerMode.process, publish_interval: float = 1/240) -> None:
+        '''
+        Parameters:
+        -----------
+        solver:
+            Solver whose copy is advanced by the worker. It's only updated by `read`.
+
+        mode:
+            One of the values in `WorkerMode`.
+
+        publish_interval:
+            Minimum wall time (s) between two publications of the state.
+        '''
+        self.solver = solver
+        self.mode = mode
+        self.publish_interval = publish_interval
+        self.num_points = solver.num_points
+
+        self.frame = np.zeros((), dtype=frame_dtype(self.num_points))
+        self.step = 0
+
+        self.shm: SharedMemory = None
+        self.runner = None
+
+        # Traceback of the exception raised by the physics, `None` while it didn't fail.
+        self.error: str = None
+
+        spec = solver_spec(solver)
+        size = StateBuffer.size(self.num_points)
+        if mode == WorkerMode.process:
+            self.shm = SharedMemory(create=True, size=size)
+            self.buffer = StateBuffer(self.shm.buf, self.num_points)
+            self.buffer.init()
+            self.errors = multiprocessing.Queue()
+            self.runner = multiprocessing.Process(target=process_main, args=(spec, self.shm.name, publish_interval, self.errors),
+                daemon=True)
+        elif mode == WorkerMode.thread:
+            self.buffer = StateBuffer(bytearray(size), self.num_points)
+            self.buffer.init()
+            self.errors = queue.Queue()
+            self.runner = threading.Thread(target=physics_loop, args=(spec, self.buffer, publish_interval, self.errors), daemon=True)
+        else:
+            raise ValueError(f"Modo '{mode}' não existe.")
+
+    def start(self):
+        self.runner.start()
+
+    @property
+    def step_time(self):
+        '''
+        Mean wall time (s) of a step of the worker, measured at the last publication.
+        '''
+        return float(self.buffer.header["step_time"])
+
+    def read(self) -> bool:
+        '''
+        Copies the newest published state to `self.solver` (positions, velocities, tensions and
+        time). Returns `False` if nothing was published yet.
+
+        Raises `RuntimeError` if the physics failed (the last published state is not copied).
+        '''
+        self.check()
+        if not self.buffer.read(self.frame):
+            return False
+
+        frame = self.frame
+        st = self.solver.state
+        self.step = int(frame["step"])
+        self.solver.time = float(frame["time"])
+        np.copyto(st.pos, frame["pos"])
+        np.copyto(st.vel, frame["vel"])
+        np.copyto(self.solver.tensions, frame["tensions"])
+        return True
+
+    def check(self):
+        '''
+        Raises `RuntimeError` with the traceback of the worker if the physics failed.
+        '''
+        if self.error is None and self.buffer.failed:
+            try:
+                self.error = self.errors.get(timeout=5)
+            except queue.Empty:
+                self.error = "(traceback indisponível)"
+        if self.error is not None:
+            raise RuntimeError(f"A física em segundo plano falhou:\n{self.error}")
+
+    def stop(self, timeout: float = 5):
+        '''
+        Stops the worker and releases the shared memory. The worker stops at its next publication.
+        '''
+        if self.runner is None:
+            return
+
+        self.buffer.header["stop"] = 1
+        if self.runner.is_alive():
+            self.runner.join(timeout)
+        if self.mode == WorkerMode.process and self.runner.is_alive():
+            self.runner.terminate()
+            self.runner.join()
+        self.runner = None
+
+        if self.shm is not None:
+            del self.buffer
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
@@ -0,0 +1,176 @@
+'''
+Position based dynamics (XPBD) of the rope, used by `Integrator.xpbd`.
+
+Each spring is a distance constraint `C = l - L0` with compliance `alpha = 1/k`. A step moves the
+nodes with their velocities (after gravity, external forces and damping), then projects the predicted
+positions onto the constraints with a fixed number of iterations, each solving for the change of the
+Lagrange multipliers of the springs:
+
+    dlambda = (-C - alpha_t * lambda) / (w_a + w_b + alpha_t),    alpha_t = alpha / dt^2
+
+where `w` are the inverse masses of the spring nodes (zero for fixed nodes). The new velocities are
+the displacements divided by `dt`. The projection is unconditionally stable, so the time step is only
+limited by accuracy, and rigid springs (zero compliance) have no stiffness limit.
+
+The spring force is `-lambda / dt^2`. At convergence it's equal to the force of the spring model.
+'''
+import numpy as np
+
+from rope_elements import RopeState
+from topology import Topology
+from config import XPBDConfig, ConstraintMethod
+
+def as_slice(ids: np.ndarray):
+    '''
+    `ids` as a slice if they are evenly spaced (as in chains), so indexing gives views, otherwise `ids` itself.
+    '''
+    if ids.size < 2:
+        return ids
+    step = ids[1] - ids[0]
+    if step > 0 and np.all(np.diff(ids) == step):
+        return slice(ids[0], ids[-1] + 1, step)
+    return ids
+
+def inverse_denominator(w_first: np.ndarray, w_second: np.ndarray, alpha: np.ndarray, out: np.ndarray):
+    '''
+    Writes `1 / (w_first + w_second + alpha)` to `out`, zero for springs that can't move (both nodes fixed and rigid).
+    '''
+    np.add(w_first, w_second, out=out)
+    out += alpha
+    np.divide(1, out, out=out, where=out > 0)
+
+class SpringGroup:
+    '''
+    Springs with the same color (sharing no node), with their values for the current step.
+    '''
+    def __init__(self, topology: Topology, ids: np.ndarray) -> None:
+        self.ids = ids
+        self.first = topology.first[ids]
+        self.second = topology.second[ids]
+        
+        # Indices of the spring nodes in `project`.
+        self.first_index = as_slice(self.first)
+        self.second_index = as_slice(self.second)
+
+        self.rest_length = np.zeros(ids.size)
+        self.alpha = np.zeros(ids.size) # Compliance over dt^2
+        self.w_first = np.zeros((ids.size, 1))
+        self.w_second = np.zeros((ids.size, 1))
+        self.inv_denominator = np.zeros(ids.size)
+        self.lambdas = np.zeros(ids.size)
+
+    def prepare(self, alpha: np.ndarray, rest_length: np.ndarray, inv_mass: np.ndarray):
+        np.take(rest_length, self.ids, out=self.rest_length)
+        np.take(alpha, self.ids, out=self.alpha)
+        np.take(inv_mass, self.first, out=self.w_first[:, 0])
+        np.take(inv_mass, self.second, out=self.w_second[:, 0])
+        inverse_denominator(self.w_first[:, 0], self.w_second[:, 0], self.alpha, self.inv_denominator)
+        self.lambdas.fill(0)
+
+    def project(self, pos: np.ndarray):
+        vec = pos[self.second_index] - pos[self.first_index]
+        length = np.hypot(vec[:, 0], vec[:, 1])
+
+        # dlambda = (-C - alpha * lambda) / (w_first + w_second + alpha)
+        dlambda = np.subtract(self.rest_length, length)
+        dlambda -= self.alpha * self.lambdas
+        dlambda *= self.inv_denominator
+        self.lambdas += dlambda
+
+        vec *= (dlambda / length)[:, None]
+        pos[self.first_index] -= self.w_first * vec
+        pos[self.second_index] += self.w_second * vec
+
+class DistanceConstraints:
+    '''
+    Distance constraints of all springs of a rope (or network) state, projected by `project`.
+    '''
+    def __init__(self, state: RopeState) -> None:
+        self.topology = state.topology
+        if self.topology is None:
+            self.topology = Topology.chain(state.num_points)
+
+        colors = self.topology.spring_colors()
+        self.groups = [SpringGroup(self.topology, np.flatnonzero(colors == c)) for c in range(colors.max(initial=-1) + 1)]
+
+        num_springs = self.topology.num_edges
+        self.alpha = np.zeros(num_springs)
+        self.inv_denominator = np.zeros(num_springs)
+        self.lambdas = np.zeros(num_springs)
+        self.inv_mass = np.zeros(state.num_points)
+
+        # Jacobi relaxation factor of each spring.
+        self.spring_factor = np.zeros(num_springs)
+        self.damping_factor = np.zeros(state.num_points)
+
+    def prepare(self, state: RopeState, free: np.ndarray, dt: float, cfg: XPBDConfig):
+        '''
+        Sets the compliances and inverse masses of the step, and resets the multipliers.
+        '''
+        if cfg.inextensible:
+            self.alpha.fill(0)
+        else:
+            np.divide(1 / dt**2, state.k, out=self.alpha)
+        np.divide(free, state.mass, out=self.inv_mass)
+        self.lambdas.fill(0)
+
+        if cfg.method == ConstraintMethod.gauss_seidel:
+            for group in self.groups:
+                group.prepare(self.alpha, state.rest_length, self.inv_mass)
+        else:
+            top = self.topology
+            inverse_denominator(self.inv_mass[top.first], self.inv_mass[top.second], self.alpha, self.inv_denominator)
+            max_degree = np.maximum(top.degree[top.first], top.degree[top.second])
+            np.divide(cfg.relaxation, max_degree, out=self.spring_factor)
+
+    def project(self, pos: np.ndarray, state: RopeState, cfg: XPBDConfig):
+        '''
+        Moves the positions `pos` towards the constraints with `cfg.iterations` iterations.
+        '''
+        if cfg.method == ConstraintMethod.gauss_seidel:
+            for _ in range(cfg.iterations):
+                for group in self.groups:
+                    group.project(pos)
+            for group in self.groups:
+                self.lambdas[group.ids] = group.lambdas
+        else:
+            for _ in range(cfg.iterations):
+                self.jacobi_iteration(pos, state.rest_length, cfg)
+
+    def jacobi_iteration(self, pos: np.ndarray, rest_length: np.ndarray, cfg: XPBDConfig):
+        top = self.topology
+        vec = top.spring_vectors(pos)
+        length = np.hypot(vec[:, 0], vec[:, 1])
+
+        dlambda = np.subtract(rest_length, length)
+        dlambda -= self.alpha * self.lambdas
+        dlambda *= self.inv_denominator
+
+        # The corrections of all springs are summed on the nodes, so each one is scaled down
+        # by the number of springs of its nodes, otherwise nodes overshoot.
+        dlambda *= self.spring_factor
+        self.lambdas += dlambda
+
+        vec *= (dlambda / length)[:, None]
+        correction = top.scatter @ vec
+        correction *= self.inv_mass[:, None]
+        pos -= correction
+
+    def error(self, pos: np.ndarray, rest_length: np.ndarray) -> float:
+        '''
+        Biggest residual of the constraints equations (`C + alpha * lambda`) at `pos`, relative to the springs rest length.
+        '''
+        if self.topology.num_edges == 0:
+            return 0
+        vec = self.topology.spring_vectors(pos)
+        residual = np.hypot(vec[:, 0], vec[:, 1])
+        residual -= rest_length
+        residual += self.alpha * self.lambdas
+        residual /= rest_length
+        return float(np.abs(residual).max())
+
+    def spring_forces(self, dt: float, out: np.ndarray):
+        '''
+        Force intensity of each spring (positive when stretched), written to `out`.
+        '''
+        np.multiply(self.lambdas, -1 / dt**2, out=out)